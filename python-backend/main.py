@@ -8,17 +8,23 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from garminconnect import Garmin
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 import json
 from typing import List, Dict, Any, Optional
 import logging
 
+from rag_service.api import metrics_router, router as rag_router
+from rag_service.container import lifespan as rag_lifespan
+from rag_service.interfaces import ContentType
+from rag_service.main import index_user_records
+from rag_service.metrics import track_garmin
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Wagner Coach Garmin Backend")
+app = FastAPI(title="Wagner Coach Garmin Backend", lifespan=rag_lifespan)
 
 # Configure CORS - MUST be before any routes
 app.add_middleware(
@@ -31,6 +37,9 @@ app.add_middleware(
     max_age=3600,
 )
 
+app.include_router(rag_router)
+app.include_router(metrics_router)
+
 class GarminCredentials(BaseModel):
     email: str
     password: str
@@ -39,6 +48,8 @@ class SyncRequest(BaseModel):
     email: str
     password: str
     days_back: int = 30
+    # Index synced activities into this user's coaching context
+    user_id: Optional[str] = None
 
 class Activity(BaseModel):
     activityId: str
@@ -76,10 +87,12 @@ async def test_connection(credentials: GarminCredentials):
 
         # Initialize and login
         garmin = Garmin(credentials.email, credentials.password)
-        garmin.login()
+        with track_garmin("login"):
+            garmin.login()
 
         # Get user profile to verify connection
-        profile = garmin.get_user_profile()
+        with track_garmin("get_user_profile"):
+            profile = garmin.get_user_profile()
 
         return {
             "success": True,
@@ -99,6 +112,28 @@ async def test_connection(credentials: GarminCredentials):
         else:
             raise HTTPException(status_code=500, detail=str(e))
 
+def activity_record(activity: Dict[str, Any]) -> Dict[str, Any]:
+    """Describe a processed activity for the coaching index"""
+    details = [f"{activity['activityName']} ({activity['activityType'].get('typeKey', 'activity')})"]
+    if activity.get('duration'):
+        details.append(f"{activity['duration'] / 60:.0f} min")
+    if activity.get('distance'):
+        details.append(f"{activity['distance'] / 1000:.2f} km")
+    if activity.get('averageHR'):
+        details.append(f"avg HR {activity['averageHR']}")
+    if activity.get('calories'):
+        details.append(f"{activity['calories']} kcal")
+
+    created_at = None
+    if activity.get('startTimeGMT'):
+        created_at = datetime.fromisoformat(activity['startTimeGMT']).replace(tzinfo=timezone.utc)
+    return {
+        'id': f"garmin-{activity['activityId']}",
+        'content': ", ".join(details),
+        'metadata': {'source': 'garmin', 'activity_id': activity['activityId']},
+        'created_at': created_at,
+    }
+
 @app.post("/api/garmin/sync")
 async def sync_activities(request: SyncRequest):
     """Sync activities from Garmin Connect"""
@@ -107,7 +142,8 @@ async def sync_activities(request: SyncRequest):
 
         # Login to Garmin
         garmin = Garmin(request.email, request.password)
-        garmin.login()
+        with track_garmin("login"):
+            garmin.login()
 
         # Calculate date range
         end_date = datetime.now().date()
@@ -116,10 +152,11 @@ async def sync_activities(request: SyncRequest):
         logger.info(f"Fetching activities from {start_date} to {end_date}")
 
         # Get activities
-        activities = garmin.get_activities_by_date(
-            start_date.isoformat(),
-            end_date.isoformat()
-        )
+        with track_garmin("get_activities_by_date"):
+            activities = garmin.get_activities_by_date(
+                start_date.isoformat(),
+                end_date.isoformat()
+            )
 
         # Process activities
         processed_activities = []
@@ -155,10 +192,24 @@ async def sync_activities(request: SyncRequest):
 
         logger.info(f"Successfully fetched {len(processed_activities)} activities")
 
+        # Index through the search service so the user's caches are
+        # invalidated and their coaching context is prefetched
+        indexed = 0
+        if request.user_id:
+            try:
+                indexed = await index_user_records(
+                    request.user_id,
+                    ContentType.ACTIVITY,
+                    [activity_record(activity) for activity in processed_activities]
+                )
+            except Exception as e:
+                logger.error(f"Indexing synced activities failed: {e}")
+
         return {
             "success": True,
             "activities": processed_activities,
             "count": len(processed_activities),
+            "indexed": indexed,
             "dateRange": {
                 "start": start_date.isoformat(),
                 "end": end_date.isoformat()
@@ -183,15 +234,18 @@ async def get_activity_details(activity_id: str, credentials: GarminCredentials)
 
         # Login to Garmin
         garmin = Garmin(credentials.email, credentials.password)
-        garmin.login()
+        with track_garmin("login"):
+            garmin.login()
 
         # Get activity details
-        activity = garmin.get_activity_evaluation(activity_id)
+        with track_garmin("get_activity_evaluation"):
+            activity = garmin.get_activity_evaluation(activity_id)
 
         # Get splits if available
         splits = None
         try:
-            splits = garmin.get_activity_splits(activity_id)
+            with track_garmin("get_activity_splits"):
+                splits = garmin.get_activity_splits(activity_id)
         except:
             pass
 
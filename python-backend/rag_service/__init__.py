@@ -14,17 +14,28 @@ __author__ = "Wagner Coach Team"
 from .interfaces import (
     ContentType,
     SearchStrategy,
+    FusionMethod,
+    Degradation,
     EmbeddingModel,
     EmbeddingRequest,
     EmbeddingResponse,
+    SearchFilter,
     HybridSearchRequest,
     HybridSearchResponse,
+    BatchSearchRequest,
+    BatchSearchResponse,
     SearchResult,
+    QueryContext,
     RerankRequest,
     RerankResponse,
+    RerankStage,
     RAGQueryRequest,
     RAGQueryResponse,
     RAGContext,
+    BatchRAGQueryRequest,
+    BatchRAGQueryResult,
+    RAGContextEvent,
+    RAGSummaryEvent,
     HealthCheckResponse,
     ErrorResponse,
 )
@@ -32,17 +43,28 @@ from .interfaces import (
 __all__ = [
     "ContentType",
     "SearchStrategy",
+    "FusionMethod",
+    "Degradation",
     "EmbeddingModel",
     "EmbeddingRequest",
     "EmbeddingResponse",
+    "SearchFilter",
     "HybridSearchRequest",
     "HybridSearchResponse",
+    "BatchSearchRequest",
+    "BatchSearchResponse",
     "SearchResult",
+    "QueryContext",
     "RerankRequest",
     "RerankResponse",
+    "RerankStage",
     "RAGQueryRequest",
     "RAGQueryResponse",
     "RAGContext",
+    "BatchRAGQueryRequest",
+    "BatchRAGQueryResult",
+    "RAGContextEvent",
+    "RAGSummaryEvent",
     "HealthCheckResponse",
     "ErrorResponse",
 ]
\ No newline at end of file
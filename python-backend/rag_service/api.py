@@ -0,0 +1,145 @@
+"""
+HTTP API for RAG service.
+FastAPI routes exposing search and retrieval to the frontend.
+"""
+
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+
+from .container import get_container
+from .metrics import render_metrics
+from .search import SearchService
+from .interfaces import (
+    BatchRAGQueryRequest,
+    BatchSearchRequest,
+    BatchSearchResponse,
+    HybridSearchRequest,
+    HybridSearchResponse,
+    RAGQueryRequest,
+    RAGQueryResponse,
+)
+
+
+router = APIRouter(prefix="/api/rag", tags=["rag"])
+# Served at the application root, where Prometheus scrapes by default
+metrics_router = APIRouter(tags=["metrics"])
+
+
+def get_search_service() -> SearchService:
+    """Get the application-scoped search service."""
+    return get_container().search_service
+
+
+def get_pipeline() -> Any:
+    """Get the application-scoped RAG pipeline."""
+    return get_container().pipeline
+
+
+def with_deadline(request: RAGQueryRequest, deadline_ms: Optional[float]) -> RAGQueryRequest:
+    """
+    Apply a deadline header to a query that does not set its own.
+
+    Args:
+        request: RAG query request
+        deadline_ms: Value of the `X-Request-Deadline-Ms` header
+
+    Returns:
+        Request carrying the deadline
+    """
+    if deadline_ms is None or request.deadline_ms is not None:
+        return request
+    if deadline_ms <= 0:
+        raise HTTPException(status_code=400, detail="X-Request-Deadline-Ms must be positive")
+    return request.model_copy(update={"deadline_ms": deadline_ms})
+
+
+async def encode_events(events: AsyncIterator[Any], format: str) -> AsyncIterator[str]:
+    """
+    Serialize pipeline events as server-sent events or NDJSON lines.
+
+    Args:
+        events: Context and summary events
+        format: "sse" or "ndjson"
+
+    Yields:
+        Encoded events
+    """
+    async for event in events:
+        data = event.model_dump_json()
+        if format == "sse":
+            yield f"event: {event.event}\ndata: {data}\n\n"
+        else:
+            yield data + "\n"
+
+
+@router.post("/search", response_model=HybridSearchResponse)
+async def search(
+    request: HybridSearchRequest,
+    service: SearchService = Depends(get_search_service)
+):
+    """Search a user's data; with `paginate`, pass `next_cursor` back as `cursor` for the next page"""
+    try:
+        return await service.process_request(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def batch_search(
+    request: BatchSearchRequest,
+    service: SearchService = Depends(get_search_service)
+):
+    """Run several queries of one user in a single round trip"""
+    return await service.batch_search(request)
+
+
+@router.post("/query", response_model=RAGQueryResponse)
+async def query(
+    request: RAGQueryRequest,
+    deadline_ms: Optional[float] = Header(None, alias="X-Request-Deadline-Ms"),
+    pipeline: Any = Depends(get_pipeline)
+):
+    """Build context for a query, degrading stages that would miss its deadline"""
+    return await pipeline.process(with_deadline(request, deadline_ms))
+
+
+@router.post("/query/stream")
+async def stream_query(
+    request: RAGQueryRequest,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+    deadline_ms: Optional[float] = Header(None, alias="X-Request-Deadline-Ms"),
+    pipeline: Any = Depends(get_pipeline)
+):
+    """Stream context as each stage ranks it, first-stage results first, then a summary"""
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    events = pipeline.stream(with_deadline(request, deadline_ms))
+    return StreamingResponse(encode_events(events, format), media_type=media_type)
+
+
+@router.post("/query/batch")
+async def batch_query(
+    request: BatchRAGQueryRequest,
+    pipeline: Any = Depends(get_pipeline)
+):
+    """Run many (user, query) pairs for batch jobs, streaming one NDJSON result per pair"""
+    async def lines():
+        async for result in pipeline.process_batch(request.requests):
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/index/stats")
+async def index_stats(service: SearchService = Depends(get_search_service)):
+    """Resident users, memory use and eviction rates of the search index"""
+    stats = getattr(service.index, "stats", None)
+    return stats() if stats else {}
+
+
+@metrics_router.get("/metrics")
+async def metrics():
+    """Expose stage latencies, cache, batch and fallback counters to Prometheus"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,610 @@
+"""
+Caching module for RAG service.
+Provides bounded TTL/LRU caches and per-user versioning for invalidation.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .interfaces import Cache
+from .metrics import record_cache
+
+
+class TTLCache(Cache):
+    """In-process LRU cache with per-entry time to live."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[int] = 300,
+        name: str = "default"
+    ):
+        """
+        Initialize TTL cache.
+
+        Args:
+            max_entries: Maximum number of entries before LRU eviction
+            ttl: Default time to live in seconds (None for no expiry)
+            name: Cache name used as the metrics label
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.name = name
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def size(self) -> int:
+        """Number of entries currently held."""
+        return len(self._entries)
+
+    def get_nowait(self, key: str) -> Optional[Any]:
+        """
+        Get value from cache without awaiting.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value or None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            record_cache(self.name, False)
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            record_cache(self.name, False)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        record_cache(self.name, True)
+        return value
+
+    def set_nowait(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """
+        Set value in cache without awaiting.
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            ttl: Time to live in seconds (defaults to the cache TTL)
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get value from cache.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value or None
+        """
+        return self.get_nowait(key)
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None
+    ) -> bool:
+        """
+        Set value in cache.
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            ttl: Time to live in seconds
+
+        Returns:
+            True if set successfully
+        """
+        self.set_nowait(key, value, ttl)
+        return True
+
+    async def delete(self, key: str) -> bool:
+        """
+        Delete value from cache.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            True if deleted
+        """
+        return self._entries.pop(key, None) is not None
+
+    async def clear(self) -> bool:
+        """
+        Clear all cache entries.
+
+        Returns:
+            True if cleared
+        """
+        self._entries.clear()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit, miss and eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class UserVersions:
+    """
+    Per-user data version counters.
+
+    Cache keys embed the user's current version, so bumping it on every
+    write makes all of that user's cached entries unreachable in O(1);
+    they age out through the caches' LRU and TTL bounds.
+    """
+
+    def __init__(self):
+        """Initialize version counters."""
+        self._versions: Dict[str, int] = {}
+
+    def get(self, user_id: str) -> int:
+        """
+        Get the current data version of a user.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            Version counter
+        """
+        return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: str) -> int:
+        """
+        Record a write for a user.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            New version counter
+        """
+        version = self._versions.get(user_id, 0) + 1
+        self._versions[user_id] = version
+        return version
+
+
+class SemanticQueryCache:
+    """
+    Per-user cache of recent query embeddings and their results.
+
+    A lookup hits when a cached query with the same request signature and
+    user data version lies within `max_distance` cosine distance of the
+    new query, so rephrasings of a recent question reuse its results.
+    Queries are only compared with queries embedded by the same model.
+    """
+
+    def __init__(
+        self,
+        max_distance: float = 0.08,
+        max_entries_per_user: int = 32,
+        max_users: int = 10000,
+        ttl: Optional[int] = 300,
+        audit_size: int = 200
+    ):
+        """
+        Initialize semantic query cache.
+
+        Args:
+            max_distance: Maximum cosine distance for a hit
+            max_entries_per_user: Cached queries kept per user (LRU)
+            max_users: Users kept before the least recently used is dropped
+            ttl: Time to live in seconds (None for no expiry)
+            audit_size: Number of recent hits kept for auditing
+        """
+        if not 0.0 <= max_distance <= 2.0:
+            raise ValueError("max_distance must be within [0, 2]")
+        self.max_distance = max_distance
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self.audit_log: Deque[Dict[str, Any]] = deque(maxlen=audit_size)
+        self.hits = 0
+        self.misses = 0
+        self.audited_hits = 0
+        self.false_hits = 0
+
+    def lookup(
+        self,
+        user_id: str,
+        version: int,
+        signature: str,
+        query: str,
+        vector: Sequence[float],
+        model_name: str = ""
+    ) -> Optional[Any]:
+        """
+        Find results cached for a near-identical query.
+
+        Args:
+            user_id: User identifier
+            version: Current data version of the user
+            signature: Hash of the request parameters other than the query
+            query: Query text (recorded for audits)
+            vector: Query embedding
+            model_name: Model that produced the embedding
+
+        Returns:
+            Cached value or None
+        """
+        now = time.monotonic()
+        entries = self._users.get(user_id)
+        if entries:
+            entries[:] = [
+                e for e in entries
+                if e["version"] == version and (e["expires_at"] is None or e["expires_at"] > now)
+            ]
+        query_vector = _unit(vector)
+        # Embeddings of different models live in different spaces, and a
+        # fallback model may not even share the dimension
+        candidates = [
+            e for e in entries or []
+            if e["signature"] == signature
+            and e["model_name"] == model_name
+            and e["vector"].shape == query_vector.shape
+        ]
+        if not candidates:
+            self.misses += 1
+            record_cache("semantic", False)
+            return None
+
+        similarities = np.stack([e["vector"] for e in candidates]) @ query_vector
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if 1.0 - similarity > self.max_distance:
+            self.misses += 1
+            record_cache("semantic", False)
+            return None
+
+        entry = candidates[best]
+        # By identity: comparing entries would compare their vectors
+        entries.append(entries.pop(next(i for i, e in enumerate(entries) if e is entry)))
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        record_cache("semantic", True)
+        self.audit_log.append({
+            "user_id": user_id,
+            "query": query,
+            "matched_query": entry["query"],
+            "similarity": similarity,
+            "agreement": None,
+        })
+        return entry["value"]
+
+    def store(
+        self,
+        user_id: str,
+        version: int,
+        signature: str,
+        query: str,
+        vector: Sequence[float],
+        value: Any,
+        model_name: str = ""
+    ) -> None:
+        """
+        Cache the results of a query.
+
+        Args:
+            user_id: User identifier
+            version: Data version the results were computed at
+            signature: Hash of the request parameters other than the query
+            query: Query text
+            vector: Query embedding
+            value: Results to cache
+            model_name: Model that produced the embedding
+        """
+        entries = self._users.setdefault(user_id, [])
+        self._users.move_to_end(user_id)
+        entries.append({
+            "version": version,
+            "signature": signature,
+            "query": query,
+            "vector": _unit(vector),
+            "model_name": model_name,
+            "value": value,
+            "expires_at": time.monotonic() + self.ttl if self.ttl is not None else None,
+        })
+        del entries[:-self.max_entries_per_user]
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def record_audit(
+        self,
+        entry: Dict[str, Any],
+        agreement: float,
+        min_agreement: float = 0.5
+    ) -> None:
+        """
+        Record the result of re-running the search behind a cache hit.
+
+        Args:
+            entry: Audit log entry of the hit
+            agreement: Overlap between cached and fresh results (0-1)
+            min_agreement: Agreement below which the hit counts as false
+        """
+        self.audited_hits += 1
+        if agreement < min_agreement:
+            self.false_hits += 1
+        entry["agreement"] = agreement
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop every cached query of a user."""
+        self._users.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit rate and false-hit audit counters."""
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "audited_hits": self.audited_hits,
+            "false_hits": self.false_hits,
+            "false_hit_rate": self.false_hits / self.audited_hits if self.audited_hits else 0.0,
+        }
+
+
+class PairScoreCache:
+    """
+    Raw cross-encoder scores keyed by (model, query, candidate).
+
+    Scores of individual pairs are cached rather than whole rankings, so a
+    follow-up turn or an overlapping search only scores the candidates it
+    has not seen with that query.
+    """
+
+    def __init__(self, max_entries: int = 20000, ttl: Optional[int] = 3600):
+        """
+        Initialize pair score cache.
+
+        Args:
+            max_entries: Maximum cached pairs before LRU eviction
+            ttl: Time to live in seconds (None for no expiry)
+        """
+        self._scores = TTLCache(max_entries=max_entries, ttl=ttl, name="rerank_pairs")
+
+    def lookup(
+        self,
+        model: str,
+        query: str,
+        candidates: Sequence[str]
+    ) -> List[Optional[float]]:
+        """
+        Get the cached score of every pair.
+
+        Args:
+            model: Scoring model name
+            query: Query text
+            candidates: Candidate texts
+
+        Returns:
+            Score per candidate, None where not cached
+        """
+        prefix = self._prefix(model, query)
+        return [self._scores.get_nowait(prefix + _digest(c)) for c in candidates]
+
+    def store(
+        self,
+        model: str,
+        query: str,
+        candidates: Sequence[str],
+        scores: Sequence[float]
+    ) -> None:
+        """
+        Cache the scores of scored pairs.
+
+        Args:
+            model: Scoring model name
+            query: Query text
+            candidates: Candidate texts
+            scores: Raw score per candidate
+        """
+        prefix = self._prefix(model, query)
+        for candidate, score in zip(candidates, scores):
+            self._scores.set_nowait(prefix + _digest(candidate), float(score))
+
+    def clear(self) -> None:
+        """Drop every cached score."""
+        self._scores = TTLCache(
+            max_entries=self._scores.max_entries,
+            ttl=self._scores.ttl,
+            name=self._scores.name
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit, miss and eviction counters."""
+        return self._scores.stats()
+
+    @staticmethod
+    def _prefix(model: str, query: str) -> str:
+        return f"{model}:{_digest(query)}:"
+
+
+class TokenCache:
+    """
+    Token ids of documents, stored back to back in one int32 buffer.
+
+    Documents are reranked over and over, so their ids are tokenized once
+    and kept; only the query has to be tokenized per request. When the
+    buffer reaches `max_tokens` it is replaced wholesale by a fresh one.
+    """
+
+    def __init__(self, max_tokens: int = 2_000_000):
+        """
+        Initialize token cache.
+
+        Args:
+            max_tokens: Token ids held before the cache is reset
+        """
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.max_tokens = max_tokens
+        self._buffer = np.zeros(min(max_tokens, 4096), dtype=np.int32)
+        self._used = 0
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        Get the cached token ids of a document.
+
+        Args:
+            text: Document text
+
+        Returns:
+            Token ids, or None if not cached
+        """
+        span = self._spans.get(_digest(text))
+        if span is None:
+            self.misses += 1
+            record_cache("tokens", False)
+            return None
+        self.hits += 1
+        record_cache("tokens", True)
+        start, length = span
+        return self._buffer[start:start + length]
+
+    def put(self, text: str, ids: Sequence[int]) -> np.ndarray:
+        """
+        Cache the token ids of a document.
+
+        Args:
+            text: Document text
+            ids: Token ids without special tokens
+
+        Returns:
+            The stored ids
+        """
+        ids = np.asarray(ids, dtype=np.int32)
+        if len(ids) > self.max_tokens:
+            return ids
+        if self._used + len(ids) > self.max_tokens:
+            # A new buffer keeps arrays handed out earlier intact
+            self._buffer = np.zeros(min(self.max_tokens, max(4096, len(ids))), dtype=np.int32)
+            self._used = 0
+            self._spans.clear()
+            self.resets += 1
+        if self._used + len(ids) > self._buffer.shape[0]:
+            grown = np.zeros(
+                min(self.max_tokens, max(self._buffer.shape[0] * 2, self._used + len(ids))),
+                dtype=np.int32
+            )
+            grown[:self._used] = self._buffer[:self._used]
+            self._buffer = grown
+        start = self._used
+        self._buffer[start:start + len(ids)] = ids
+        self._used += len(ids)
+        self._spans[_digest(text)] = (start, len(ids))
+        return self._buffer[start:start + len(ids)]
+
+    def get_or_tokenize(
+        self,
+        texts: Sequence[str],
+        tokenize: Any
+    ) -> List[np.ndarray]:
+        """
+        Get the token ids of documents, tokenizing the misses in one call.
+
+        Args:
+            texts: Document texts
+            tokenize: Function mapping a list of texts to lists of token ids
+
+        Returns:
+            Token ids per document
+        """
+        ids: List[Optional[np.ndarray]] = [self.get(text) for text in texts]
+        missing = [i for i, cached in enumerate(ids) if cached is None]
+        if missing:
+            for i, token_ids in zip(missing, tokenize([texts[i] for i in missing])):
+                ids[i] = self.put(texts[i], token_ids)
+        return ids
+
+    def stats(self) -> Dict[str, Any]:
+        """Get size, hit and reset counters."""
+        lookups = self.hits + self.misses
+        return {
+            "documents": len(self._spans),
+            "tokens": self._used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "resets": self.resets,
+        }
+
+
+def _digest(text: str) -> str:
+    """Short stable hash of a text."""
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    """Normalize a vector to unit length."""
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize query text for cache keys.
+
+    Args:
+        query: Raw query
+
+    Returns:
+        Lowercased query with collapsed whitespace
+    """
+    return " ".join(query.lower().split())
+
+
+def make_cache_key(namespace: str, user_id: str, version: int, **params: Any) -> str:
+    """
+    Build a cache key from a user's data version and normalized parameters.
+
+    Args:
+        namespace: Cache namespace
+        user_id: User identifier
+        version: User data version
+        **params: Request parameters (must be JSON serializable)
+
+    Returns:
+        Cache key
+    """
+    payload = json.dumps(params, sort_keys=True, default=str)
+    digest = hashlib.sha1(payload.encode()).hexdigest()
+    return f"{namespace}:{user_id}:v{version}:{digest}"
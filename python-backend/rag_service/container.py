@@ -0,0 +1,206 @@
+"""
+Container module for RAG service.
+Holds the application-scoped pipeline and services, created once at
+startup and shared by every request.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from .prefetch import ContextPrefetcher
+from .sharding import ShardedVectorStore
+from .snapshot import IndexPersistence
+from .tenancy import TenantIndexManager
+
+
+# Seconds coaching contexts are cached when workers share a sharded index.
+# Data versions are per worker, so writes handled by another worker only
+# show in this worker's cached contexts once they expire
+SHARED_INDEX_CONTEXT_TTL = 30
+
+# Seconds between snapshots of a persisted per-process index
+CHECKPOINT_INTERVAL = 300.0
+
+
+def build_index_from_env() -> Optional[Any]:
+    """
+    Build the search index configured by environment variables.
+
+    Returns:
+        Shard client store, memory-budgeted index, or None for the default
+        per-process index
+    """
+    # Comma-separated shard sockets; without them each worker keeps its own index
+    shard_sockets = os.getenv("RAG_SHARD_SOCKETS")
+    # Memory budget for resident user indexes; cold users are evicted to disk
+    memory_budget_mb = os.getenv("RAG_MEMORY_BUDGET_MB")
+    if shard_sockets:
+        return ShardedVectorStore.from_paths(shard_sockets.split(","))
+    if memory_budget_mb:
+        return TenantIndexManager(
+            memory_budget_bytes=int(memory_budget_mb) * 1024 * 1024,
+            directory=os.getenv("RAG_EVICTION_DIR", "/tmp/rag-evicted")
+        )
+    return None
+
+
+def build_persistence_from_env() -> Optional[IndexPersistence]:
+    """
+    Build snapshot persistence for the default per-process index.
+
+    Returns:
+        Persistence in `RAG_DATA_DIR`, or None when it is unset or shards or
+        a memory budget hold the index instead
+    """
+    # Data directory for snapshots and the write-ahead log; one worker per directory
+    data_dir = os.getenv("RAG_DATA_DIR")
+    if not data_dir or os.getenv("RAG_SHARD_SOCKETS") or os.getenv("RAG_MEMORY_BUDGET_MB"):
+        return None
+    return IndexPersistence(data_dir)
+
+
+class PipelineContainer:
+    """Application-scoped RAG pipeline and the services it is built from."""
+
+    def __init__(
+        self,
+        pipeline: Optional[Any] = None,
+        persistence: Optional[IndexPersistence] = None,
+        **pipeline_options: Any
+    ):
+        """
+        Initialize pipeline container.
+
+        Args:
+            pipeline: Prebuilt pipeline (e.g. a test double)
+            persistence: Snapshot persistence of the pipeline's index; a new
+                pipeline's index is restored from it
+            **pipeline_options: Options for a new `RAGPipeline`
+        """
+        if pipeline is None:
+            from .main import RAGPipeline
+
+            if persistence is None and "index" not in pipeline_options:
+                persistence = build_persistence_from_env()
+            if persistence is not None and "index" not in pipeline_options:
+                pipeline_options["index"] = persistence.restore()
+            pipeline_options.setdefault("openai_api_key", os.getenv("OPENAI_API_KEY"))
+            pipeline_options.setdefault("index", build_index_from_env())
+            pipeline = RAGPipeline(**pipeline_options)
+        self.pipeline = pipeline
+        self.persistence = persistence
+        self.prefetcher = self._build_prefetcher()
+        self._checkpoints: Optional[asyncio.Task] = None
+
+    def _build_prefetcher(self) -> ContextPrefetcher:
+        """Cache coaching contexts, refreshed after each user's writes."""
+        from .main import compute_coaching_context
+
+        async def compute(query: str, user_id: str):
+            return await compute_coaching_context(query, user_id, pipeline=self.pipeline)
+
+        options = {}
+        if isinstance(self.search_service.index, ShardedVectorStore):
+            options["cache_ttl"] = int(
+                os.getenv("RAG_SHARED_CONTEXT_TTL", SHARED_INDEX_CONTEXT_TTL)
+            )
+        prefetcher = ContextPrefetcher(compute, self.search_service.versions, **options)
+        self.search_service.write_listeners.append(prefetcher.on_write)
+        return prefetcher
+
+    @property
+    def embedding_service(self):
+        """Shared embedding service."""
+        return self.pipeline.embedding_service
+
+    @property
+    def search_service(self):
+        """Shared search service."""
+        return self.pipeline.search_service
+
+    @property
+    def rerank_service(self):
+        """Shared rerank service."""
+        return self.pipeline.rerank_service
+
+    def start(self) -> None:
+        """Start periodic snapshots of a persisted index (needs a running loop)."""
+        if self.persistence is not None and self._checkpoints is None:
+            self._checkpoints = asyncio.create_task(self.persistence.run_checkpoints(
+                lambda: self.search_service.index, CHECKPOINT_INTERVAL
+            ))
+
+    async def shutdown(self) -> None:
+        """Release caches, background tasks and index connections."""
+        if self._checkpoints is not None:
+            self._checkpoints.cancel()
+        await self.prefetcher.close()
+        await self.pipeline.cleanup()
+        if self.persistence is not None:
+            await self.persistence.checkpoint_async(self.search_service.index)
+            self.persistence.close()
+        close = getattr(self.search_service.index, "close", None)
+        if close is not None:
+            await close()
+
+
+_container: Optional[PipelineContainer] = None
+
+
+def get_container() -> PipelineContainer:
+    """Get the application container, creating it on first use."""
+    global _container
+    if _container is None:
+        _container = PipelineContainer()
+    return _container
+
+
+def set_container(container: Optional[PipelineContainer]) -> Optional[PipelineContainer]:
+    """
+    Replace the application container (e.g. with a test double).
+
+    Args:
+        container: New container, or None to build one on next use
+
+    Returns:
+        The previous container
+    """
+    global _container
+    previous, _container = _container, container
+    return previous
+
+
+async def startup(container: Optional[PipelineContainer] = None) -> PipelineContainer:
+    """
+    Create the application container.
+
+    Args:
+        container: Container to install instead of building one
+
+    Returns:
+        The installed container
+    """
+    if container is not None:
+        set_container(container)
+    container = get_container()
+    container.start()
+    return container
+
+
+async def shutdown() -> None:
+    """Shut the application container down."""
+    container = set_container(None)
+    if container is not None:
+        await container.shutdown()
+
+
+@asynccontextmanager
+async def lifespan(app: Any) -> AsyncIterator[None]:
+    """FastAPI lifespan creating the container at startup and closing it at shutdown."""
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
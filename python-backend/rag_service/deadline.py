@@ -0,0 +1,84 @@
+"""
+Deadline module for RAG service.
+Tracks a request's remaining latency budget and the expected cost of
+each pipeline stage, so stages can degrade instead of running late.
+"""
+
+import math
+import time
+from typing import Dict, Optional
+
+
+class Deadline:
+    """Monotonic-clock deadline of one request."""
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        """
+        Initialize deadline.
+
+        Args:
+            budget_ms: Latency budget from now (None for no deadline)
+        """
+        self.budget_ms = budget_ms
+        self.expires_at = (
+            time.perf_counter() + budget_ms / 1000 if budget_ms is not None else None
+        )
+
+    def remaining_ms(self) -> float:
+        """Budget left, infinite without a deadline."""
+        if self.expires_at is None:
+            return math.inf
+        return (self.expires_at - time.perf_counter()) * 1000
+
+    def allows(self, cost_ms: float) -> bool:
+        """
+        Whether a stage expected to take `cost_ms` fits in the budget left.
+
+        Args:
+            cost_ms: Expected stage cost
+
+        Returns:
+            True if it fits
+        """
+        return cost_ms <= self.remaining_ms()
+
+
+class StageCosts:
+    """Exponentially weighted moving averages of stage latencies."""
+
+    def __init__(self, initial_ms: Dict[str, float], smoothing: float = 0.2):
+        """
+        Initialize stage costs.
+
+        Args:
+            initial_ms: Cost per stage assumed before measuring
+            smoothing: Weight of the newest measurement in the average
+        """
+        self._costs = dict(initial_ms)
+        self.smoothing = smoothing
+
+    def estimate(self, stage: str) -> float:
+        """
+        Get the expected cost of a stage.
+
+        Args:
+            stage: Stage name
+
+        Returns:
+            Expected cost in milliseconds (0 for unknown stages)
+        """
+        return self._costs.get(stage, 0.0)
+
+    def observe(self, stage: str, cost_ms: float) -> None:
+        """
+        Record a measured stage cost.
+
+        Args:
+            stage: Stage name
+            cost_ms: Measured cost in milliseconds
+        """
+        previous = self._costs.get(stage)
+        if previous is None:
+            self._costs[stage] = cost_ms
+        else:
+            self._costs[stage] = (1 - self.smoothing) * previous + self.smoothing * cost_ms
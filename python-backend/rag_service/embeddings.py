@@ -19,7 +19,10 @@ from .interfaces import (
     EmbeddingModel,
     Embedding,
     ContentType,
+    QueryContext,
 )
+from .indexes import build_query_context
+from .metrics import record_batch, record_cache, record_fallback, track_stage
 
 
 class SentenceTransformerEmbedding(EmbeddingGenerator):
@@ -71,6 +74,7 @@ class SentenceTransformerEmbedding(EmbeddingGenerator):
             text = text[:self.max_tokens * 4]
 
         # Generate embedding
+        record_batch(self.model_name, 1)
         embedding = self.model.encode(text, normalize_embeddings=True)
 
         # Handle both numpy arrays and lists
@@ -106,6 +110,7 @@ class SentenceTransformerEmbedding(EmbeddingGenerator):
             processed_texts.append(text)
 
         # Generate batch embeddings
+        record_batch(self.model_name, len(processed_texts))
         embeddings = self.model.encode(
             processed_texts,
             normalize_embeddings=True,
@@ -168,6 +173,7 @@ class OpenAIEmbedding(EmbeddingGenerator):
         if not text or text.strip() == "":
             raise ValueError("Text cannot be empty")
 
+        record_batch(self.model, 1)
         embedding = await self._call_openai_api(text)
 
         return embedding, EmbeddingModel.OPENAI_SMALL
@@ -188,6 +194,7 @@ class OpenAIEmbedding(EmbeddingGenerator):
             return []
 
         # OpenAI supports batch embedding
+        record_batch(self.model, len(texts))
         response = self.client.embeddings.create(
             model=self.model,
             input=texts
@@ -249,26 +256,30 @@ class EmbeddingService:
         if self.enable_cache:
             cache_key = self._get_cache_key(text)
             if cache_key in self.cache:
+                record_cache("embedding", True)
                 cached = self.cache[cache_key]
                 return cached['embedding'], cached['model']
+            record_cache("embedding", False)
 
         embedding = None
         model_used = None
 
         # Try sentence transformer first
-        try:
-            embedding, model_used = await self.sentence_transformer.generate(text)
-        except Exception as e:
-            print(f"Sentence transformer failed: {e}")
-
-            # Fallback to OpenAI if available
-            if self.openai_embedding:
-                try:
-                    embedding, model_used = await self.openai_embedding.generate(text)
-                except Exception as e2:
-                    raise Exception(f"All embedding methods failed: {e}, {e2}")
-            else:
-                raise e
+        with track_stage("embed"):
+            try:
+                embedding, model_used = await self.sentence_transformer.generate(text)
+            except Exception as e:
+                print(f"Sentence transformer failed: {e}")
+
+                # Fallback to OpenAI if available
+                if self.openai_embedding:
+                    record_fallback("embedding")
+                    try:
+                        embedding, model_used = await self.openai_embedding.generate(text)
+                    except Exception as e2:
+                        raise Exception(f"All embedding methods failed: {e}, {e2}")
+                else:
+                    raise e
 
         # Validate dimension if specified
         if expected_dim and len(embedding) != expected_dim:
@@ -286,6 +297,75 @@ class EmbeddingService:
 
         return embedding, model_used
 
+    async def build_query_context(
+        self,
+        query: str,
+        embed: bool = True
+    ) -> QueryContext:
+        """
+        Tokenize and embed a query once for a whole request.
+
+        Args:
+            query: Query text
+            embed: Encode the query (skip for keyword-only requests)
+
+        Returns:
+            Query context shared by search, caching and reranking
+        """
+        if not embed:
+            return build_query_context(query)
+        embedding, model_used = await self.generate_with_fallback(query)
+        return build_query_context(query, embedding, model_used)
+
+    async def generate_batch(
+        self,
+        texts: List[str]
+    ) -> List[Tuple[List[float], str]]:
+        """
+        Generate embeddings for several texts in one model call.
+
+        Cached texts are served from the cache; the rest are encoded as a
+        single batch, falling back to OpenAI if available.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of tuples (embedding, model_used), in input order
+        """
+        results: List[Optional[Tuple[List[float], str]]] = [None] * len(texts)
+        missing: List[int] = []
+        for i, text in enumerate(texts):
+            if self.enable_cache:
+                cached = self.cache.get(self._get_cache_key(text))
+                record_cache("embedding", cached is not None)
+                if cached is not None:
+                    results[i] = (cached['embedding'], cached['model'])
+                    continue
+            missing.append(i)
+
+        if missing:
+            batch = [texts[i] for i in missing]
+            try:
+                generated = await self.sentence_transformer.batch_generate(batch)
+            except Exception as e:
+                print(f"Sentence transformer batch failed: {e}")
+                if not self.openai_embedding:
+                    raise
+                record_fallback("embedding")
+                generated = await self.openai_embedding.batch_generate(batch)
+
+            for i, (embedding, model_used) in zip(missing, generated):
+                results[i] = (embedding, model_used)
+                if self.enable_cache:
+                    self.cache[self._get_cache_key(texts[i])] = {
+                        'embedding': embedding,
+                        'model': model_used,
+                        'timestamp': time.time()
+                    }
+
+        return results
+
     async def process_request(self, request: EmbeddingRequest) -> EmbeddingResponse:
         """
         Process embedding request.
@@ -296,13 +376,13 @@ class EmbeddingService:
         Returns:
             Embedding response
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         # Generate embedding
         embedding, model_used = await self.generate_with_fallback(request.text)
 
         # Calculate processing time
-        processing_time_ms = (time.time() - start_time) * 1000
+        processing_time_ms = (time.perf_counter() - start_time) * 1000
 
         return EmbeddingResponse(
             embedding=embedding,
@@ -356,6 +436,24 @@ async def generate_embedding(
     return embedding
 
 
+async def generate_embeddings(
+    texts: List[str],
+    model: str = "all-MiniLM-L6-v2"
+) -> List[List[float]]:
+    """
+    Generate embeddings for several texts in one batch.
+
+    Args:
+        texts: Texts to embed
+        model: Model to use
+
+    Returns:
+        Embedding vectors in input order
+    """
+    generator = SentenceTransformerEmbedding(model_name=model)
+    return [embedding for embedding, _ in await generator.batch_generate(texts)]
+
+
 async def generate_embedding_with_fallback(
     text: str,
     openai_key: Optional[str] = None
@@ -0,0 +1,216 @@
+"""
+Score fusion module for RAG service.
+Merges ranked result lists from several search engines into one ranking.
+"""
+
+import hashlib
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .interfaces import (
+    FusionMethod,
+    SearchResult,
+)
+
+
+def result_key(result: SearchResult) -> str:
+    """
+    Get the stable identity of a search result.
+
+    Args:
+        result: Search result
+
+    Returns:
+        Record id, or a content digest for results without one
+    """
+    if result.id:
+        return result.id
+    return "sha1:" + hashlib.sha1(result.content.encode()).hexdigest()
+
+
+class ScoreFusion:
+    """
+    Fuse ranked result lists with a bounded heap and early termination.
+
+    Each input list is expected to be ranked best-first, as returned by a
+    search engine. Lists are read in rank order (sorted access) while the
+    full fused score of every newly seen record is computed from per-list
+    lookups (random access). Once the k-th best fused score reaches the
+    best score any unseen record could still get, scanning stops
+    (Fagin's threshold algorithm).
+    """
+
+    def __init__(
+        self,
+        method: FusionMethod = FusionMethod.MIN_MAX,
+        rrf_k: int = 60,
+        early_stop: bool = True
+    ):
+        """
+        Initialize score fusion.
+
+        Args:
+            method: Default fusion method
+            rrf_k: Rank constant for reciprocal rank fusion
+            early_stop: Stop scanning once no unseen record can enter the top-k
+        """
+        if rrf_k < 0:
+            raise ValueError("rrf_k must be non-negative")
+        self.method = method
+        self.rrf_k = rrf_k
+        self.early_stop = early_stop
+
+    def fuse(
+        self,
+        ranked_lists: Sequence[Sequence[SearchResult]],
+        weights: Optional[Sequence[float]] = None,
+        limit: int = 10,
+        method: Optional[FusionMethod] = None
+    ) -> List[SearchResult]:
+        """
+        Fuse ranked lists into a single top-k ranking.
+
+        Args:
+            ranked_lists: Result lists, each ranked best-first
+            weights: Weight per list (defaults to equal weights)
+            limit: Maximum results to return
+            method: Fusion method overriding the default
+
+        Returns:
+            New result objects carrying the fused score, best first
+        """
+        method = method or self.method
+        if weights is None:
+            weights = [1.0] * len(ranked_lists)
+        if len(weights) != len(ranked_lists):
+            raise ValueError("weights must have one entry per ranked list")
+        if any(w < 0 for w in weights):
+            raise ValueError("weights must be non-negative")
+        if limit <= 0:
+            return []
+
+        active = [
+            (results, weight)
+            for results, weight in zip(ranked_lists, weights)
+            if results and weight > 0
+        ]
+        if not active:
+            return []
+
+        total_weight = sum(weight for _, weight in active)
+        contributions = [
+            self._contributions(results, weight / total_weight, method)
+            for results, weight in active
+        ]
+        if method == FusionMethod.RRF:
+            # Scale so a record ranked first everywhere scores 1.0
+            scale = self.rrf_k + 1.0
+            contributions = [[c * scale for c in column] for column in contributions]
+
+        lookups: List[Dict[str, float]] = []
+        for (results, _), column in zip(active, contributions):
+            lookup: Dict[str, float] = {}
+            for result, contribution in zip(results, column):
+                lookup.setdefault(result_key(result), contribution)
+            lookups.append(lookup)
+
+        monotone = all(
+            all(a >= b for a, b in zip(column, column[1:]))
+            for column in contributions
+        )
+        can_stop = self.early_stop and monotone
+
+        heap: List[Tuple[float, int, str]] = []
+        first_seen: Dict[str, SearchResult] = {}
+        order = 0
+        max_depth = max(len(results) for results, _ in active)
+
+        for depth in range(max_depth):
+            for (results, _), column in zip(active, contributions):
+                if depth >= len(results):
+                    continue
+                result = results[depth]
+                key = result_key(result)
+                if key in first_seen:
+                    continue
+                first_seen[key] = result
+
+                score = sum(lookup.get(key, 0.0) for lookup in lookups)
+                entry = (score, -order, key)
+                order += 1
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+            if can_stop and len(heap) == limit:
+                threshold = sum(
+                    column[depth] for column in contributions if depth < len(column)
+                )
+                if heap[0][0] >= threshold:
+                    break
+
+        ranked = sorted(heap, reverse=True)
+        return [
+            first_seen[key].model_copy(update={"score": min(1.0, max(0.0, score))})
+            for score, _, key in ranked
+        ]
+
+    def _contributions(
+        self,
+        results: Sequence[SearchResult],
+        weight: float,
+        method: FusionMethod
+    ) -> List[float]:
+        """
+        Compute the weighted per-rank contribution of one list.
+
+        Args:
+            results: Ranked results
+            weight: Normalized list weight
+            method: Fusion method
+
+        Returns:
+            Contribution of each rank position
+        """
+        if method == FusionMethod.RRF:
+            return [weight / (self.rrf_k + rank + 1) for rank in range(len(results))]
+
+        scores = [r.score for r in results]
+        if method == FusionMethod.Z_SCORE:
+            mean = sum(scores) / len(scores)
+            std = math.sqrt(sum((s - mean) ** 2 for s in scores) / len(scores))
+            if std == 0:
+                return [weight * 0.5] * len(scores)
+            return [
+                weight / (1.0 + math.exp(-(s - mean) / std))
+                for s in scores
+            ]
+
+        low, high = min(scores), max(scores)
+        if high == low:
+            return [weight] * len(scores)
+        return [weight * (s - low) / (high - low) for s in scores]
+
+
+# Convenience function
+def fuse_results(
+    ranked_lists: Sequence[Sequence[SearchResult]],
+    weights: Optional[Sequence[float]] = None,
+    limit: int = 10,
+    method: FusionMethod = FusionMethod.MIN_MAX
+) -> List[SearchResult]:
+    """
+    Fuse ranked result lists.
+
+    Args:
+        ranked_lists: Result lists, each ranked best-first
+        weights: Weight per list
+        limit: Maximum results to return
+        method: Fusion method
+
+    Returns:
+        Fused results
+    """
+    return ScoreFusion(method=method).fuse(ranked_lists, weights, limit)
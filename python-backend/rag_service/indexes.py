@@ -0,0 +1,1397 @@
+"""
+In-memory search indexes for RAG service.
+Provides per-user vector and BM25 keyword indexes with filter push-down.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import re
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+from .interfaces import (
+    VectorStore,
+    Embedding,
+    QueryContext,
+    SearchFilter,
+    SearchResult,
+    ContentType,
+)
+from .cache import normalize_query
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+SECONDS_PER_DAY = 86400.0
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase alphanumeric terms.
+
+    Args:
+        text: Input text
+
+    Returns:
+        List of terms
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def term_id(term: str) -> int:
+    """
+    Map a term to a stable integer id.
+
+    Args:
+        term: Token produced by `tokenize`
+
+    Returns:
+        CRC32 of the term, identical across processes
+    """
+    return zlib.crc32(term.encode())
+
+
+def build_query_context(
+    text: str,
+    embedding: Optional[List[float]] = None,
+    model_name: Optional[str] = None
+) -> QueryContext:
+    """
+    Tokenize a query once for every stage of a request.
+
+    Args:
+        text: Raw query
+        embedding: Query embedding, if already computed
+        model_name: Model that produced the embedding
+
+    Returns:
+        Query context
+    """
+    terms = tokenize(text)
+    return QueryContext(
+        text=text,
+        normalized=normalize_query(text),
+        terms=terms,
+        token_ids=[term_id(term) for term in terms],
+        embedding=embedding,
+        model_name=model_name,
+    )
+
+
+def to_epoch(value: datetime) -> float:
+    """
+    Convert a datetime to epoch seconds, treating naive values as UTC.
+
+    Args:
+        value: Datetime
+
+    Returns:
+        Seconds since the epoch
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def partition_key(value: datetime) -> str:
+    """
+    Get the monthly partition a timestamp belongs to.
+
+    Args:
+        value: Record timestamp
+
+    Returns:
+        Partition key in YYYY-MM form
+    """
+    moment = datetime.fromtimestamp(to_epoch(value), timezone.utc)
+    return f"{moment.year:04d}-{moment.month:02d}"
+
+
+def _partition_bounds(key: str) -> Tuple[float, float]:
+    """Get the [start, end) epoch range of a monthly partition."""
+    year, month = (int(part) for part in key.split("-"))
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start.timestamp(), end.timestamp()
+
+
+def _decay(age_seconds, half_life_seconds: float):
+    """Exponential recency decay factor for an age (scalar or array)."""
+    return 0.5 ** (np.maximum(age_seconds, 0.0) / half_life_seconds)
+
+
+def encode_record(record: Embedding) -> Dict[str, Any]:
+    """
+    Convert an embedding record to JSON-safe data.
+
+    Args:
+        record: Embedding record
+
+    Returns:
+        Serializable dictionary
+    """
+    return {
+        "id": record.id,
+        "user_id": record.user_id,
+        "content": record.content,
+        "content_type": record.content_type.value,
+        "embedding_vector": [float(x) for x in record.embedding_vector],
+        "model_name": record.model_name,
+        "dimension": record.dimension,
+        "metadata": record.metadata,
+        "created_at": record.created_at.isoformat(),
+        "updated_at": record.updated_at.isoformat() if record.updated_at else None,
+    }
+
+
+def decode_record(data: Dict[str, Any]) -> Embedding:
+    """
+    Rebuild an embedding record from `encode_record` output.
+
+    Args:
+        data: Serialized record
+
+    Returns:
+        Embedding record
+    """
+    return Embedding(
+        id=data["id"],
+        user_id=data["user_id"],
+        content=data["content"],
+        content_type=ContentType(data["content_type"]),
+        embedding_vector=data["embedding_vector"],
+        model_name=data["model_name"],
+        dimension=data["dimension"],
+        metadata=data["metadata"],
+        created_at=datetime.fromisoformat(data["created_at"]),
+        updated_at=datetime.fromisoformat(data["updated_at"]) if data["updated_at"] else None,
+    )
+
+
+def _attribute_keys(result: SearchResult) -> Iterable[Tuple[str, Any]]:
+    """Yield the hashable attributes of a result that filters can match."""
+    yield ("source", result.source)
+    for key, value in result.metadata.items():
+        try:
+            hash(value)
+        except TypeError:
+            continue
+        yield ("metadata:" + key, value)
+
+
+class _SubIndex:
+    """
+    Rows of one content type with attribute and time indexes for filters.
+
+    Rows are append-only; deleting a record sets its bit in the tombstone
+    bitmap and searches skip it until compaction drops the row.
+    """
+
+    def __init__(self):
+        self.payloads: List[SearchResult] = []
+        self._attributes: Optional[Dict[Tuple[str, Any], Set[int]]] = {}
+        self.times = np.zeros(0, dtype=np.float64)
+        self.deleted = np.zeros(0, dtype=bool)
+        self.deleted_count = 0
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def tombstone(self, row: int) -> None:
+        """Mark a row deleted."""
+        if not self.deleted[row]:
+            self.deleted[row] = True
+            self.deleted_count += 1
+
+    @property
+    def attributes(self) -> Dict[Tuple[str, Any], Set[int]]:
+        """Attribute index of the rows, rebuilt on first use after `restore`."""
+        if self._attributes is None:
+            attributes: Dict[Tuple[str, Any], Set[int]] = {}
+            for row, payload in enumerate(self.payloads):
+                for attribute in _attribute_keys(payload):
+                    attributes.setdefault(attribute, set()).add(row)
+            self._attributes = attributes
+        return self._attributes
+
+    def restore(self, payloads: List[SearchResult], times: np.ndarray) -> None:
+        """
+        Load rows from a snapshot.
+
+        The attribute index is rebuilt by the first filtered search, so
+        restoring never reads the payloads.
+
+        Args:
+            payloads: Row payloads in row order (a list or `MappedPayloads`)
+            times: Row timestamps in epoch seconds (may be memory-mapped)
+        """
+        self.payloads = payloads.copy()
+        self.times = times
+        self.deleted = np.zeros(len(self.payloads), dtype=bool)
+        self.deleted_count = 0
+        self._attributes = None
+
+    def _add_payload(self, payload: SearchResult) -> int:
+        row = len(self.payloads)
+        self.payloads.append(payload)
+        if self._attributes is not None:
+            for attribute in _attribute_keys(payload):
+                self._attributes.setdefault(attribute, set()).add(row)
+        if row >= self.times.shape[0]:
+            grown = np.zeros(max(8, row * 2), dtype=np.float64)
+            grown[:row] = self.times[:row]
+            self.times = grown
+        if row >= self.deleted.shape[0]:
+            grown = np.zeros(max(8, row * 2), dtype=bool)
+            grown[:row] = self.deleted[:row]
+            self.deleted = grown
+        self.times[row] = to_epoch(payload.timestamp)
+        return row
+
+    def candidate_rows(
+        self,
+        filters: Optional[SearchFilter],
+        time_range: Optional[Tuple[float, float]] = None
+    ) -> Optional[Set[int]]:
+        """
+        Resolve the rows matching the source, metadata and time filters.
+
+        Args:
+            filters: Search filter
+            time_range: Inclusive epoch range when it cuts through this segment
+
+        Returns:
+            Matching rows, or None when every row matches
+        """
+        row_sets: List[Set[int]] = []
+        unindexed: Dict[str, Any] = {}
+
+        if time_range is not None:
+            times = self.times[:len(self)]
+            in_range = (times >= time_range[0]) & (times <= time_range[1])
+            row_sets.append(set(np.nonzero(in_range)[0].tolist()))
+
+        if filters is not None:
+            if filters.sources is not None:
+                rows: Set[int] = set()
+                for source in filters.sources:
+                    rows |= self.attributes.get(("source", source), set())
+                row_sets.append(rows)
+
+            for key, value in (filters.metadata or {}).items():
+                try:
+                    hash(value)
+                except TypeError:
+                    unindexed[key] = value
+                    continue
+                row_sets.append(self.attributes.get(("metadata:" + key, value), set()))
+
+        if not row_sets and not unindexed:
+            return None
+
+        if row_sets:
+            row_sets.sort(key=len)
+            rows = set(row_sets[0])
+            for other in row_sets[1:]:
+                rows &= other
+        else:
+            rows = set(range(len(self.payloads)))
+
+        if unindexed:
+            rows = {
+                row for row in rows
+                if all(
+                    self.payloads[row].metadata.get(key) == value
+                    for key, value in unindexed.items()
+                )
+            }
+        return rows
+
+
+class VectorSubIndex(_SubIndex):
+    """Dense vectors of one content type stored in a growable matrix."""
+
+    def __init__(self, dimension: int):
+        super().__init__()
+        self.dimension = dimension
+        self.matrix = np.zeros((0, dimension), dtype=np.float32)
+
+    def add(self, payload: SearchResult, vector: np.ndarray) -> int:
+        """
+        Append a row.
+
+        Args:
+            payload: Result template returned on a hit
+            vector: Unit-normalized embedding
+
+        Returns:
+            Row number
+        """
+        row = self._add_payload(payload)
+        if row >= self.matrix.shape[0]:
+            grown = np.zeros((max(8, row * 2), self.dimension), dtype=np.float32)
+            grown[:row] = self.matrix[:row]
+            self.matrix = grown
+        self.matrix[row] = vector
+        return row
+
+    def vector(self, row: int) -> np.ndarray:
+        """Get the stored vector of a row."""
+        return self.matrix[row]
+
+    def spill(self, path: str) -> None:
+        """
+        Move the vectors to disk and memory-map them back read-only.
+
+        Appending to a spilled sub-index copies the matrix back into memory.
+
+        Args:
+            path: Target .npy file
+        """
+        np.save(path, np.ascontiguousarray(self.matrix[:len(self)]))
+        self.matrix = np.load(path, mmap_mode="r")
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        limit: int,
+        threshold: float,
+        rows: Optional[Set[int]] = None,
+        decay: Optional[Tuple[float, float]] = None
+    ) -> List[Tuple[float, int]]:
+        """
+        Score rows by cosine similarity.
+
+        Args:
+            query_vector: Unit-normalized query embedding
+            limit: Maximum hits
+            threshold: Minimum similarity
+            rows: Candidate rows (None for all)
+            decay: (now, half-life) in seconds for recency decay
+
+        Returns:
+            List of (score, row) tuples, unordered
+        """
+        if rows is None:
+            row_ids = np.arange(len(self), dtype=np.int64)
+            scores = self.matrix[:len(self)] @ query_vector
+        else:
+            if not rows:
+                return []
+            row_ids = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            scores = self.matrix[row_ids] @ query_vector
+
+        keep = scores >= threshold
+        if self.deleted_count:
+            keep &= ~self.deleted[row_ids]
+        row_ids, scores = row_ids[keep], scores[keep]
+        if decay is not None:
+            now, half_life = decay
+            scores = scores * _decay(now - self.times[row_ids], half_life)
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            row_ids, scores = row_ids[top], scores[top]
+        return [(float(s), int(r)) for s, r in zip(scores, row_ids)]
+
+
+    def search_batch(
+        self,
+        query_matrix: np.ndarray,
+        limit: int,
+        threshold: float,
+        rows: Optional[Set[int]] = None,
+        decay: Optional[Tuple[float, float]] = None
+    ) -> List[List[Tuple[float, int]]]:
+        """
+        Score rows against several queries with one matrix-matrix product.
+
+        Args:
+            query_matrix: Unit-normalized query embeddings, one per row
+            limit: Maximum hits per query
+            threshold: Minimum similarity
+            rows: Candidate rows (None for all)
+            decay: (now, half-life) in seconds for recency decay
+
+        Returns:
+            One list of (score, row) tuples per query, unordered
+        """
+        if rows is None:
+            row_ids = np.arange(len(self), dtype=np.int64)
+            scores = self.matrix[:len(self)] @ query_matrix.T
+        else:
+            if not rows:
+                return [[] for _ in range(query_matrix.shape[0])]
+            row_ids = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            scores = self.matrix[row_ids] @ query_matrix.T
+
+        weights = None
+        if decay is not None:
+            now, half_life = decay
+            weights = _decay(now - self.times[row_ids], half_life)
+        live = ~self.deleted[row_ids] if self.deleted_count else None
+
+        hits = []
+        for column in range(query_matrix.shape[0]):
+            column_scores = scores[:, column]
+            keep = column_scores >= threshold
+            if live is not None:
+                keep &= live
+            kept_rows, kept_scores = row_ids[keep], column_scores[keep]
+            if weights is not None:
+                kept_scores = kept_scores * weights[keep]
+            if len(kept_scores) > limit:
+                top = np.argpartition(-kept_scores, limit - 1)[:limit]
+                kept_rows, kept_scores = kept_rows[top], kept_scores[top]
+            hits.append([(float(s), int(r)) for s, r in zip(kept_scores, kept_rows)])
+        return hits
+
+
+class KeywordSubIndex(_SubIndex):
+    """BM25 postings of one content type."""
+
+    def __init__(self):
+        super().__init__()
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: List[int] = []
+
+    def add(self, payload: SearchResult, terms: List[str]) -> int:
+        """
+        Append a document.
+
+        Args:
+            payload: Result template returned on a hit
+            terms: Document terms
+
+        Returns:
+            Row number
+        """
+        row = self._add_payload(payload)
+        self.doc_lengths.append(len(terms))
+        for term, count in Counter(terms).items():
+            self.postings.setdefault(term, {})[row] = count
+        return row
+
+
+def _export(vectors: VectorSubIndex, row: int) -> Embedding:
+    """Rebuild the record stored in a row (user and model are not kept)."""
+    payload = vectors.payloads[row]
+    return Embedding(
+        id=payload.id,
+        user_id="",
+        content=payload.content,
+        content_type=payload.content_type,
+        embedding_vector=vectors.vector(row).tolist(),
+        model_name="",
+        dimension=vectors.dimension,
+        metadata=payload.metadata,
+        created_at=payload.timestamp,
+    )
+
+
+def compact_rows(
+    vectors: VectorSubIndex,
+    keywords: KeywordSubIndex,
+    upto: int,
+    deleted: Optional[np.ndarray] = None
+) -> Tuple[VectorSubIndex, KeywordSubIndex, np.ndarray]:
+    """
+    Copy the live rows of a sub-index pair into new sub-indexes.
+
+    Only reads the originals, so searches and appends can continue while
+    this runs in a worker thread.
+
+    Args:
+        vectors: Vector sub-index
+        keywords: Keyword sub-index with the same rows
+        upto: Number of leading rows to copy
+        deleted: Tombstones of those rows taken earlier (default: current)
+
+    Returns:
+        Tuple of (vectors, keywords, new row of each old row or -1)
+    """
+    deleted = np.array(vectors.deleted[:upto] if deleted is None else deleted[:upto])
+    live = np.nonzero(~deleted)[0]
+    mapping = np.full(upto, -1, dtype=np.int64)
+    mapping[live] = np.arange(len(live))
+
+    payloads = [vectors.payloads[row] for row in live]
+    times = np.array(vectors.times[live], dtype=np.float64)
+    compacted_vectors = VectorSubIndex(vectors.dimension)
+    compacted_vectors.restore(payloads, times)
+    compacted_vectors.matrix = np.array(vectors.matrix[live], dtype=np.float32)
+
+    compacted_keywords = KeywordSubIndex()
+    compacted_keywords.restore(payloads, times.copy())
+    compacted_keywords.doc_lengths = [keywords.doc_lengths[row] for row in live]
+    for term, rows in list(keywords.postings.items()):
+        remapped = {
+            int(mapping[row]): count
+            for row, count in list(rows.items())
+            if row < upto and mapping[row] >= 0
+        }
+        if remapped:
+            compacted_keywords.postings[term] = remapped
+    return compacted_vectors, compacted_keywords, mapping
+
+
+class Segment:
+    """One monthly time partition holding per-content-type sub-indexes."""
+
+    def __init__(self, key: str):
+        """
+        Initialize segment.
+
+        Args:
+            key: Partition key in YYYY-MM form
+        """
+        self.key = key
+        self.start, self.end = _partition_bounds(key)
+        self.vectors: Dict[ContentType, VectorSubIndex] = {}
+        self.keywords: Dict[ContentType, KeywordSubIndex] = {}
+        self.cold = False
+
+    def time_range(
+        self,
+        since: float,
+        until: float
+    ) -> Optional[Tuple[float, float]]:
+        """Get the row-level time filter needed when a range cuts through this segment."""
+        if since <= self.start and until >= self.end:
+            return None
+        return since, until
+
+    def freeze(self, directory: str) -> None:
+        """
+        Keep this segment's vectors cold on disk.
+
+        Args:
+            directory: Directory for the segment files
+        """
+        os.makedirs(directory, exist_ok=True)
+        for content_type, sub_index in self.vectors.items():
+            sub_index.spill(os.path.join(directory, f"{self.key}-{content_type.value}.npy"))
+        self.cold = True
+
+
+class UserIndex:
+    """
+    All indexed records of one user.
+
+    Records are partitioned into monthly segments, each split into
+    per-content-type sub-indexes, so date-range queries only touch the
+    segments they overlap and older segments can be kept on disk. An id
+    map locates every live record, so deletes only set a tombstone bit.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Initialize user index.
+
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.dimension: Optional[int] = None
+        self.segments: Dict[str, Segment] = {}
+        self.locations: Dict[str, Tuple[str, ContentType, int]] = {}
+        self.doc_freq: Dict[str, int] = {}
+        self.total_length = 0
+        self.tombstones = 0
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def compactable(self) -> Tuple[int, int]:
+        """Deleted and total rows of the segments compaction rewrites (not cold ones)."""
+        deleted = rows = 0
+        for segment in self.segments.values():
+            if segment.cold:
+                continue
+            for vectors in segment.vectors.values():
+                deleted += vectors.deleted_count
+                rows += len(vectors)
+        return deleted, rows
+
+    def add(self, record: Embedding) -> None:
+        """
+        Add a record to the vector and keyword sub-indexes of its segment.
+
+        Args:
+            record: Embedding record
+        """
+        if record.id in self.locations:
+            raise ValueError(f"Record {record.id} is already indexed")
+
+        vector = np.asarray(record.embedding_vector, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = vector.shape[0]
+        elif vector.shape[0] != self.dimension:
+            raise ValueError(
+                f"Unexpected embedding dimension: got {vector.shape[0]}, expected {self.dimension}"
+            )
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+
+        payload = SearchResult(
+            id=record.id,
+            content=record.content,
+            content_type=record.content_type,
+            score=0.0,
+            metadata=record.metadata or {},
+            source=(record.metadata or {}).get("source", record.content_type.value),
+            timestamp=record.created_at,
+        )
+        terms = tokenize(record.content)
+
+        key = partition_key(record.created_at)
+        segment = self.segments.get(key)
+        if segment is None:
+            segment = self.segments[key] = Segment(key)
+        vectors = segment.vectors.get(record.content_type)
+        if vectors is None:
+            vectors = segment.vectors[record.content_type] = VectorSubIndex(self.dimension)
+            segment.keywords[record.content_type] = KeywordSubIndex()
+        row = vectors.add(payload, vector)
+        segment.keywords[record.content_type].add(payload, terms)
+
+        for term in set(terms):
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+        self.total_length += len(terms)
+        self.locations[record.id] = (key, record.content_type, row)
+
+    def remove(self, record_id: str) -> Optional[Embedding]:
+        """
+        Remove a record by tombstoning its row in O(1).
+
+        Args:
+            record_id: Record identifier
+
+        Returns:
+            The removed record, or None if it was not indexed
+        """
+        location = self.locations.pop(record_id, None)
+        if location is None:
+            return None
+        key, content_type, row = location
+        segment = self.segments[key]
+        vectors = segment.vectors[content_type]
+        keywords = segment.keywords[content_type]
+
+        removed = _export(vectors, row)
+        vectors.tombstone(row)
+        keywords.tombstone(row)
+        for term in set(tokenize(removed.content)):
+            self.doc_freq[term] -= 1
+            if not self.doc_freq[term]:
+                del self.doc_freq[term]
+        self.total_length -= keywords.doc_lengths[row]
+        self.tombstones += 1
+        return removed
+
+    def upsert(self, record: Embedding) -> bool:
+        """
+        Insert a record or replace the indexed record with the same id.
+
+        Args:
+            record: Embedding record
+
+        Returns:
+            True if a record was replaced
+        """
+        replaced = self.remove(record.id) is not None
+        self.add(record)
+        return replaced
+
+    def records(self, key: str, content_type: ContentType) -> List[Embedding]:
+        """
+        Export the live records of one content type within a segment.
+
+        Args:
+            key: Partition key
+            content_type: Content type
+
+        Returns:
+            Records in insertion order
+        """
+        segment = self.segments.get(key)
+        vectors = segment.vectors.get(content_type) if segment else None
+        if vectors is None:
+            return []
+        return [
+            _export(vectors, row)
+            for row in range(len(vectors))
+            if not vectors.deleted[row]
+        ]
+
+    def tombstoned(self) -> List[Tuple[str, ContentType]]:
+        """Get the (segment, content type) pairs holding deleted rows."""
+        return [
+            (key, content_type)
+            for key, segment in self.segments.items()
+            if not segment.cold
+            for content_type, vectors in segment.vectors.items()
+            if vectors.deleted_count
+        ]
+
+    def install_compacted(
+        self,
+        key: str,
+        content_type: ContentType,
+        old_vectors: "VectorSubIndex",
+        compacted: Tuple["VectorSubIndex", "KeywordSubIndex", np.ndarray],
+        upto: int
+    ) -> int:
+        """
+        Swap in sub-indexes rebuilt by `compact_rows`.
+
+        Rows appended and records deleted while the copy was built are
+        carried over first, so no write made during compaction is lost.
+
+        Args:
+            key: Partition key
+            content_type: Content type
+            old_vectors: Vector sub-index the copy was built from
+            compacted: Output of `compact_rows`
+            upto: Row count of the old sub-index when the copy started
+
+        Returns:
+            Number of tombstoned rows reclaimed (0 if the copy is stale)
+        """
+        segment = self.segments.get(key)
+        if segment is None or segment.cold or segment.vectors.get(content_type) is not old_vectors:
+            return 0
+        old_keywords = segment.keywords[content_type]
+        vectors, keywords, mapping = compacted
+        reclaimed = upto - len(vectors)
+
+        for row in np.nonzero(old_vectors.deleted[:upto] & (mapping >= 0))[0]:
+            vectors.tombstone(int(mapping[row]))
+            keywords.tombstone(int(mapping[row]))
+        for row in range(upto, len(old_vectors)):
+            if old_vectors.deleted[row]:
+                reclaimed += 1
+                continue
+            payload = old_vectors.payloads[row]
+            vectors.add(payload, old_vectors.vector(row))
+            keywords.add(payload, tokenize(payload.content))
+        self.tombstones -= reclaimed
+
+        if vectors.deleted_count == len(vectors):
+            del segment.vectors[content_type]
+            del segment.keywords[content_type]
+            self.tombstones -= vectors.deleted_count
+            if not segment.vectors:
+                del self.segments[key]
+            return reclaimed + vectors.deleted_count
+
+        segment.vectors[content_type] = vectors
+        segment.keywords[content_type] = keywords
+        for row, payload in enumerate(vectors.payloads):
+            if not vectors.deleted[row]:
+                self.locations[payload.id] = (key, content_type, row)
+        return reclaimed
+
+    def freeze_segments(self, before: datetime, directory: str) -> List[str]:
+        """
+        Keep the vectors of segments that ended before a cutoff on disk.
+
+        Args:
+            before: Segments ending at or before this time are frozen
+            directory: Directory for the segment files
+
+        Returns:
+            Keys of the newly frozen segments
+        """
+        cutoff = to_epoch(before)
+        frozen = []
+        for key, segment in self.segments.items():
+            if not segment.cold and segment.end <= cutoff:
+                segment.freeze(directory)
+                frozen.append(key)
+        return frozen
+
+    def _plan(
+        self,
+        filters: Optional[SearchFilter]
+    ) -> List[Tuple[Segment, Optional[Tuple[float, float]], List[ContentType]]]:
+        """
+        Select the segments and content types a query has to scan.
+
+        Args:
+            filters: Search filter
+
+        Returns:
+            (segment, row-level time range, content types), newest segment first
+        """
+        since = to_epoch(filters.since) if filters and filters.since else -math.inf
+        until = to_epoch(filters.until) if filters and filters.until else math.inf
+        content_types = filters.content_types if filters else None
+
+        plan = []
+        for key in sorted(self.segments, reverse=True):
+            segment = self.segments[key]
+            if segment.end <= since or segment.start > until:
+                continue
+            if content_types is None:
+                scope = list(segment.vectors)
+            else:
+                scope = [t for t in content_types if t in segment.vectors]
+            if scope:
+                plan.append((segment, segment.time_range(since, until), scope))
+        return plan
+
+    def search_vectors(
+        self,
+        query_vector: List[float],
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        now: Optional[float] = None
+    ) -> List[SearchResult]:
+        """
+        Search by cosine similarity.
+
+        Args:
+            query_vector: Query embedding
+            limit: Maximum results
+            threshold: Minimum similarity
+            filters: Filter applied before ranking
+            recency_half_life_days: Halve scores every this many days of age
+            now: Reference epoch time for recency decay
+
+        Returns:
+            Results ranked by (decayed) similarity
+        """
+        if self.dimension is None or limit <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        if query.shape[0] != self.dimension:
+            raise ValueError(
+                f"Unexpected query dimension: got {query.shape[0]}, expected {self.dimension}"
+            )
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        decay = None
+        if recency_half_life_days:
+            decay = (now if now is not None else time.time(), recency_half_life_days * SECONDS_PER_DAY)
+
+        hits: List[Tuple[float, int, SearchResult]] = []
+        order = itertools.count()
+        for segment, time_range, scope in self._plan(filters):
+            if decay is not None and len(hits) == limit:
+                # Similarity is at most 1, so an older segment cannot beat the k-th hit
+                if _decay(decay[0] - segment.end, decay[1]) <= hits[0][0]:
+                    break
+            for content_type in scope:
+                sub_index = segment.vectors[content_type]
+                rows = sub_index.candidate_rows(filters, time_range)
+                for score, row in sub_index.search(query, limit, threshold, rows, decay):
+                    self._push(hits, limit, score, next(order), sub_index.payloads[row])
+
+        return [
+            payload.model_copy(update={"score": min(1.0, max(0.0, score))})
+            for score, _, payload in sorted(hits, key=lambda hit: hit[0], reverse=True)
+        ]
+
+    def search_vectors_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        now: Optional[float] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Search several query vectors in one pass over the user's segments.
+
+        Args:
+            query_vectors: Query embeddings
+            limit: Maximum results per query
+            threshold: Minimum similarity
+            filters: Filter applied before ranking
+            recency_half_life_days: Halve scores every this many days of age
+            now: Reference epoch time for recency decay
+
+        Returns:
+            Results ranked by (decayed) similarity, one list per query
+        """
+        if not query_vectors:
+            return []
+        if self.dimension is None or limit <= 0:
+            return [[] for _ in query_vectors]
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.dimension:
+            raise ValueError(
+                f"Unexpected query dimension: got {queries.shape[-1]}, expected {self.dimension}"
+            )
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1.0)
+
+        decay = None
+        if recency_half_life_days:
+            decay = (now if now is not None else time.time(), recency_half_life_days * SECONDS_PER_DAY)
+
+        hits: List[List[Tuple[float, int, SearchResult]]] = [[] for _ in query_vectors]
+        order = itertools.count()
+        for segment, time_range, scope in self._plan(filters):
+            if decay is not None and all(len(h) == limit for h in hits):
+                bound = _decay(decay[0] - segment.end, decay[1])
+                if all(bound <= h[0][0] for h in hits):
+                    break
+            for content_type in scope:
+                sub_index = segment.vectors[content_type]
+                rows = sub_index.candidate_rows(filters, time_range)
+                batch = sub_index.search_batch(queries, limit, threshold, rows, decay)
+                for query_hits, column in zip(hits, batch):
+                    for score, row in column:
+                        self._push(query_hits, limit, score, next(order), sub_index.payloads[row])
+
+        return [
+            [
+                payload.model_copy(update={"score": min(1.0, max(0.0, score))})
+                for score, _, payload in sorted(query_hits, key=lambda hit: hit[0], reverse=True)
+            ]
+            for query_hits in hits
+        ]
+
+    def search_keywords(
+        self,
+        query: str,
+        limit: int,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        now: Optional[float] = None,
+        terms: Optional[List[str]] = None
+    ) -> List[SearchResult]:
+        """
+        Search with BM25 over the user's documents.
+
+        Args:
+            query: Search query
+            limit: Maximum results
+            filters: Filter applied before ranking
+            recency_half_life_days: Halve scores every this many days of age
+            now: Reference epoch time for recency decay
+            terms: Pre-tokenized query terms
+
+        Returns:
+            Results ranked by BM25, with scores mapped into [0, 1)
+        """
+        terms = set(terms if terms is not None else tokenize(query))
+        if not terms or not self.locations or limit <= 0:
+            return []
+
+        doc_count = len(self.locations)
+        avg_length = self.total_length / doc_count or 1.0
+        idf = {
+            term: math.log(1 + (doc_count - self.doc_freq[term] + 0.5) / (self.doc_freq[term] + 0.5))
+            for term in terms
+            if term in self.doc_freq
+        }
+
+        decay = None
+        if recency_half_life_days:
+            decay = (now if now is not None else time.time(), recency_half_life_days * SECONDS_PER_DAY)
+
+        hits: List[Tuple[float, int, SearchResult]] = []
+        order = itertools.count()
+        for segment, time_range, scope in self._plan(filters):
+            if decay is not None and len(hits) == limit:
+                if _decay(decay[0] - segment.end, decay[1]) <= hits[0][0]:
+                    break
+            for content_type in scope:
+                sub_index = segment.keywords[content_type]
+                rows = sub_index.candidate_rows(filters, time_range)
+                deleted = sub_index.deleted if sub_index.deleted_count else None
+                scores: Dict[int, float] = {}
+                for term, weight in idf.items():
+                    for row, freq in sub_index.postings.get(term, {}).items():
+                        if rows is not None and row not in rows:
+                            continue
+                        if deleted is not None and deleted[row]:
+                            continue
+                        length_norm = 1 - self.b + self.b * sub_index.doc_lengths[row] / avg_length
+                        scores[row] = scores.get(row, 0.0) + weight * freq * (self.k1 + 1) / (
+                            freq + self.k1 * length_norm
+                        )
+                for row, score in scores.items():
+                    score = score / (score + 1.0)
+                    if decay is not None:
+                        score *= float(_decay(decay[0] - sub_index.times[row], decay[1]))
+                    self._push(hits, limit, score, next(order), sub_index.payloads[row])
+
+        return [
+            payload.model_copy(update={"score": score})
+            for score, _, payload in sorted(hits, key=lambda hit: hit[0], reverse=True)
+        ]
+
+    @staticmethod
+    def _push(
+        hits: List[Tuple[float, int, SearchResult]],
+        limit: int,
+        score: float,
+        order: int,
+        payload: SearchResult
+    ) -> None:
+        """Keep the best `limit` hits in a min-heap."""
+        entry = (score, -order, payload)
+        if len(hits) < limit:
+            heapq.heappush(hits, entry)
+        elif score > hits[0][0]:
+            heapq.heapreplace(hits, entry)
+
+
+class InMemorySearchIndex(VectorStore):
+    """In-memory vector store and full-text index keyed by user."""
+
+    def __init__(
+        self,
+        compaction_threshold: float = 0.25,
+        min_compaction_tombstones: int = 32
+    ):
+        """
+        Initialize the in-memory search index.
+
+        Args:
+            compaction_threshold: Tombstone ratio that triggers compaction
+            min_compaction_tombstones: Fewest tombstones worth compacting
+        """
+        self.users: Dict[str, UserIndex] = {}
+        self.owners: Dict[str, str] = {}
+        # Write-ahead log recording every write (see snapshot.WriteAheadLog)
+        self.write_log = None
+        self.compaction_threshold = compaction_threshold
+        self.min_compaction_tombstones = min_compaction_tombstones
+        self._compactions: Dict[str, asyncio.Task] = {}
+
+    def user_index(self, user_id: str, create: bool = False) -> Optional[UserIndex]:
+        """
+        Get the index of one user.
+
+        Args:
+            user_id: User identifier
+            create: Create an empty index when missing
+
+        Returns:
+            User index or None
+        """
+        index = self.users.get(user_id)
+        if index is None and create:
+            index = self.users[user_id] = UserIndex()
+        return index
+
+    async def store(self, embedding: Embedding) -> str:
+        """
+        Store embedding in the index.
+
+        Args:
+            embedding: Embedding to store
+
+        Returns:
+            Stored embedding ID
+        """
+        record_id = self.apply_store(embedding)
+        if self.write_log is not None:
+            self.write_log.append("store", record=encode_record(embedding))
+        return record_id
+
+    def apply_store(self, embedding: Embedding) -> str:
+        """Add a record without logging it."""
+        self.user_index(embedding.user_id, create=True).add(embedding)
+        self.owners[embedding.id] = embedding.user_id
+        return embedding.id
+
+    async def search_similar(
+        self,
+        query_vector: List[float],
+        user_id: str,
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None
+    ) -> List[SearchResult]:
+        """
+        Search for similar vectors.
+
+        Args:
+            query_vector: Query embedding
+            user_id: User identifier
+            limit: Maximum results
+            threshold: Similarity threshold
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+
+        Returns:
+            List of similar results
+        """
+        index = self.user_index(user_id)
+        if index is None:
+            return []
+        return index.search_vectors(
+            query_vector, limit, threshold, filters, recency_half_life_days
+        )
+
+    async def search_similar_batch(
+        self,
+        query_vectors: List[List[float]],
+        user_id: str,
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Search for vectors similar to each of several queries.
+
+        Args:
+            query_vectors: Query embeddings
+            user_id: User identifier
+            limit: Maximum results per query
+            threshold: Similarity threshold
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+
+        Returns:
+            One result list per query
+        """
+        index = self.user_index(user_id)
+        if index is None:
+            return [[] for _ in query_vectors]
+        return index.search_vectors_batch(
+            query_vectors, limit, threshold, filters, recency_half_life_days
+        )
+
+    async def full_text_search(
+        self,
+        query: str,
+        user_id: str,
+        limit: int,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        terms: Optional[List[str]] = None
+    ) -> List[SearchResult]:
+        """
+        Full-text search.
+
+        Args:
+            query: Search query
+            user_id: User identifier
+            limit: Maximum results
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+            terms: Pre-tokenized query terms
+
+        Returns:
+            List of matching results
+        """
+        index = self.user_index(user_id)
+        if index is None:
+            return []
+        return index.search_keywords(
+            query, limit, filters, recency_half_life_days, terms=terms
+        )
+
+    def export_user(self, user_id: str) -> List[Embedding]:
+        """
+        Export every record of one user.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            Records with their stored (unit-normalized) vectors
+        """
+        index = self.user_index(user_id)
+        if index is None:
+            return []
+        records = []
+        for key, segment in sorted(index.segments.items()):
+            for content_type in segment.vectors:
+                for record in index.records(key, content_type):
+                    record.user_id = user_id
+                    records.append(record)
+        return records
+
+    def drop_user(self, user_id: str) -> int:
+        """
+        Remove one user's index entirely.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            Number of records dropped
+        """
+        dropped = self.apply_drop_user(user_id)
+        if dropped and self.write_log is not None:
+            self.write_log.append("drop_user", user_id=user_id)
+        return dropped
+
+    def apply_drop_user(self, user_id: str) -> int:
+        """Remove a user's index without logging it."""
+        index = self.users.pop(user_id, None)
+        if index is None:
+            return 0
+        for record_id in index.locations:
+            self.owners.pop(record_id, None)
+        return len(index)
+
+    def freeze_segments(self, before: datetime, directory: str) -> int:
+        """
+        Keep every user's segments that ended before a cutoff on disk.
+
+        Args:
+            before: Segments ending at or before this time are frozen
+            directory: Root directory, one sub-directory per user
+
+        Returns:
+            Number of newly frozen segments
+        """
+        return sum(
+            len(index.freeze_segments(before, os.path.join(directory, user_id)))
+            for user_id, index in self.users.items()
+        )
+
+    async def delete(self, embedding_id: str) -> bool:
+        """
+        Delete embedding from the index.
+
+        Args:
+            embedding_id: ID of embedding to delete
+
+        Returns:
+            True if deleted, False otherwise
+        """
+        user_id = self.owners.get(embedding_id)
+        deleted = self.apply_delete(embedding_id)
+        if deleted and self.write_log is not None:
+            self.write_log.append("delete", embedding_id=embedding_id)
+        if deleted:
+            self._maybe_compact(user_id)
+        return deleted
+
+    def apply_delete(self, embedding_id: str) -> bool:
+        """Remove a record without logging it."""
+        user_id = self.owners.pop(embedding_id, None)
+        if user_id is None:
+            return False
+        return self.users[user_id].remove(embedding_id) is not None
+
+    async def update(self, embedding: Embedding) -> bool:
+        """
+        Update existing embedding.
+
+        Args:
+            embedding: Updated embedding data
+
+        Returns:
+            True if updated, False otherwise
+        """
+        updated = self.apply_update(embedding)
+        if updated and self.write_log is not None:
+            self.write_log.append("update", record=encode_record(embedding))
+        if updated:
+            self._maybe_compact(embedding.user_id)
+        return updated
+
+    def apply_update(self, embedding: Embedding) -> bool:
+        """Replace a record without logging it."""
+        if not self.apply_delete(embedding.id):
+            return False
+        self.apply_store(embedding)
+        return True
+
+    async def upsert(self, embedding: Embedding) -> bool:
+        """
+        Store an embedding, replacing any record with the same ID.
+
+        Args:
+            embedding: Embedding to store
+
+        Returns:
+            True if an existing record was replaced
+        """
+        replaced = self.apply_upsert(embedding)
+        if self.write_log is not None:
+            self.write_log.append("upsert", record=encode_record(embedding))
+        if replaced:
+            self._maybe_compact(embedding.user_id)
+        return replaced
+
+    def apply_upsert(self, embedding: Embedding) -> bool:
+        """Insert or replace a record without logging it."""
+        replaced = self.apply_delete(embedding.id)
+        self.apply_store(embedding)
+        return replaced
+
+    def _maybe_compact(self, user_id: str) -> None:
+        """
+        Schedule background compaction once a user's tombstones pile up.
+
+        Args:
+            user_id: User identifier
+        """
+        index = self.users.get(user_id)
+        if (
+            index is None
+            or user_id in self._compactions
+            or index.tombstones < self.min_compaction_tombstones
+        ):
+            return
+        # Compaction skips cold segments, so counting their tombstones
+        # would schedule compactions that reclaim nothing
+        deleted, rows = index.compactable()
+        if deleted < self.min_compaction_tombstones or deleted < self.compaction_threshold * rows:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.compact_user(user_id))
+        self._compactions[user_id] = task
+        task.add_done_callback(lambda _: self._compactions.pop(user_id, None))
+
+    async def compact_user(self, user_id: str) -> int:
+        """
+        Rewrite a user's sub-indexes without their tombstoned rows.
+
+        Copies are built in a worker thread while searches keep reading
+        the current sub-indexes; each copy is swapped in on the event
+        loop, so readers never see a half-built index.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            Number of tombstoned rows reclaimed
+        """
+        index = self.users.get(user_id)
+        if index is None:
+            return 0
+        reclaimed = 0
+        for key, content_type in index.tombstoned():
+            segment = index.segments.get(key)
+            if segment is None or content_type not in segment.vectors:
+                continue
+            vectors = segment.vectors[content_type]
+            keywords = segment.keywords[content_type]
+            upto = len(vectors)
+            compacted = await asyncio.to_thread(compact_rows, vectors, keywords, upto)
+            if self.users.get(user_id) is not index:
+                break
+            reclaimed += index.install_compacted(key, content_type, vectors, compacted, upto)
+        return reclaimed
@@ -5,9 +5,9 @@ These interfaces define the contracts for all components.
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Literal, Optional, Tuple
 from pydantic import BaseModel, Field
 
 
@@ -30,6 +30,20 @@ class SearchStrategy(str, Enum):
     HYBRID = "hybrid"
 
 
+class FusionMethod(str, Enum):
+    """Methods for fusing ranked result lists from several engines."""
+    RRF = "rrf"
+    MIN_MAX = "min_max"
+    Z_SCORE = "z_score"
+
+
+class Degradation(str, Enum):
+    """Stages given up to meet a request deadline, mildest first."""
+    SKIPPED_RERANK = "skipped_rerank"
+    KEYWORD_ONLY = "keyword_only"
+    CACHED_CONTEXT = "cached_context"
+
+
 class EmbeddingModel(str, Enum):
     """Available embedding models."""
     SENTENCE_TRANSFORMER = "sentence-transformers/all-MiniLM-L6-v2"
@@ -38,6 +52,13 @@ class EmbeddingModel(str, Enum):
     CUSTOM_FITNESS = "wagner-coach/fitness-embeddings-v1"
 
 
+def _as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC so they compare with aware ones."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
 # ============= Request/Response Models =============
 
 class EmbeddingRequest(BaseModel):
@@ -56,6 +77,38 @@ class EmbeddingResponse(BaseModel):
     processing_time_ms: float
 
 
+class SearchFilter(BaseModel):
+    """
+    Structured filter applied inside the search engines.
+
+    A field left as None does not constrain results; an empty list matches
+    nothing.
+    """
+    content_types: Optional[List[ContentType]] = None
+    metadata: Optional[Dict[str, Any]] = None
+    sources: Optional[List[str]] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    def matches(self, result: "SearchResult") -> bool:
+        """Check whether a result satisfies every filter condition."""
+        if self.since or self.until:
+            moment = _as_utc(result.timestamp)
+            if self.since and moment < _as_utc(self.since):
+                return False
+            if self.until and moment > _as_utc(self.until):
+                return False
+        if self.content_types is not None and result.content_type not in self.content_types:
+            return False
+        if self.sources is not None and result.source not in self.sources:
+            return False
+        if self.metadata:
+            for key, value in self.metadata.items():
+                if result.metadata.get(key) != value:
+                    return False
+        return True
+
+
 class HybridSearchRequest(BaseModel):
     """Request model for hybrid search."""
     query: str = Field(..., min_length=1, max_length=512)
@@ -64,10 +117,33 @@ class HybridSearchRequest(BaseModel):
     limit: int = Field(default=10, ge=1, le=100)
     threshold: float = Field(default=0.5, ge=0.0, le=1.0)
     content_types: Optional[List[ContentType]] = None
+    filters: Optional[SearchFilter] = None
+    recency_half_life_days: Optional[float] = Field(default=None, gt=0)
+    cursor: Optional[str] = Field(default=None, max_length=2048)
+    # Rank a deeper window and return `next_cursor`; implied by `cursor`
+    paginate: bool = False
+
+
+class BatchSearchRequest(BaseModel):
+    """Request model for running several queries of one user together."""
+    queries: List[str] = Field(..., min_items=1, max_items=32)
+    user_id: str = Field(..., pattern="^[a-f0-9-]{36}$")
+    search_type: SearchStrategy = SearchStrategy.HYBRID
+    limit: int = Field(default=10, ge=1, le=100)
+    threshold: float = Field(default=0.5, ge=0.0, le=1.0)
+    content_types: Optional[List[ContentType]] = None
+    filters: Optional[SearchFilter] = None
+    recency_half_life_days: Optional[float] = Field(default=None, gt=0)
+
+    def requests(self) -> List[HybridSearchRequest]:
+        """Split into one search request per query."""
+        params = self.model_dump(exclude={"queries"})
+        return [HybridSearchRequest(query=query, **params) for query in self.queries]
 
 
 class SearchResult(BaseModel):
     """Individual search result."""
+    id: Optional[str] = None
     content: str
     content_type: ContentType
     score: float = Field(ge=0.0, le=1.0)
@@ -82,6 +158,14 @@ class HybridSearchResponse(BaseModel):
     search_strategy: SearchStrategy
     processing_time_ms: float
     total_results: int
+    next_cursor: Optional[str] = None
+    from_cache: bool = False
+
+
+class BatchSearchResponse(BaseModel):
+    """Response model for batched search, one response per query."""
+    responses: List[HybridSearchResponse]
+    processing_time_ms: float
 
 
 class RerankRequest(BaseModel):
@@ -90,6 +174,8 @@ class RerankRequest(BaseModel):
     candidates: List[str] = Field(..., min_items=1, max_items=100)
     user_id: str = Field(..., pattern="^[a-f0-9-]{36}$")
     top_k: int = Field(default=10, ge=1, le=50)
+    cascade: bool = False
+    latency_budget_ms: Optional[float] = Field(default=None, gt=0)
 
 
 class RerankResult(BaseModel):
@@ -99,11 +185,20 @@ class RerankResult(BaseModel):
     original_rank: int
 
 
+class RerankStage(BaseModel):
+    """Candidate counts and timing of one reranking stage."""
+    name: str
+    candidates_in: int
+    candidates_out: int
+    time_ms: float
+
+
 class RerankResponse(BaseModel):
     """Response model for re-ranking."""
     reranked: List[RerankResult]
     model_used: str
     processing_time_ms: float
+    stages: List[RerankStage] = Field(default_factory=list)
 
 
 class RAGQueryRequest(BaseModel):
@@ -116,6 +211,12 @@ class RAGQueryRequest(BaseModel):
     max_context_items: int = Field(default=10, ge=1, le=50)
     use_reranking: bool = True
     search_strategy: SearchStrategy = SearchStrategy.HYBRID
+    recency_half_life_days: Optional[float] = Field(default=None, gt=0)
+    rerank_latency_budget_ms: Optional[float] = Field(default=None, gt=0)
+    # Tokens the packed context may use in the downstream prompt
+    token_budget: Optional[int] = Field(default=None, gt=0)
+    # Latency budget for the whole request; stages degrade to meet it
+    deadline_ms: Optional[float] = Field(default=None, gt=0)
 
 
 class RAGContext(BaseModel):
@@ -134,6 +235,41 @@ class RAGQueryResponse(BaseModel):
     search_strategy: SearchStrategy
     total_tokens: int
     processing_time_ms: float
+    degradations: List[Degradation] = Field(default_factory=list)
+
+
+class BatchRAGQueryRequest(BaseModel):
+    """Many RAG queries, e.g. one per user for a nightly summary job."""
+    requests: List[RAGQueryRequest] = Field(..., min_items=1, max_items=5000)
+
+
+class BatchRAGQueryResult(BaseModel):
+    """Result of one query of a batch, streamed back as its chunk completes."""
+    index: int
+    response: Optional[RAGQueryResponse] = None
+    error: Optional[str] = None
+
+
+class RAGContextEvent(BaseModel):
+    """Streamed context items, sent as soon as a stage has ranked them."""
+    event: Literal["context"] = "context"
+    stage: str
+    final: bool
+    context: List[RAGContext]
+    total_tokens: int
+
+
+class RAGSummaryEvent(BaseModel):
+    """Last streamed event, with token totals and stage timings."""
+    event: Literal["summary"] = "summary"
+    embeddings_used: List[str]
+    search_strategy: SearchStrategy
+    total_tokens: int
+    processing_time_ms: float
+    time_to_first_context_ms: float
+    stage_timings_ms: Dict[str, float]
+    rerank_stages: List[RerankStage] = Field(default_factory=list)
+    degradations: List[Degradation] = Field(default_factory=list)
 
 
 # ============= Data Models =============
@@ -153,6 +289,17 @@ class Embedding:
     updated_at: Optional[datetime] = None
 
 
+@dataclass
+class QueryContext:
+    """Query state computed once per request and shared by every stage."""
+    text: str
+    normalized: str
+    terms: List[str]
+    token_ids: List[int]
+    embedding: Optional[List[float]] = None
+    model_name: Optional[str] = None
+
+
 # ============= Abstract Base Classes =============
 
 class EmbeddingGenerator(ABC):
@@ -197,6 +344,8 @@ class SearchEngine(ABC):
         user_id: str,
         limit: int,
         threshold: float,
+        filters: Optional[SearchFilter] = None,
+        query_context: Optional[QueryContext] = None,
         **kwargs
     ) -> List[SearchResult]:
         """
@@ -207,6 +356,8 @@ class SearchEngine(ABC):
             user_id: User identifier
             limit: Maximum results to return
             threshold: Minimum relevance threshold
+            filters: Filter applied inside the engine before ranking
+            query_context: Precomputed terms and embedding of the query
             **kwargs: Additional search parameters
 
         Returns:
@@ -215,6 +366,44 @@ class SearchEngine(ABC):
         pass
 
 
+    async def search_batch(
+        self,
+        queries: List[str],
+        user_id: str,
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        **kwargs
+    ) -> List[List[SearchResult]]:
+        """
+        Perform several searches for one user.
+
+        Engines override this when they can share work across queries.
+
+        Args:
+            queries: Search queries
+            user_id: User identifier
+            limit: Maximum results per query
+            threshold: Minimum relevance threshold
+            filters: Filter applied inside the engine before ranking
+            **kwargs: Additional search parameters
+
+        Returns:
+            One list of search results per query
+        """
+        return [
+            await self.search(
+                query=query,
+                user_id=user_id,
+                limit=limit,
+                threshold=threshold,
+                filters=filters,
+                **kwargs
+            )
+            for query in queries
+        ]
+
+
 class Reranker(ABC):
     """Abstract base class for re-ranking operations."""
 
@@ -261,7 +450,9 @@ class VectorStore(ABC):
         query_vector: List[float],
         user_id: str,
         limit: int,
-        threshold: float
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None
     ) -> List[SearchResult]:
         """
         Search for similar vectors.
@@ -271,6 +462,8 @@ class VectorStore(ABC):
             user_id: User identifier
             limit: Maximum results
             threshold: Similarity threshold
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of an optional recency decay term
 
         Returns:
             List of similar results
@@ -3,32 +3,63 @@ Main entry point for RAG service.
 Provides high-level functions for the complete RAG pipeline.
 """
 
+import asyncio
+import math
 import os
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import time
+from typing import AsyncIterator, List, Dict, Any, Optional, Set, Union
+from dataclasses import replace
+from datetime import datetime, timezone
 
+from .cache import SemanticQueryCache, TTLCache, make_cache_key, normalize_query
+from .container import get_container
+from .deadline import Deadline, StageCosts
 from .embeddings import EmbeddingService
+from .indexes import build_query_context
+from .metrics import STAGE_LATENCY, record_fallback, track_stage
+from .packing import ContextPacker, TokenCounter, hf_tokenizer
 from .search import SearchService
-from .reranking import RerankService
+from .reranking import RerankGate, RerankService
 from .interfaces import (
+    BatchRAGQueryResult,
+    Degradation,
+    Embedding,
     EmbeddingRequest,
     HybridSearchRequest,
+    QueryContext,
     RerankRequest,
     RAGQueryRequest,
     RAGQueryResponse,
     RAGContext,
+    RAGContextEvent,
+    RAGSummaryEvent,
     SearchStrategy,
     ContentType,
 )
 
 
+EMBEDDINGS_USED = ["sentence-transformers/all-MiniLM-L6-v2"]
+
+# Search latency assumed per strategy before any is measured
+INITIAL_SEARCH_COSTS_MS = {
+    f"search_{SearchStrategy.KEYWORD.value}": 10.0,
+    f"search_{SearchStrategy.SEMANTIC.value}": 60.0,
+    f"search_{SearchStrategy.HYBRID.value}": 70.0,
+}
+
+
 class RAGPipeline:
     """Complete RAG pipeline implementation."""
 
     def __init__(
         self,
         openai_api_key: Optional[str] = None,
-        enable_cache: bool = True
+        enable_cache: bool = True,
+        semantic_cache_distance: Optional[float] = 0.08,
+        rerank_gate: Optional[RerankGate] = None,
+        index: Optional[Any] = None,
+        context_packer: Optional[ContextPacker] = None,
+        cost_smoothing: float = 0.2
     ):
         """
         Initialize RAG pipeline.
@@ -36,13 +67,40 @@ class RAGPipeline:
         Args:
             openai_api_key: OpenAI API key for fallback
             enable_cache: Enable caching
+            semantic_cache_distance: Maximum cosine distance for reusing the
+                results of a near-identical query (None disables it)
+            rerank_gate: Decides when search scores are confident enough to
+                skip reranking (defaults to `RerankGate()`)
+            index: Search index (defaults to a per-process in-memory index)
+            context_packer: Fits context into a request's token budget
+                (defaults to counting with the embedding model's tokenizer)
+            cost_smoothing: Weight of the newest measurement in the stage
+                cost averages used against deadlines
         """
         self.embedding_service = EmbeddingService(
             openai_api_key=openai_api_key,
             enable_cache=enable_cache
         )
-        self.search_service = SearchService(enable_cache=enable_cache)
+        semantic_cache = None
+        if enable_cache and semantic_cache_distance is not None:
+            semantic_cache = SemanticQueryCache(max_distance=semantic_cache_distance)
+        self.search_service = SearchService(
+            index=index,
+            enable_cache=enable_cache,
+            embedding_service=self.embedding_service,
+            semantic_cache=semantic_cache
+        )
         self.rerank_service = RerankService(enable_cache=enable_cache)
+        self.rerank_gate = rerank_gate or RerankGate()
+        self._shadow_tasks: Set[asyncio.Task] = set()
+        if context_packer is None:
+            model = self.embedding_service.sentence_transformer.model
+            counter = TokenCounter(hf_tokenizer(getattr(model, "tokenizer", None)))
+            context_packer = ContextPacker(counter=counter)
+        self.context_packer = context_packer
+        self.stage_costs = StageCosts(INITIAL_SEARCH_COSTS_MS, smoothing=cost_smoothing)
+        # Last results served per query, reused when a deadline allows no search
+        self.last_contexts = TTLCache(4096, 3600, name="last_context") if enable_cache else None
 
     async def process(
         self,
@@ -57,47 +115,381 @@ class RAGPipeline:
         Returns:
             RAG query response with context
         """
-        import time
-        start_time = time.time()
+        context = []
+        async for event in self.stream(request):
+            if isinstance(event, RAGContextEvent):
+                context = event.context
+            else:
+                summary = event
+
+        return RAGQueryResponse(
+            context=context,
+            embeddings_used=summary.embeddings_used,
+            search_strategy=summary.search_strategy,
+            total_tokens=summary.total_tokens,
+            processing_time_ms=summary.processing_time_ms,
+            degradations=summary.degradations
+        )
+
+    async def stream(
+        self,
+        request: RAGQueryRequest
+    ) -> AsyncIterator[Union[RAGContextEvent, RAGSummaryEvent]]:
+        """
+        Process RAG query, yielding context as soon as each stage ranks it.
+
+        First-stage (or cached) results are sent before reranking starts;
+        if the rerank gate lets them through unchanged they are final.
+        Otherwise the reranked order follows. A summary event comes last.
+
+        With a deadline, stages that would overrun it degrade, mildest
+        first: reranking is skipped, then search falls back to keywords,
+        then the last context served for the query is reused. Without one
+        to reuse, keyword search runs even if it may be late.
+
+        Args:
+            request: RAG query request
+
+        Yields:
+            Context events, then one summary event
+        """
+        start_time = time.perf_counter()
+        deadline = Deadline(request.deadline_ms)
+        timings: Dict[str, float] = {}
+        degradations: List[Degradation] = []
+        rerank_stages = []
+
+        # Step 1: Pick the richest search the deadline allows
+        strategy = request.search_strategy
+        allow_embedding = True
+        cached = None
+        if not deadline.allows(self.stage_costs.estimate(f"search_{strategy.value}")):
+            if strategy == SearchStrategy.KEYWORD or not deadline.allows(
+                self.stage_costs.estimate(f"search_{SearchStrategy.KEYWORD.value}")
+            ):
+                cached = await self._last_context(request)
+            if cached is not None:
+                degradations.append(Degradation.CACHED_CONTEXT)
+            else:
+                # Keyword search is the cheapest left, even if it may run late
+                allow_embedding = False
+                if strategy != SearchStrategy.KEYWORD:
+                    strategy = SearchStrategy.KEYWORD
+                    degradations.append(Degradation.KEYWORD_ONLY)
+
+        if cached is not None:
+            event = self._context_event(request, cached, "cached", final=True, timings=timings)
+            time_to_first_context_ms = (time.perf_counter() - start_time) * 1000
+            yield event
+        else:
+            # Tokenize once; the query is only embedded if the search cache misses
+            query_context = await self.embedding_service.build_query_context(
+                request.query,
+                embed=False
+            )
+
+            search_start = time.perf_counter()
+            with track_stage("search"):
+                search_response = await self.search_service.process_request(
+                    self._search_request(request, strategy),
+                    query_context=query_context,
+                    allow_embedding=allow_embedding
+                )
+            timings["search"] = (time.perf_counter() - search_start) * 1000
+            # Cache hits would drag the estimate towards zero
+            if not search_response.from_cache:
+                self.stage_costs.observe(f"search_{strategy.value}", timings["search"])
+
+            # Step 2: Decide whether reranking can change the top items in time
+            candidates = search_response.results
+            final_results = candidates[:request.max_context_items]
+            rerank = False
+            if request.use_reranking and len(final_results) > 0:
+                rerank, features = self.rerank_gate.should_rerank(
+                    [r.score for r in candidates],
+                    request.max_context_items
+                )
+                # Every candidate is scored, not just the items served
+                if rerank and request.deadline_ms is not None and not deadline.allows(
+                    self.rerank_service.pair_cost_ms * len(candidates)
+                ):
+                    rerank = False
+                    degradations.append(Degradation.SKIPPED_RERANK)
+                elif not rerank and self.rerank_gate.sample_shadow():
+                    self._shadow_rerank(request, candidates, final_results, features)
 
-        # Step 1: Search for relevant content
-        search_request = HybridSearchRequest(
+            event = self._context_event(request, final_results, "first_stage", final=not rerank, timings=timings)
+            time_to_first_context_ms = (time.perf_counter() - start_time) * 1000
+            yield event
+
+            if rerank:
+                rerank_start = time.perf_counter()
+                # Under a deadline the cascade sizes itself to the budget left
+                latency_budget_ms = request.rerank_latency_budget_ms
+                if request.deadline_ms is not None:
+                    latency_budget_ms = min(latency_budget_ms or math.inf, deadline.remaining_ms())
+                rerank_request = RerankRequest(
+                    query=request.query,
+                    candidates=[r.content for r in candidates],
+                    user_id=request.user_id,
+                    top_k=request.max_context_items,
+                    cascade=latency_budget_ms is not None,
+                    latency_budget_ms=latency_budget_ms
+                )
+                # Search scores are the cascade's free first stage
+                with track_stage("rerank"):
+                    rerank_response = await self.rerank_service.process_request(
+                        rerank_request,
+                        query_context=query_context,
+                        first_stage_scores=[r.score for r in candidates]
+                    )
+                rerank_stages = rerank_response.stages
+                timings["rerank"] = (time.perf_counter() - rerank_start) * 1000
+
+                final_results = self._apply_rerank(
+                    candidates,
+                    rerank_response.reranked,
+                    request.max_context_items
+                )
+
+                event = self._context_event(request, final_results, "reranked", final=True, timings=timings)
+                yield event
+
+            await self._store_last_context(request, final_results)
+
+        processing_time_ms = (time.perf_counter() - start_time) * 1000
+        STAGE_LATENCY.labels(stage="pipeline").observe(processing_time_ms / 1000)
+        for degradation in degradations:
+            record_fallback(f"deadline_{degradation.value}")
+
+        yield RAGSummaryEvent(
+            embeddings_used=EMBEDDINGS_USED,
+            search_strategy=strategy,
+            total_tokens=event.total_tokens,
+            processing_time_ms=processing_time_ms,
+            time_to_first_context_ms=time_to_first_context_ms,
+            stage_timings_ms=timings,
+            rerank_stages=rerank_stages,
+            degradations=degradations
+        )
+
+    async def _last_context(self, request: RAGQueryRequest) -> Optional[List[Any]]:
+        """Get the results last served for a query, even if since outdated."""
+        if self.last_contexts is None:
+            return None
+        return await self.last_contexts.get(self._last_context_key(request))
+
+    async def _store_last_context(self, request: RAGQueryRequest, results: List[Any]) -> None:
+        """Keep the results served for a query for deadline fallbacks."""
+        if self.last_contexts is not None:
+            await self.last_contexts.set(self._last_context_key(request), results)
+
+    def _last_context_key(self, request: RAGQueryRequest) -> str:
+        """Key last contexts like search results, but across data versions."""
+        return make_cache_key(
+            "last_context",
+            request.user_id,
+            0,
+            query=normalize_query(request.query),
+            **self.search_service._request_params(self._search_request(request))
+        )
+
+    async def process_batch(
+        self,
+        requests: List[RAGQueryRequest],
+        chunk_size: int = 64,
+        max_concurrency: int = 8
+    ) -> AsyncIterator[BatchRAGQueryResult]:
+        """
+        Process many RAG queries, e.g. one per user for a summary job.
+
+        Requests are handled in chunks: each chunk's queries are embedded
+        in one batch, searched concurrently by a bounded pool, and the
+        candidates of every query that needs reranking are scored together
+        in shared cross-encoder batches. Results are yielded as each chunk
+        completes. Rerank latency budgets and shadow sampling do not apply.
+
+        Args:
+            requests: RAG query requests
+            chunk_size: Requests embedded and reranked together
+            max_concurrency: Searches running at once
+
+        Yields:
+            One result per request, in request order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        for offset in range(0, len(requests), chunk_size):
+            chunk = requests[offset:offset + chunk_size]
+            try:
+                results = await self._process_chunk(chunk, semaphore)
+            except Exception as e:
+                results = [e] * len(chunk)
+            for i, result in enumerate(results):
+                if isinstance(result, Exception):
+                    yield BatchRAGQueryResult(index=offset + i, error=str(result))
+                else:
+                    yield BatchRAGQueryResult(index=offset + i, response=result)
+
+    async def _process_chunk(
+        self,
+        chunk: List[RAGQueryRequest],
+        semaphore: asyncio.Semaphore
+    ) -> List[Union[RAGQueryResponse, Exception]]:
+        """
+        Embed, search and rerank one chunk of a batch.
+
+        Args:
+            chunk: RAG query requests
+            semaphore: Bounds concurrent searches across the batch
+
+        Returns:
+            Response, or the exception that failed it, per request
+        """
+        start_time = time.perf_counter()
+
+        # Step 1: Embed every semantic query of the chunk in one batch
+        contexts = [build_query_context(request.query) for request in chunk]
+        semantic = [i for i, r in enumerate(chunk) if r.search_strategy != SearchStrategy.KEYWORD]
+        queries = list(dict.fromkeys(chunk[i].query for i in semantic))
+        if queries:
+            embedded = dict(zip(queries, await self.embedding_service.generate_batch(queries)))
+            for i in semantic:
+                embedding, model_used = embedded[chunk[i].query]
+                contexts[i] = replace(contexts[i], embedding=embedding, model_name=model_used)
+
+        # Step 2: Search concurrently with a bounded pool
+        async def search(request: RAGQueryRequest, query_context: QueryContext):
+            async with semaphore:
+                return await self.search_service.process_request(
+                    self._search_request(request),
+                    query_context=query_context
+                )
+
+        with track_stage("search_batch"):
+            responses = await asyncio.gather(
+                *(search(r, c) for r, c in zip(chunk, contexts)),
+                return_exceptions=True
+            )
+
+        # Step 3: Rerank every query the gate lets through in shared batches
+        finals: Dict[int, List[Any]] = {}
+        groups, owners = [], []
+        for i, (request, response) in enumerate(zip(chunk, responses)):
+            if isinstance(response, Exception):
+                continue
+            finals[i] = response.results[:request.max_context_items]
+            if request.use_reranking and response.results:
+                rerank, _ = self.rerank_gate.should_rerank(
+                    [r.score for r in response.results],
+                    request.max_context_items
+                )
+                if rerank:
+                    groups.append((
+                        request.query,
+                        [r.content for r in response.results],
+                        request.max_context_items
+                    ))
+                    owners.append(i)
+        if groups:
+            with track_stage("rerank_batch"):
+                reranked = await self.rerank_service.rerank_batch(
+                    groups,
+                    [contexts[i] for i in owners]
+                )
+            for i, results in zip(owners, reranked):
+                finals[i] = self._apply_rerank(
+                    responses[i].results,
+                    results,
+                    chunk[i].max_context_items
+                )
+
+        # Step 4: Build each request's context
+        processing_time_ms = (time.perf_counter() - start_time) * 1000
+        results: List[Union[RAGQueryResponse, Exception]] = []
+        for i, request in enumerate(chunk):
+            if isinstance(responses[i], Exception):
+                results.append(responses[i])
+                continue
+            event = self._context_event(request, finals[i], "batch", final=True, timings={})
+            results.append(RAGQueryResponse(
+                context=event.context,
+                embeddings_used=EMBEDDINGS_USED,
+                search_strategy=request.search_strategy,
+                total_tokens=event.total_tokens,
+                processing_time_ms=processing_time_ms
+            ))
+        return results
+
+    def _search_request(
+        self,
+        request: RAGQueryRequest,
+        strategy: Optional[SearchStrategy] = None
+    ) -> HybridSearchRequest:
+        """Build the search request of a RAG query, optionally with another strategy."""
+        return HybridSearchRequest(
             query=request.query,
             user_id=request.user_id,
-            search_type=request.search_strategy,
+            search_type=strategy or request.search_strategy,
             limit=request.max_context_items * 2,  # Get extra for reranking
-            content_types=request.include_context
+            content_types=request.include_context,
+            recency_half_life_days=request.recency_half_life_days
         )
-        search_response = await self.search_service.process_request(search_request)
-
-        # Step 2: Rerank results if enabled
-        final_results = search_response.results
-        if request.use_reranking and len(final_results) > 0:
-            rerank_request = RerankRequest(
-                query=request.query,
-                candidates=[r.content for r in final_results],
-                user_id=request.user_id,
-                top_k=request.max_context_items
-            )
-            rerank_response = await self.rerank_service.process_request(rerank_request)
-
-            # Map reranked results back to original search results
-            reranked_content = {r.content: r for r in rerank_response.reranked}
-            final_results = [
-                result for result in search_response.results
-                if result.content in reranked_content
-            ]
-
-            # Sort by rerank scores
-            final_results.sort(
-                key=lambda x: reranked_content[x.content].relevance_score,
-                reverse=True
-            )
-            final_results = final_results[:request.max_context_items]
 
+    def _apply_rerank(
+        self,
+        search_results: List[Any],
+        reranked: List[Any],
+        limit: int
+    ) -> List[Any]:
+        """
+        Order search results by their rerank scores.
+
+        Args:
+            search_results: First-stage search results
+            reranked: Rerank results for their contents
+            limit: Maximum results kept
+
+        Returns:
+            Reranked search results
+        """
+        # Map reranked results back to original search results
+        reranked_content = {r.content: r for r in reranked}
+        final_results = [
+            result for result in search_results
+            if result.content in reranked_content
+        ]
+
+        # Sort by rerank scores
+        final_results.sort(
+            key=lambda x: reranked_content[x.content].relevance_score,
+            reverse=True
+        )
+        return final_results[:limit]
+
+    def _context_event(
+        self,
+        request: RAGQueryRequest,
+        results: List[Any],
+        stage: str,
+        final: bool,
+        timings: Dict[str, float]
+    ) -> RAGContextEvent:
+        """
+        Build context items from search results, packed into the token budget.
+
+        Args:
+            request: RAG query request
+            results: Ranked search results
+            stage: Stage that ranked the results
+            final: Whether no later stage will reorder them
+            timings: Stage timings, updated with the packing time
+
+        Returns:
+            Context event
+        """
         # Step 3: Create context items
         context = []
-        for result in final_results:
+        for result in results:
             context.append(
                 RAGContext(
                     source=result.source,
@@ -108,34 +500,105 @@ class RAGPipeline:
                 )
             )
 
-        # Calculate total tokens (approximate)
-        total_tokens = sum(len(c.content.split()) for c in context) * 1.3
+        # Fit the context into the prompt's token budget, if any
+        start = time.perf_counter()
+        if request.token_budget is not None:
+            with track_stage("pack"):
+                context, total_tokens = self.context_packer.pack(context, request.token_budget)
+        else:
+            total_tokens = self.context_packer.count(context)
+        timings["pack"] = timings.get("pack", 0.0) + (time.perf_counter() - start) * 1000
 
-        processing_time_ms = (time.time() - start_time) * 1000
+        return RAGContextEvent(stage=stage, final=final, context=context, total_tokens=total_tokens)
 
-        return RAGQueryResponse(
-            context=context,
-            embeddings_used=["sentence-transformers/all-MiniLM-L6-v2"],
-            search_strategy=request.search_strategy,
-            total_tokens=int(total_tokens),
-            processing_time_ms=processing_time_ms
-        )
+    def _shadow_rerank(
+        self,
+        request: RAGQueryRequest,
+        candidates: List[Any],
+        served: List[Any],
+        features: Dict[str, float]
+    ) -> None:
+        """Rerank a skipped request off the request path and record agreement."""
+        async def compare():
+            # Inference runs in a worker thread so it never stalls the loop
+            texts = [r.content for r in candidates]
+            scores = await asyncio.to_thread(
+                self.rerank_service.score_detached, request.query, texts
+            )
+            order = sorted(range(len(texts)), key=lambda i: scores[i], reverse=True)
+            self.rerank_gate.record_shadow(
+                [r.content for r in served],
+                [texts[i] for i in order[:request.max_context_items]],
+                features
+            )
+
+        task = asyncio.ensure_future(compare())
+        self._shadow_tasks.add(task)
+        task.add_done_callback(self._shadow_tasks.discard)
+
+    async def cleanup(self):
+        """Cancel shadow reranks and clean up every service."""
+        for task in list(self._shadow_tasks):
+            task.cancel()
+        await self.embedding_service.cleanup()
+        await self.search_service.cleanup()
+        await self.rerank_service.cleanup()
 
 
-# Convenience functions for testing
+# Convenience functions backed by the shared application container
 
 async def process_embedding_request(request: EmbeddingRequest):
     """Process embedding request."""
-    service = EmbeddingService()
+    service = get_container().embedding_service
     return await service.process_request(request)
 
 
 async def store_and_retrieve_embedding(embedding_data: Dict[str, Any]) -> str:
     """Store embedding and return ID."""
-    service = EmbeddingService()
+    service = get_container().embedding_service
     return await service.store_embedding(embedding_data)
 
 
+async def index_user_records(
+    user_id: str,
+    content_type: ContentType,
+    records: List[Dict[str, Any]]
+) -> int:
+    """
+    Embed a user's records and index them in the shared search service.
+
+    Records are upserted by ID, so syncing the same records again replaces
+    them. Each write invalidates the user's cached results and schedules a
+    refresh of their prefetched coaching contexts.
+
+    Args:
+        user_id: Owner of the records
+        content_type: Type of every record
+        records: Dicts with `id` and `content`, and optionally `metadata`
+            and `created_at`
+
+    Returns:
+        Number of records indexed
+    """
+    if not records:
+        return 0
+    container = get_container()
+    embedded = await container.embedding_service.generate_batch([r["content"] for r in records])
+    for record, (vector, model_used) in zip(records, embedded):
+        await container.search_service.upsert_record(Embedding(
+            id=record["id"],
+            user_id=user_id,
+            content=record["content"],
+            content_type=content_type,
+            embedding_vector=vector,
+            model_name=model_used,
+            dimension=len(vector),
+            metadata=record.get("metadata", {}),
+            created_at=record.get("created_at") or datetime.now(timezone.utc),
+        ))
+    return len(records)
+
+
 async def retrieve_embedding(embedding_id: str) -> Dict[str, Any]:
     """Retrieve embedding by ID (mock implementation)."""
     # In production, this would query the database
@@ -152,14 +615,18 @@ async def rerank_search_results(
     top_k: int
 ) -> List[str]:
     """Rerank search results."""
-    service = RerankService()
+    service = get_container().rerank_service
     results = await service.rerank_with_fallback(query, search_results, top_k)
     return [r.content for r in results]
 
 
-async def rag_pipeline(query: str, user_id: str) -> Dict[str, Any]:
+async def rag_pipeline(
+    query: str,
+    user_id: str,
+    pipeline: Optional[RAGPipeline] = None
+) -> Dict[str, Any]:
     """Execute RAG pipeline for query."""
-    pipeline = RAGPipeline()
+    pipeline = pipeline or get_container().pipeline
     request = RAGQueryRequest(
         query=query,
         user_id=user_id,
@@ -184,8 +651,17 @@ async def rag_pipeline(query: str, user_id: str) -> Dict[str, Any]:
 
 
 async def get_coaching_context(query: str, user_id: str) -> Dict[str, Any]:
-    """Get coaching context for user query."""
-    result = await rag_pipeline(query, user_id)
+    """Get coaching context for user query, prefetched after the user's last write."""
+    return await get_container().prefetcher.get(query, user_id)
+
+
+async def compute_coaching_context(
+    query: str,
+    user_id: str,
+    pipeline: Optional[RAGPipeline] = None
+) -> Dict[str, Any]:
+    """Compute coaching context for user query, bypassing the prefetch cache."""
+    result = await rag_pipeline(query, user_id, pipeline=pipeline)
     return {
         "sources": [
             {
@@ -0,0 +1,123 @@
+"""
+Metrics module for RAG service.
+Prometheus histograms and counters for pipeline stages, caches, model
+inference and upstream calls, served in the Prometheus text format.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+
+# Latency buckets in seconds, from sub-millisecond index lookups to slow model calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Garmin Connect calls go over the network and can take tens of seconds
+GARMIN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_latency_seconds",
+    "Latency of RAG pipeline stages",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "rag_inference_batch_size",
+    "Inputs per model inference call",
+    ["model"],
+    buckets=BATCH_SIZE_BUCKETS
+)
+FALLBACKS = Counter(
+    "rag_fallbacks_total",
+    "Fallback activations by component",
+    ["component"]
+)
+GARMIN_LATENCY = Histogram(
+    "garmin_call_latency_seconds",
+    "Latency of Garmin Connect calls",
+    ["call", "outcome"],
+    buckets=GARMIN_BUCKETS
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """
+    Time a pipeline stage with the monotonic clock.
+
+    Args:
+        stage: Stage name (e.g. embed, search, fuse, rerank)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_garmin(call: str) -> Iterator[None]:
+    """
+    Time a Garmin Connect call, labelled by whether it raised.
+
+    Args:
+        call: Garmin API call name
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        GARMIN_LATENCY.labels(call=call, outcome=outcome).observe(time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """
+    Count a cache lookup.
+
+    Args:
+        cache: Cache name
+        hit: Whether the lookup hit
+    """
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_batch(model: str, size: int) -> None:
+    """
+    Record the number of inputs of one model inference call.
+
+    Args:
+        model: Model name
+        size: Inputs in the call
+    """
+    INFERENCE_BATCH_SIZE.labels(model=model).observe(size)
+
+
+def record_fallback(component: str) -> None:
+    """
+    Count a fallback activation.
+
+    Args:
+        component: Component that fell back (e.g. embedding, rerank)
+    """
+    FALLBACKS.labels(component=component).inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render every registered metric.
+
+    Returns:
+        Tuple of (body, content_type) in the Prometheus text format
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,235 @@
+"""
+Context packing module for RAG service.
+Fits retrieved context into a token budget, counting tokens with a real
+tokenizer and trimming items at sentence boundaries.
+"""
+
+import hashlib
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .cache import TTLCache
+from .interfaces import RAGContext
+from .reranking import CHARS_PER_TOKEN
+
+
+# Batch tokenizer: texts in, token ids per text out
+Tokenizer = Callable[[List[str]], List[Sequence[int]]]
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+def hf_tokenizer(tokenizer: Any) -> Optional[Tokenizer]:
+    """
+    Wrap a Hugging Face tokenizer as a batch tokenizer.
+
+    Args:
+        tokenizer: Tokenizer of a loaded model, or None
+
+    Returns:
+        Batch tokenizer without special tokens, or None if unavailable
+    """
+    if tokenizer is None or not callable(tokenizer):
+        return None
+
+    def tokenize(texts: List[str]) -> List[Sequence[int]]:
+        return tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+    return tokenize
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split text into sentences.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        Sentences, each keeping its closing punctuation
+    """
+    return [s for s in SENTENCE_BOUNDARY.split(text.strip()) if s]
+
+
+class TokenCounter:
+    """Token counts cached per content hash."""
+
+    def __init__(self, tokenizer: Optional[Tokenizer] = None, max_entries: int = 20000):
+        """
+        Initialize token counter.
+
+        Args:
+            tokenizer: Batch tokenizer (estimates from characters if None)
+            max_entries: Counts cached before LRU eviction
+        """
+        self.tokenizer = tokenizer
+        self._counts = TTLCache(max_entries=max_entries, ttl=None, name="token_counts")
+
+    def count(self, texts: Sequence[str]) -> List[int]:
+        """
+        Count the tokens of several texts, tokenizing the misses in one call.
+
+        Args:
+            texts: Texts to count
+
+        Returns:
+            Token count per text
+        """
+        keys = [hashlib.sha1(text.encode()).hexdigest() for text in texts]
+        counts: List[Optional[int]] = [self._counts.get_nowait(key) for key in keys]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            batch = [texts[i] for i in missing]
+            if self.tokenizer is not None:
+                fresh = [len(ids) for ids in self.tokenizer(batch)]
+            else:
+                fresh = [math.ceil(len(text) / CHARS_PER_TOKEN) for text in batch]
+            for i, count in zip(missing, fresh):
+                counts[i] = count
+                self._counts.set_nowait(keys[i], count)
+        return counts
+
+
+class ContextPacker:
+    """
+    Greedy knapsack over context items within a token budget.
+
+    The top-ranked item is always kept (trimmed if it alone overflows);
+    the rest are taken by relevance per token, subject to a cap on the
+    share of the budget any one content type may use. Items that do not
+    fit whole are trimmed to their leading sentences when enough budget
+    is left. Chosen items keep their ranked order.
+    """
+
+    def __init__(
+        self,
+        counter: Optional[TokenCounter] = None,
+        max_type_share: float = 0.6,
+        min_trim_tokens: int = 32
+    ):
+        """
+        Initialize context packer.
+
+        Args:
+            counter: Token counter (defaults to character estimates)
+            max_type_share: Largest share of the budget one content type
+                may take when several types compete
+            min_trim_tokens: Smallest remaining budget worth filling with
+                a trimmed item
+        """
+        if not 0.0 < max_type_share <= 1.0:
+            raise ValueError("max_type_share must be within (0, 1]")
+        self.counter = counter or TokenCounter()
+        self.max_type_share = max_type_share
+        self.min_trim_tokens = min_trim_tokens
+
+    def count(self, context: Sequence[RAGContext]) -> int:
+        """
+        Count the tokens of context items.
+
+        Args:
+            context: Context items
+
+        Returns:
+            Total token count
+        """
+        return sum(self.counter.count([c.content for c in context]))
+
+    def pack(
+        self,
+        context: Sequence[RAGContext],
+        token_budget: int
+    ) -> Tuple[List[RAGContext], int]:
+        """
+        Choose and trim context items to fit a token budget.
+
+        Args:
+            context: Candidate items, ranked best first
+            token_budget: Maximum total tokens
+
+        Returns:
+            Tuple of (packed items in ranked order, total tokens)
+        """
+        if not context:
+            return [], 0
+
+        tokens = self.counter.count([c.content for c in context])
+        mixed = len({c.content_type for c in context}) > 1
+        type_cap = token_budget * self.max_type_share if mixed else token_budget
+        used_by_type: Dict[Any, int] = {}
+        chosen: Dict[int, RAGContext] = {}
+        used = 0
+
+        # Top item first, then the rest by relevance per token
+        rest = sorted(
+            range(1, len(context)),
+            key=lambda i: context[i].relevance / max(tokens[i], 1),
+            reverse=True
+        )
+        for i in [0] + rest:
+            item = context[i]
+            room = token_budget - used
+            if i > 0:
+                room = min(room, type_cap - used_by_type.get(item.content_type, 0))
+            if tokens[i] <= room:
+                chosen[i], cost = item, tokens[i]
+            elif room >= self.min_trim_tokens or i == 0:
+                trimmed = self._trim(item, room)
+                if trimmed is None:
+                    continue
+                chosen[i], cost = trimmed
+            else:
+                continue
+            used += cost
+            used_by_type[item.content_type] = used_by_type.get(item.content_type, 0) + cost
+
+        return [chosen[i] for i in sorted(chosen)], used
+
+    def _trim(self, item: RAGContext, room: int) -> Optional[Tuple[RAGContext, int]]:
+        """
+        Keep the leading sentences of an item that fit in the room left.
+
+        Args:
+            item: Context item
+            room: Tokens available
+
+        Returns:
+            Tuple of (trimmed item, tokens), or None if no sentence fits
+        """
+        sentences = split_sentences(item.content)
+        kept = 0
+        used = 0
+        for count in self.counter.count(sentences):
+            if used + count > room:
+                break
+            kept += 1
+            used += count
+        if kept == 0:
+            return None
+        trimmed = item.model_copy(update={
+            "content": " ".join(sentences[:kept]),
+            "metadata": {**item.metadata, "truncated": True},
+        })
+        return trimmed, used
+
+
+# Convenience function
+def pack_context(
+    context: Sequence[RAGContext],
+    token_budget: int,
+    tokenizer: Optional[Tokenizer] = None
+) -> Tuple[List[RAGContext], int]:
+    """
+    Fit context items into a token budget.
+
+    Args:
+        context: Candidate items, ranked best first
+        token_budget: Maximum total tokens
+        tokenizer: Batch tokenizer (estimates from characters if None)
+
+    Returns:
+        Tuple of (packed items in ranked order, total tokens)
+    """
+    packer = ContextPacker(counter=TokenCounter(tokenizer))
+    return packer.pack(context, token_budget)
@@ -0,0 +1,105 @@
+"""
+Pagination module for RAG service.
+Provides opaque, stable cursors over ranked search results.
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import List, Sequence
+
+from .fusion import result_key
+from .interfaces import SearchResult
+
+
+@dataclass
+class PageCursor:
+    """
+    Position after the last result of a page.
+
+    The cursor pins the user data version the page was ranked at, the
+    number of results returned so far and the id of the last one, so the
+    next page resumes right after it without re-reading earlier pages.
+    """
+    version: int
+    request_hash: str
+    offset: int
+    key: str
+
+    def encode(self) -> str:
+        """
+        Serialize the cursor into an opaque URL-safe token.
+
+        Returns:
+            Cursor token
+        """
+        payload = json.dumps(
+            [self.version, self.request_hash, self.offset, self.key],
+            separators=(",", ":")
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "PageCursor":
+        """
+        Parse a cursor token.
+
+        Args:
+            token: Token produced by `encode`
+
+        Returns:
+            Page cursor
+
+        Raises:
+            ValueError: If the token is malformed
+        """
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            version, request_hash, offset, key = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+            return cls(int(version), str(request_hash), int(offset), str(key))
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+
+
+def rank_order(results: Sequence[SearchResult]) -> List[SearchResult]:
+    """
+    Order results by score, breaking ties by record identity.
+
+    A total order makes (score, id) positions comparable across runs.
+
+    Args:
+        results: Search results
+
+    Returns:
+        Results sorted best first
+    """
+    return sorted(results, key=lambda r: (-r.score, result_key(r)))
+
+
+def resume_index(results: Sequence[SearchResult], offset: int, key: str) -> int:
+    """
+    Find where a page ending at the `offset`-th result, `key`, continues.
+
+    Positions are only compared within one ranking: fused scores depend
+    on how deep the fused lists were, so a score from another window says
+    nothing about where a result sits in this one. In the window the
+    cursor was cut from, the page continues at `offset`; in a re-ranked
+    window it continues after `key`, or at `offset` if that result is gone.
+
+    Args:
+        results: Ranked results
+        offset: Number of results already returned
+        key: Identity of the last result already returned
+
+    Returns:
+        Index of the first result not yet returned
+    """
+    if 0 < offset <= len(results) and result_key(results[offset - 1]) == key:
+        return offset
+    for position, result in enumerate(results):
+        if result_key(result) == key:
+            return position + 1
+    return min(offset, len(results))
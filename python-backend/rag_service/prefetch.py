@@ -0,0 +1,226 @@
+"""
+Prefetch module for RAG service.
+Recomputes a user's standard coaching contexts in the background after
+they log something, so the next chat request is a cache hit.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .cache import TTLCache, UserVersions, make_cache_key, normalize_query
+from .interfaces import ContentType
+
+
+# Questions the coach asks on nearly every chat, plus the profile context
+CANONICAL_QUERIES = [
+    "What should my next workout be?",
+    "How is my training progressing?",
+    "How is my nutrition supporting my goals?",
+    "What are my current goals?",
+    "Summarize my profile, recent training and goals",
+]
+
+# Writes that change a user's coaching context: workouts, meals, synced
+# activities and goal changes
+PREFETCH_CONTENT_TYPES = {
+    ContentType.WORKOUT,
+    ContentType.NUTRITION,
+    ContentType.ACTIVITY,
+    ContentType.GOAL,
+}
+
+
+class PrefetchQueue:
+    """
+    Debounced background jobs with at most one per user.
+
+    Scheduling a user who already has a job pending pushes its start back
+    instead of adding a second one, so a burst of writes runs the job
+    once. Writes that land while the job runs schedule one more run.
+    """
+
+    def __init__(
+        self,
+        job: Callable[[str], Awaitable[Any]],
+        debounce_seconds: float = 2.0,
+        max_concurrency: int = 4
+    ):
+        """
+        Initialize prefetch queue.
+
+        Args:
+            job: Coroutine function run with the user ID
+            debounce_seconds: Quiet period after a user's last write
+            max_concurrency: Jobs running at once across users
+        """
+        self.job = job
+        self.debounce_seconds = debounce_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._deadlines: Dict[str, float] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.scheduled = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+
+    def schedule(self, user_id: str) -> None:
+        """
+        Schedule a job for a user, coalescing with a pending one.
+
+        Args:
+            user_id: User identifier
+        """
+        loop = asyncio.get_running_loop()
+        self._deadlines[user_id] = loop.time() + self.debounce_seconds
+        self.scheduled += 1
+        if user_id in self._tasks:
+            self.coalesced += 1
+            return
+        self._tasks[user_id] = loop.create_task(self._run(user_id))
+
+    async def _run(self, user_id: str) -> None:
+        """Wait out the debounce period, then run the job until no write is pending."""
+        loop = asyncio.get_running_loop()
+        try:
+            while user_id in self._deadlines:
+                delay = self._deadlines[user_id] - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                del self._deadlines[user_id]
+                async with self._semaphore:
+                    try:
+                        await self.job(user_id)
+                        self.completed += 1
+                    except Exception as e:
+                        print(f"Prefetch failed for user {user_id}: {e}")
+                        self.failed += 1
+        finally:
+            self._tasks.pop(user_id, None)
+
+    @property
+    def pending(self) -> int:
+        """Number of users with a job waiting or running."""
+        return len(self._tasks)
+
+    async def drain(self) -> None:
+        """Wait until every scheduled job has run."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Cancel every pending job."""
+        self._deadlines.clear()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue counters."""
+        return {
+            "pending": self.pending,
+            "scheduled": self.scheduled,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+class ContextPrefetcher:
+    """
+    Coaching contexts cached per user data version and refreshed on writes.
+
+    Entries are keyed by the user's data version, so a write makes the
+    old contexts unreachable at once; the debounced refresh then rebuilds
+    the canonical ones before the user's next chat request.
+
+    Versions and refreshes are per process: with several workers sharing
+    sharded indexes, a write handled by one worker is not seen by the
+    others' caches until their entries expire, so keep `cache_ttl` short
+    there.
+    """
+
+    def __init__(
+        self,
+        compute: Callable[[str, str], Awaitable[Dict[str, Any]]],
+        versions: UserVersions,
+        queries: Optional[List[str]] = None,
+        debounce_seconds: float = 2.0,
+        max_concurrency: int = 4,
+        cache_ttl: Optional[int] = 3600,
+        cache_max_entries: int = 4096
+    ):
+        """
+        Initialize context prefetcher.
+
+        Args:
+            compute: Coroutine function computing the context of (query, user_id)
+            versions: Per-user data versions bumped by every write
+            queries: Queries prefetched per user (defaults to `CANONICAL_QUERIES`)
+            debounce_seconds: Quiet period after a user's last write
+            max_concurrency: Users refreshed at once
+            cache_ttl: Time to live of cached contexts in seconds
+            cache_max_entries: Maximum cached contexts
+        """
+        self.compute = compute
+        self.versions = versions
+        self.queries = queries or list(CANONICAL_QUERIES)
+        self.cache = TTLCache(cache_max_entries, cache_ttl, name="coaching_context")
+        self.queue = PrefetchQueue(self.refresh, debounce_seconds, max_concurrency)
+
+    def on_write(self, user_id: str, content_type: Optional[ContentType] = None) -> None:
+        """
+        Schedule a refresh after a write that changes the coaching context.
+
+        Args:
+            user_id: Owner of the written record
+            content_type: Type of the record (None when unknown, e.g. deletes)
+        """
+        if content_type is None or content_type in PREFETCH_CONTENT_TYPES:
+            self.queue.schedule(user_id)
+
+    async def get(self, query: str, user_id: str) -> Dict[str, Any]:
+        """
+        Get a coaching context, computing and caching it on a miss.
+
+        Args:
+            query: User query
+            user_id: User identifier
+
+        Returns:
+            Coaching context
+        """
+        key = self._key(query, user_id, self.versions.get(user_id))
+        context = await self.cache.get(key)
+        if context is None:
+            context = await self.compute(query, user_id)
+            await self.cache.set(key, context)
+        return context
+
+    async def refresh(self, user_id: str) -> None:
+        """
+        Recompute and cache every prefetched context of a user.
+
+        Args:
+            user_id: User identifier
+        """
+        # Read the version first: a write during the refresh moves the user
+        # past these entries rather than letting them go stale
+        version = self.versions.get(user_id)
+        for query in self.queries:
+            context = await self.compute(query, user_id)
+            await self.cache.set(self._key(query, user_id, version), context)
+
+    async def close(self) -> None:
+        """Cancel pending refreshes and drop cached contexts."""
+        await self.queue.close()
+        await self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue and cache counters."""
+        return {**self.queue.stats(), "cache": self.cache.stats()}
+
+    @staticmethod
+    def _key(query: str, user_id: str, version: int) -> str:
+        return make_cache_key("coaching", user_id, version, query=normalize_query(query))
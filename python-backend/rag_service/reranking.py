@@ -3,16 +3,209 @@ Re-ranking module for RAG service.
 Provides cross-encoder based re-ranking for improved relevance.
 """
 
+import random
+import threading
 import time
-from typing import List, Optional, Tuple
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 import numpy as np
+from scipy import sparse
 
 from .interfaces import (
     Reranker,
     RerankResult,
     RerankRequest,
     RerankResponse,
+    RerankStage,
+    QueryContext,
 )
+from .cache import PairScoreCache, TokenCache, TTLCache
+from .indexes import term_id, tokenize
+from .metrics import record_batch, record_fallback
+
+
+# Average characters per subword token of English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str, max_length: int = 512) -> int:
+    """
+    Estimate the number of model tokens of a text.
+
+    Args:
+        text: Input text
+        max_length: Model sequence limit the count is capped at
+
+    Returns:
+        Approximate token count
+    """
+    return min(max_length, len(text) // CHARS_PER_TOKEN + 1)
+
+
+def plan_batches(
+    lengths: List[int],
+    max_batch_tokens: int,
+    max_batch_size: int
+) -> List[List[int]]:
+    """
+    Group sequences into batches of similar length.
+
+    Sequences are sorted longest first and packed greedily while the padded
+    size of the batch (rows times longest row) stays within the budget, so
+    short candidates are no longer padded to a long neighbour.
+
+    Args:
+        lengths: Token length of each sequence
+        max_batch_tokens: Padded token budget per batch
+        max_batch_size: Maximum rows per batch
+
+    Returns:
+        Batches of indices into `lengths`
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    for i in order:
+        # The first row of a batch is its longest, which sets the padding
+        if batch and (
+            len(batch) >= max_batch_size
+            or (len(batch) + 1) * lengths[batch[0]] > max_batch_tokens
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class LexicalReranker(Reranker):
+    """
+    Lexical reranker over hashed sparse term vectors.
+
+    Candidate terms are hashed into a sparse count matrix and every
+    candidate is scored against the query at once with BM25 or Jaccard;
+    result objects are only built for the top-k.
+    """
+
+    def __init__(
+        self,
+        method: str = "bm25",
+        n_features: int = 1 << 20,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        """
+        Initialize lexical reranker.
+
+        Args:
+            method: "bm25" or "jaccard"
+            n_features: Number of hash buckets (a power of two)
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        if method not in ("bm25", "jaccard"):
+            raise ValueError(f"Unknown lexical method: {method}")
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.method = method
+        self.n_features = n_features
+        self.k1 = k1
+        self.b = b
+
+    def _hash(self, terms: Sequence[str]) -> List[int]:
+        return [term_id(term) & (self.n_features - 1) for term in terms]
+
+    def score(
+        self,
+        query_terms: Sequence[str],
+        candidates: List[str],
+        method: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Score every candidate against the query.
+
+        Args:
+            query_terms: Query terms
+            candidates: Candidate texts
+            method: Override of the configured method
+
+        Returns:
+            Score per candidate (Jaccard in [0, 1], BM25 unbounded)
+        """
+        method = method or self.method
+        if not candidates:
+            return np.zeros(0, dtype=np.float64)
+        columns: List[int] = []
+        indptr = [0]
+        for candidate in candidates:
+            columns.extend(self._hash(tokenize(candidate)))
+            indptr.append(len(columns))
+        counts = sparse.csr_matrix(
+            (np.ones(len(columns), dtype=np.float32), np.asarray(columns, dtype=np.int64), indptr),
+            shape=(len(candidates), self.n_features)
+        )
+        counts.sum_duplicates()
+
+        query_columns = np.unique(np.asarray(self._hash(query_terms), dtype=np.int64))
+        matched = counts[:, query_columns].toarray()
+
+        if method == "jaccard":
+            intersection = (matched > 0).sum(axis=1)
+            union = counts.getnnz(axis=1) + len(query_columns) - intersection
+            return np.divide(
+                intersection, union,
+                out=np.zeros(len(candidates), dtype=np.float64),
+                where=union > 0
+            )
+
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        average = lengths.mean() if lengths.mean() > 0 else 1.0
+        doc_freq = (matched > 0).sum(axis=0)
+        idf = np.log(1.0 + (len(candidates) - doc_freq + 0.5) / (doc_freq + 0.5))
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / average)
+        return (idf * matched * (self.k1 + 1.0) / (matched + norm[:, None])).sum(axis=1)
+
+    async def rerank(
+        self,
+        query: str,
+        candidates: List[str],
+        top_k: int,
+        query_terms: Optional[List[str]] = None,
+        method: Optional[str] = None
+    ) -> List[RerankResult]:
+        """
+        Re-rank candidates by lexical relevance.
+
+        Args:
+            query: Reference query
+            candidates: List of candidate texts
+            top_k: Number of top results to return
+            query_terms: Pre-tokenized query terms
+            method: Override of the configured method
+
+        Returns:
+            Top-k results with scores scaled to [0, 1]
+        """
+        if not candidates:
+            return []
+        scores = self.score(
+            query_terms if query_terms is not None else tokenize(query),
+            candidates,
+            method
+        )
+        top = scores.max()
+        if top > 1.0:
+            scores = scores / top
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [
+            RerankResult(
+                content=candidates[i],
+                relevance_score=float(scores[i]),
+                original_rank=int(i)
+            )
+            for i in order
+        ]
 
 
 class CrossEncoderReranker(Reranker):
@@ -22,31 +215,59 @@ class CrossEncoderReranker(Reranker):
         self,
         model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
         batch_size: int = 16,
-        device: str = "cpu"
+        device: str = "cpu",
+        max_batch_tokens: int = 4096,
+        max_length: int = 512,
+        score_cache: Optional[PairScoreCache] = None,
+        token_cache: Optional[TokenCache] = None,
+        on_batch: Optional[Callable[[int, float], None]] = None
     ):
         """
         Initialize cross-encoder reranker.
 
         Args:
             model_name: Cross-encoder model name
-            batch_size: Batch size for processing
+            batch_size: Maximum pairs per batch
             device: Device to run model on
+            max_batch_tokens: Padded token budget per batch
+            max_length: Model sequence limit
+            score_cache: Cache of raw pair scores
+            token_cache: Cache of document token ids (enables pre-tokenized
+                scoring and batching by real token lengths)
+            on_batch: Called with (pairs, milliseconds) after each batch the
+                model scores; cached and fallback scores are not reported
         """
         self.model_name = model_name
         self.batch_size = batch_size
         self.device = device
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
+        self.score_cache = score_cache
+        self.token_cache = token_cache
+        # Queries repeat across the batches of a rerank, but stay out of the
+        # document cache
+        self.query_token_cache = TokenCache(max_tokens=65536) if token_cache is not None else None
+        self.on_batch = on_batch
         self.model = None
+        # Separate instance for worker threads: a fast tokenizer used from
+        # two threads at once fails with "Already borrowed"
+        self._detached_model = None
+        self._detached_lock = threading.Lock()
         self._load_model()
 
     def _load_model(self):
         """Load the cross-encoder model."""
+        self.model = self._build_model()
+
+    def _build_model(self):
+        """Create a cross-encoder instance, or None without sentence-transformers."""
         try:
             from sentence_transformers import CrossEncoder
-            self.model = CrossEncoder(self.model_name, device=self.device)
         except ImportError:
             # Fallback if sentence-transformers not available
             print(f"Warning: CrossEncoder not available, using mock")
-            self.model = None
+            return None
+        return CrossEncoder(self.model_name, device=self.device)
 
     async def rerank(
         self,
@@ -114,20 +335,8 @@ class CrossEncoderReranker(Reranker):
             # Mock scores for testing
             return [0.5] * len(candidates)
 
-        # Create pairs
-        pairs = [[query, candidate] for candidate in candidates]
-
-        # Score in batches
-        all_scores = []
-        for i in range(0, len(pairs), self.batch_size):
-            batch = pairs[i:i + self.batch_size]
-            batch_scores = await self.score_batch(query, [p[1] for p in batch])
-            all_scores.extend(batch_scores)
-
         # Normalize scores to [0, 1]
-        scores = self._normalize_scores(all_scores)
-
-        return scores
+        return self._normalize_scores(await self.score_pairs_raw(query, candidates))
 
     async def score_batch(self, query: str, batch: List[str]) -> List[float]:
         """
@@ -137,24 +346,267 @@ class CrossEncoderReranker(Reranker):
             query: Query text
             batch: Batch of candidate texts
 
+        Returns:
+            List of scores
+        """
+        return await self.score_pair_batch([(query, text) for text in batch])
+
+    async def score_pair_batch(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        Score a batch of pairs, which may come from different queries.
+
+        Args:
+            pairs: (query, candidate) pairs
+
         Returns:
             List of scores
         """
         if self.model is None:
-            return [0.5] * len(batch)
+            return [0.5] * len(pairs)
+
+        record_batch(self.model_name, len(pairs))
+        start = time.perf_counter()
+        if self._pretokenized_supported():
+            scores = self._predict_pretokenized(pairs)
+        else:
+            # One forward pass per planned batch; predict must not re-split it
+            scores = np.asarray(self.model.predict(
+                [[query, text] for query, text in pairs],
+                batch_size=len(pairs),
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )).tolist()
+        if self.on_batch is not None:
+            self.on_batch(len(pairs), (time.perf_counter() - start) * 1000)
+        return scores
+
+    def _tokenizer_supported(self) -> bool:
+        """Whether token ids can be taken from the model's tokenizer and cached."""
+        return self.token_cache is not None and callable(getattr(self.model, "tokenizer", None))
+
+    def _encode(self, texts: List[str]) -> List[List[int]]:
+        """Tokenize texts without special tokens."""
+        return self.model.tokenizer(texts, add_special_tokens=False)["input_ids"]
 
-        pairs = [[query, text] for text in batch]
-        scores = self.model.predict(pairs)
-        return scores.tolist()
+    def _max_length(self) -> int:
+        """Sequence limit of the loaded model."""
+        return getattr(self.model, "max_length", None) or self.max_length
+
+    def predict_detached(self, query: str, candidates: List[str]) -> List[float]:
+        """
+        Score candidates synchronously without touching the shared caches.
+
+        Safe to call from a worker thread, so inference that no request
+        waits for can run off the event loop. Scoring uses a second model
+        instance, loaded on first use, so it never shares a tokenizer with
+        requests scored on the loop; detached calls run one at a time.
+
+        Args:
+            query: Query text
+            candidates: Candidate texts
+
+        Returns:
+            Raw scores in candidate order
+        """
+        if self.model is None:
+            return [0.5] * len(candidates)
+        with self._detached_lock:
+            if self._detached_model is None:
+                self._detached_model = self._build_model()
+            scores = self._detached_model.predict(
+                [[query, text] for text in candidates],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+        return np.asarray(scores).tolist()
+
+    def _pretokenized_supported(self) -> bool:
+        """Whether documents can be fed to the model as cached token ids."""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        return (
+            self._tokenizer_supported()
+            and callable(getattr(tokenizer, "build_inputs_with_special_tokens", None))
+            and callable(getattr(tokenizer, "create_token_type_ids_from_sequences", None))
+        )
+
+    def _predict_pretokenized(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        Score a batch from cached document token ids.
+
+        Only the queries are tokenized, each once; document ids come from
+        the token cache and are joined with the model's special tokens
+        directly.
+
+        Args:
+            pairs: (query, candidate) pairs
+
+        Returns:
+            List of scores
+        """
+        import torch
+
+        tokenizer = self.model.tokenizer
+
+        queries = list(dict.fromkeys(query for query, _ in pairs))
+        encoded = dict(zip(queries, self.query_token_cache.get_or_tokenize(queries, self._encode)))
+        documents = self.token_cache.get_or_tokenize([text for _, text in pairs], self._encode)
+        budget = self._max_length() - tokenizer.num_special_tokens_to_add(pair=True)
+
+        features = {"input_ids": [], "token_type_ids": []}
+        for (query, _), document in zip(pairs, documents):
+            query_ids = encoded[query][:max(budget // 2, budget - len(document))].tolist()
+            document_ids = document[:budget - len(query_ids)].tolist()
+            features["input_ids"].append(
+                tokenizer.build_inputs_with_special_tokens(query_ids, document_ids)
+            )
+            features["token_type_ids"].append(
+                tokenizer.create_token_type_ids_from_sequences(query_ids, document_ids)
+            )
+        if "token_type_ids" not in tokenizer.model_input_names:
+            del features["token_type_ids"]
+        inputs = tokenizer.pad(features, padding=True, return_tensors="pt")
+        device = getattr(self.model, "_target_device", None)
+        if device is not None:
+            inputs = {name: tensor.to(device) for name, tensor in inputs.items()}
+
+        with torch.no_grad():
+            logits = self.model.model(**inputs, return_dict=True).logits
+            activation = getattr(self.model, "default_activation_function", None)
+            if activation is not None:
+                logits = activation(logits)
+        if logits.shape[-1] == 1:
+            logits = logits[:, 0]
+        return logits.cpu().float().numpy().tolist()
 
     async def score_pairs_raw(self, query: str, candidates: List[str]) -> List[float]:
-        """Get raw scores without normalization."""
+        """
+        Get raw scores in length-sorted, token-budgeted batches.
+
+        Pairs found in the score cache are not scored again.
+
+        Args:
+            query: Query text
+            candidates: Candidate texts
+
+        Returns:
+            Raw scores in candidate order
+        """
+        return (await self.score_groups_raw([(query, candidates)]))[0]
+
+    async def score_groups_raw(
+        self,
+        groups: List[Tuple[str, List[str]]]
+    ) -> List[List[float]]:
+        """
+        Get raw scores of several queries' candidates in shared batches.
+
+        Pairs of every query are planned into one set of length-sorted,
+        token-budgeted batches, so many small reranks (e.g. one per user
+        in a batch job) fill the model's batches instead of each running
+        its own short ones.
+
+        Args:
+            groups: (query, candidates) per query
+
+        Returns:
+            Raw scores per group, in candidate order
+        """
         if self.model is None:
-            return [-2.0, 0.0, 2.0][:len(candidates)]
+            return [[0.5] * len(candidates) for _, candidates in groups]
+
+        scores: List[List[Optional[float]]] = []
+        missing: List[Tuple[int, int]] = []
+        for g, (query, candidates) in enumerate(groups):
+            if self.score_cache is not None:
+                scores.append(self.score_cache.lookup(self.model_name, query, candidates))
+            else:
+                scores.append([None] * len(candidates))
+            missing.extend((g, i) for i, score in enumerate(scores[g]) if score is None)
+        if not missing:
+            return scores
+
+        lengths = self._pair_lengths(groups, missing)
+        for batch in plan_batches(lengths, self.max_batch_tokens, self.batch_size):
+            pairs = [(groups[g][0], groups[g][1][i]) for g, i in (missing[j] for j in batch)]
+            queries = {query for query, _ in pairs}
+            if len(queries) == 1:
+                batch_scores = await self.score_batch(pairs[0][0], [text for _, text in pairs])
+            else:
+                batch_scores = await self.score_pair_batch(pairs)
+            for j, score in zip(batch, batch_scores):
+                g, i = missing[j]
+                scores[g][i] = score
+            if self.score_cache is not None:
+                for query in queries:
+                    scored = [(text, score) for (q, text), score in zip(pairs, batch_scores) if q == query]
+                    self.score_cache.store(
+                        self.model_name,
+                        query,
+                        [text for text, _ in scored],
+                        [score for _, score in scored]
+                    )
+        return scores
+
+    def _pair_lengths(
+        self,
+        groups: List[Tuple[str, List[str]]],
+        pairs: List[Tuple[int, int]]
+    ) -> List[int]:
+        """
+        Get the model sequence length of (group, candidate) pairs.
+
+        Lengths come from the tokenizer through the token caches, so the
+        batch budget bounds real padded tokens; documents tokenized here are
+        not tokenized again for scoring. Without a tokenizer they are
+        estimated from characters.
+
+        Args:
+            groups: (query, candidates) per query
+            pairs: (group index, candidate index) of the pairs to measure
 
-        pairs = [[query, candidate] for candidate in candidates]
-        scores = self.model.predict(pairs)
-        return scores.tolist()
+        Returns:
+            Token length of each pair, capped at the model limit
+        """
+        if not self._tokenizer_supported():
+            query_tokens = [estimate_tokens(query, self.max_length) for query, _ in groups]
+            return [
+                min(self.max_length, query_tokens[g] + estimate_tokens(groups[g][1][i], self.max_length))
+                for g, i in pairs
+            ]
+
+        max_length = self._max_length()
+        special = self.model.tokenizer.num_special_tokens_to_add(pair=True)
+        queries = self.query_token_cache.get_or_tokenize([query for query, _ in groups], self._encode)
+        documents = self.token_cache.get_or_tokenize([groups[g][1][i] for g, i in pairs], self._encode)
+        return [
+            min(max_length, len(queries[g]) + len(document) + special)
+            for (g, _), document in zip(pairs, documents)
+        ]
+
+    async def rerank_groups(
+        self,
+        groups: List[Tuple[str, List[str], int]]
+    ) -> List[List[RerankResult]]:
+        """
+        Re-rank the candidates of several queries with shared model batches.
+
+        Args:
+            groups: (query, candidates, top_k) per query
+
+        Returns:
+            Re-ranked results per group
+        """
+        raw = await self.score_groups_raw([(query, candidates) for query, candidates, _ in groups])
+        reranked = []
+        for (query, candidates, top_k), scores in zip(groups, raw):
+            results = [
+                RerankResult(content=candidate, relevance_score=score, original_rank=i)
+                for i, (candidate, score) in enumerate(zip(candidates, self._normalize_scores(scores)))
+            ]
+            results.sort(key=lambda x: x.relevance_score, reverse=True)
+            reranked.append(results[:top_k])
+        return reranked
 
     async def _score_single(self, query: str, candidate: str) -> float:
         """Score a single query-candidate pair."""
@@ -196,6 +648,141 @@ class CrossEncoderReranker(Reranker):
         return normalized.tolist()
 
 
+class RerankGate:
+    """
+    Decide from first-stage scores whether reranking can change the result.
+
+    Reranking is skipped when there are too few candidates, or when the
+    top results are separated from the rest by a wide margin and the score
+    distribution is peaked (low entropy). In shadow mode a sample of
+    skipped requests is still reranked off the request path and the two
+    orderings are compared, so the agreement of skipped requests is known.
+    """
+
+    def __init__(
+        self,
+        min_candidates: int = 3,
+        min_gap: float = 0.25,
+        max_entropy: float = 0.6,
+        temperature: float = 0.1,
+        shadow_rate: float = 0.05,
+        shadow_size: int = 200
+    ):
+        """
+        Initialize rerank gate.
+
+        Args:
+            min_candidates: Fewer candidates than this are never reranked
+            min_gap: Normalized score gap at the top-k boundary needed to skip
+            max_entropy: Normalized score entropy allowed when skipping
+            temperature: Softmax temperature of the entropy feature
+            shadow_rate: Fraction of skipped requests reranked in the shadow
+            shadow_size: Number of recent shadow comparisons kept
+        """
+        self.min_candidates = min_candidates
+        self.min_gap = min_gap
+        self.max_entropy = max_entropy
+        self.temperature = temperature
+        self.shadow_rate = shadow_rate
+        self.shadow_log: Deque[Dict[str, Any]] = deque(maxlen=shadow_size)
+        self.decisions = 0
+        self.skips = 0
+
+    def features(self, scores: Sequence[float], top_k: int) -> Dict[str, float]:
+        """
+        Describe a first-stage score distribution.
+
+        Args:
+            scores: First-stage scores
+            top_k: Number of results kept
+
+        Returns:
+            Candidate count, normalized top-k boundary gap and entropy
+        """
+        ordered = np.sort(np.asarray(scores, dtype=np.float64))[::-1]
+        count = len(ordered)
+        if count < 2 or ordered[0] == ordered[-1]:
+            return {"count": count, "gap": 0.0, "entropy": 1.0 if count > 1 else 0.0}
+
+        # Scale by the top score so closely bunched scores stay bunched
+        floor = min(ordered[-1], 0.0)
+        normalized = (ordered - floor) / (ordered[0] - floor)
+        boundary = min(top_k, count - 1)
+        # Gap after the top result, or after the top-k set when that is wider
+        gap = max(normalized[0] - normalized[1], normalized[boundary - 1] - normalized[boundary])
+        weights = np.exp((normalized - 1.0) / self.temperature)
+        weights /= weights.sum()
+        entropy = float(-(weights * np.log(weights + 1e-12)).sum() / np.log(count))
+        return {"count": count, "gap": float(gap), "entropy": entropy}
+
+    def should_rerank(self, scores: Sequence[float], top_k: int) -> Tuple[bool, Dict[str, float]]:
+        """
+        Decide whether to run the reranker.
+
+        Args:
+            scores: First-stage scores
+            top_k: Number of results kept
+
+        Returns:
+            Tuple of (rerank, features)
+        """
+        features = self.features(scores, top_k)
+        confident = features["gap"] >= self.min_gap and features["entropy"] <= self.max_entropy
+        rerank = features["count"] >= self.min_candidates and not confident
+        self.decisions += 1
+        if not rerank:
+            self.skips += 1
+        return rerank, features
+
+    def sample_shadow(self) -> bool:
+        """Whether to shadow-rerank the current skipped request."""
+        return random.random() < self.shadow_rate
+
+    def record_shadow(
+        self,
+        skipped: Sequence[str],
+        reranked: Sequence[str],
+        features: Dict[str, float]
+    ) -> float:
+        """
+        Compare the ordering served without reranking to the full rerank.
+
+        Args:
+            skipped: Result identities in the served order
+            reranked: Result identities in the reranked order
+            features: Features the skip was decided on
+
+        Returns:
+            Top-k overlap in [0, 1]
+        """
+        k = max(len(skipped), 1)
+        agreement = len(set(skipped) & set(reranked[:k])) / k
+        self.shadow_log.append({
+            **features,
+            "agreement": agreement,
+            "same_top": bool(skipped and reranked and skipped[0] == reranked[0]),
+        })
+        if agreement < 1.0:
+            print(f"Rerank shadow disagreement: overlap {agreement:.2f} at gap {features['gap']:.2f}")
+        return agreement
+
+    def stats(self) -> Dict[str, Any]:
+        """Get skip rate and shadow agreement counters."""
+        compared = len(self.shadow_log)
+        return {
+            "decisions": self.decisions,
+            "skips": self.skips,
+            "skip_rate": self.skips / self.decisions if self.decisions else 0.0,
+            "shadow_comparisons": compared,
+            "shadow_agreement": (
+                sum(e["agreement"] for e in self.shadow_log) / compared if compared else 1.0
+            ),
+            "shadow_same_top": (
+                sum(e["same_top"] for e in self.shadow_log) / compared if compared else 1.0
+            ),
+        }
+
+
 class RerankService:
     """Main reranking service."""
 
@@ -203,55 +790,185 @@ class RerankService:
         self,
         model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
         enable_cache: bool = True,
-        cache_ttl: int = 300
+        cache_ttl: int = 300,
+        cascade_top_n: int = 20,
+        initial_pair_cost_ms: float = 2.0,
+        cost_smoothing: float = 0.2
     ):
         """
         Initialize rerank service.
 
         Args:
             model_name: Model to use for reranking
-            enable_cache: Enable result caching
+            enable_cache: Enable result and pair score caching
             cache_ttl: Cache time to live
+            cascade_top_n: Candidates kept by the first cascade stage without a budget
+            initial_pair_cost_ms: Cross-encoder cost per pair assumed before measuring
+            cost_smoothing: Weight of the newest measurement in the cost average
         """
-        self.reranker = CrossEncoderReranker(model_name=model_name)
+        self.lexical = LexicalReranker()
+        self.cascade_top_n = cascade_top_n
+        self.pair_cost_ms = initial_pair_cost_ms
+        self.cost_smoothing = cost_smoothing
         self.model_name = model_name
         self.enable_cache = enable_cache
         self.cache_ttl = cache_ttl
-        self.cache = {} if enable_cache else None
+        self.cache = TTLCache(ttl=cache_ttl, name="rerank") if enable_cache else None
+        self.score_cache = PairScoreCache(ttl=cache_ttl) if enable_cache else None
+        self.reranker = CrossEncoderReranker(
+            model_name=model_name,
+            score_cache=self.score_cache,
+            token_cache=TokenCache(),
+            on_batch=self._observe_batch
+        )
 
-    async def process_request(self, request: RerankRequest) -> RerankResponse:
+    async def process_request(
+        self,
+        request: RerankRequest,
+        query_context: Optional[QueryContext] = None,
+        first_stage_scores: Optional[List[float]] = None
+    ) -> RerankResponse:
         """
         Process rerank request.
 
         Args:
             request: Rerank request
+            query_context: Query context reused by the fallback scorer
+            first_stage_scores: Precomputed cheap scores (e.g. bi-encoder
+                cosine from search) used by the cascade's first stage
 
         Returns:
             Rerank response
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         # Perform reranking
-        results = await self.reranker.rerank(
-            query=request.query,
-            candidates=request.candidates,
-            top_k=request.top_k
-        )
+        if request.cascade:
+            results, stages = await self.cascade_rerank(
+                request.query,
+                request.candidates,
+                request.top_k,
+                latency_budget_ms=request.latency_budget_ms,
+                query_context=query_context,
+                first_stage_scores=first_stage_scores
+            )
+        else:
+            results = await self.rerank_with_fallback(
+                request.query,
+                request.candidates,
+                request.top_k,
+                query_context=query_context
+            )
+            stages = [RerankStage(
+                name="cross_encoder",
+                candidates_in=len(request.candidates),
+                candidates_out=len(results),
+                time_ms=(time.perf_counter() - start_time) * 1000
+            )]
 
         # Calculate processing time
-        processing_time_ms = (time.time() - start_time) * 1000
+        processing_time_ms = (time.perf_counter() - start_time) * 1000
 
         return RerankResponse(
             reranked=results,
             model_used=self.model_name,
-            processing_time_ms=processing_time_ms
+            processing_time_ms=processing_time_ms,
+            stages=stages
+        )
+
+    async def cascade_rerank(
+        self,
+        query: str,
+        candidates: List[str],
+        top_k: int,
+        latency_budget_ms: Optional[float] = None,
+        query_context: Optional[QueryContext] = None,
+        first_stage_scores: Optional[List[float]] = None
+    ) -> Tuple[List[RerankResult], List[RerankStage]]:
+        """
+        Prune candidates with a cheap scorer, then cross-encode the rest.
+
+        Args:
+            query: Query text
+            candidates: Candidate texts
+            top_k: Number of results
+            latency_budget_ms: Time allowed for the whole cascade
+            query_context: Query context supplying pre-tokenized terms
+            first_stage_scores: Precomputed cheap score per candidate
+
+        Returns:
+            Tuple of (reranked results, stage reports)
+        """
+        start = time.perf_counter()
+        if first_stage_scores is not None and len(first_stage_scores) == len(candidates):
+            stage_name, cheap_scores = "precomputed", list(first_stage_scores)
+        else:
+            query_terms = query_context.terms if query_context is not None else tokenize(query)
+            stage_name, cheap_scores = "lexical", self.lexical.score(query_terms, candidates).tolist()
+        first_ms = (time.perf_counter() - start) * 1000
+
+        keep = self.cascade_size(len(candidates), top_k, latency_budget_ms, first_ms)
+        kept = sorted(range(len(candidates)), key=lambda i: cheap_scores[i], reverse=True)[:keep]
+        stages = [RerankStage(
+            name=stage_name,
+            candidates_in=len(candidates),
+            candidates_out=len(kept),
+            time_ms=first_ms
+        )]
+
+        start = time.perf_counter()
+        results = await self.rerank_with_fallback(
+            query,
+            [candidates[i] for i in kept],
+            top_k,
+            query_context=query_context
         )
+        cross_ms = (time.perf_counter() - start) * 1000
+        for result in results:
+            result.original_rank = kept[result.original_rank]
+        stages.append(RerankStage(
+            name="cross_encoder",
+            candidates_in=len(kept),
+            candidates_out=len(results),
+            time_ms=cross_ms
+        ))
+        return results, stages
+
+    def _observe_batch(self, pairs: int, elapsed_ms: float) -> None:
+        """Fold the per-pair time of a batch the model scored into the cost average."""
+        self.pair_cost_ms += self.cost_smoothing * (elapsed_ms / pairs - self.pair_cost_ms)
+
+    def cascade_size(
+        self,
+        candidates: int,
+        top_k: int,
+        latency_budget_ms: Optional[float],
+        spent_ms: float = 0.0
+    ) -> int:
+        """
+        Number of candidates the cross-encoder can afford to score.
+
+        Args:
+            candidates: Number of candidates
+            top_k: Number of results (always cross-encoded)
+            latency_budget_ms: Time allowed for the cascade (None for a fixed size)
+            spent_ms: Time already used by earlier stages
+
+        Returns:
+            Candidates passed to the cross-encoder
+        """
+        if latency_budget_ms is None:
+            affordable = self.cascade_top_n
+        else:
+            affordable = int((latency_budget_ms - spent_ms) / max(self.pair_cost_ms, 1e-3))
+        return min(candidates, max(top_k, affordable))
 
     async def rerank_with_fallback(
         self,
         query: str,
         candidates: List[str],
-        top_k: int
+        top_k: int,
+        query_context: Optional[QueryContext] = None
     ) -> List[RerankResult]:
         """
         Rerank with fallback support.
@@ -260,6 +977,7 @@ class RerankService:
             query: Query text
             candidates: Candidate texts
             top_k: Number of results
+            query_context: Query context reused by the fallback scorer
 
         Returns:
             Reranked results
@@ -268,13 +986,69 @@ class RerankService:
             return await self.reranker.rerank(query, candidates, top_k)
         except Exception as e:
             print(f"Reranking failed, using fallback: {e}")
-            return await self.fallback_rerank(query, candidates, top_k)
+            record_fallback("rerank")
+            query_terms = query_context.terms if query_context is not None else None
+            return await self.fallback_rerank(query, candidates, top_k, query_terms=query_terms)
+
+    def score_detached(self, query: str, candidates: List[str]) -> List[float]:
+        """
+        Score candidates in the calling thread, with lexical fallback.
+
+        Run through `asyncio.to_thread` for work off the request path,
+        such as shadow reranks; the score caches are bypassed because they
+        are not thread-safe, and the timing is kept out of the pair cost.
+
+        Args:
+            query: Query text
+            candidates: Candidate texts
+
+        Returns:
+            Scores in candidate order
+        """
+        try:
+            return self.reranker.predict_detached(query, candidates)
+        except Exception as e:
+            print(f"Detached scoring failed, using fallback: {e}")
+            record_fallback("rerank")
+            return self.lexical.score(tokenize(query), candidates).tolist()
+
+    async def rerank_batch(
+        self,
+        groups: List[Tuple[str, List[str], int]],
+        query_contexts: Optional[List[Optional[QueryContext]]] = None
+    ) -> List[List[RerankResult]]:
+        """
+        Rerank many queries' candidates together, with fallback support.
+
+        Args:
+            groups: (query, candidates, top_k) per query
+            query_contexts: Query contexts reused by the fallback scorer
+
+        Returns:
+            Reranked results per group
+        """
+        try:
+            return await self.reranker.rerank_groups(groups)
+        except Exception as e:
+            print(f"Batch reranking failed, using fallback: {e}")
+            record_fallback("rerank")
+            contexts = query_contexts or [None] * len(groups)
+            return [
+                await self.fallback_rerank(
+                    query,
+                    candidates,
+                    top_k,
+                    query_terms=context.terms if context is not None else None
+                )
+                for (query, candidates, top_k), context in zip(groups, contexts)
+            ]
 
     async def fallback_rerank(
         self,
         query: str,
         candidates: List[str],
-        top_k: int
+        top_k: int,
+        query_terms: Optional[List[str]] = None
     ) -> List[RerankResult]:
         """
         Simple fallback reranking.
@@ -283,32 +1057,15 @@ class RerankService:
             query: Query text
             candidates: Candidate texts
             top_k: Number of results
+            query_terms: Pre-tokenized query terms
 
         Returns:
             Results with basic scoring
         """
-        # Simple keyword-based scoring
-        query_terms = set(query.lower().split())
-        results = []
-
-        for i, candidate in enumerate(candidates):
-            candidate_terms = set(candidate.lower().split())
-            # Calculate Jaccard similarity
-            intersection = query_terms & candidate_terms
-            union = query_terms | candidate_terms
-            score = len(intersection) / len(union) if union else 0.0
-
-            results.append(
-                RerankResult(
-                    content=candidate,
-                    relevance_score=score,
-                    original_rank=i
-                )
-            )
-
-        # Sort and return top-k
-        results.sort(key=lambda x: x.relevance_score, reverse=True)
-        return results[:min(top_k, len(results))]
+        # Keyword overlap scored for all candidates at once
+        return await self.lexical.rerank(
+            query, candidates, top_k, query_terms=query_terms, method="jaccard"
+        )
 
     async def rerank_with_cache(
         self,
@@ -319,6 +1076,9 @@ class RerankService:
         """
         Rerank with caching support.
 
+        Exact repeats are served from the result cache; otherwise only the
+        pairs missing from the pair score cache are scored.
+
         Args:
             query: Query text
             candidates: Candidate texts
@@ -327,17 +1087,18 @@ class RerankService:
         Returns:
             Cached or newly reranked results
         """
-        if self.cache:
+        if self.cache is not None:
             import hashlib
             # Create cache key from query and candidates
             cache_data = f"{query}:{'|'.join(candidates)}:{top_k}"
             cache_key = hashlib.md5(cache_data.encode()).hexdigest()
 
-            if cache_key in self.cache:
-                return self.cache[cache_key]
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
 
             results = await self.reranker.rerank(query, candidates, top_k)
-            self.cache[cache_key] = results
+            await self.cache.set(cache_key, results)
             return results
 
         return await self.reranker.rerank(query, candidates, top_k)
@@ -375,8 +1136,10 @@ class RerankService:
 
     async def cleanup(self):
         """Cleanup resources."""
-        if self.cache:
-            self.cache.clear()
+        if self.cache is not None:
+            await self.cache.clear()
+        if self.score_cache is not None:
+            self.score_cache.clear()
 
 
 # Convenience function
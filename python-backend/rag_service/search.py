@@ -3,21 +3,39 @@ Search module for RAG service.
 Provides semantic, keyword, and hybrid search capabilities.
 """
 
+import random
 import time
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional
+from dataclasses import dataclass, replace
 import numpy as np
 from datetime import datetime
 
 from .interfaces import (
     SearchEngine,
     SearchResult,
+    SearchFilter,
+    QueryContext,
+    Embedding,
     ContentType,
     SearchStrategy,
+    FusionMethod,
     HybridSearchRequest,
     HybridSearchResponse,
+    BatchSearchRequest,
+    BatchSearchResponse,
 )
-from .embeddings import generate_embedding
+from .embeddings import generate_embedding, generate_embeddings
+from .cache import (
+    SemanticQueryCache,
+    TTLCache,
+    UserVersions,
+    make_cache_key,
+    normalize_query,
+)
+from .fusion import ScoreFusion, result_key
+from .indexes import InMemorySearchIndex, build_query_context
+from .metrics import track_stage
+from .pagination import PageCursor, rank_order, resume_index
 
 
 class VectorStore:
@@ -28,7 +46,9 @@ class VectorStore:
         query_vector: List[float],
         user_id: str,
         limit: int,
-        threshold: float
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None
     ) -> List[SearchResult]:
         """Mock similar vector search."""
         # In production, this would query pgvector
@@ -42,7 +62,10 @@ class Database:
         self,
         query: str,
         user_id: str,
-        limit: int
+        limit: int,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        terms: Optional[List[str]] = None
     ) -> List[SearchResult]:
         """Mock full-text search."""
         # In production, this would query PostgreSQL
@@ -52,14 +75,21 @@ class Database:
 class SemanticSearch(SearchEngine):
     """Semantic search using vector similarity."""
 
-    def __init__(self, vector_store: Optional[VectorStore] = None):
+    def __init__(
+        self,
+        vector_store: Optional[VectorStore] = None,
+        embedding_service: Optional[Any] = None
+    ):
         """
         Initialize semantic search.
 
         Args:
             vector_store: Vector store instance
+            embedding_service: Embedding service for query vectors
+                (a fresh sentence-transformer is used when omitted)
         """
         self.vector_store = vector_store or VectorStore()
+        self.embedding_service = embedding_service
 
     async def search(
         self,
@@ -67,6 +97,10 @@ class SemanticSearch(SearchEngine):
         user_id: str,
         limit: int,
         threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        query_context: Optional[QueryContext] = None,
+        query_vector: Optional[List[float]] = None,
         **kwargs
     ) -> List[SearchResult]:
         """
@@ -77,25 +111,105 @@ class SemanticSearch(SearchEngine):
             user_id: User identifier
             limit: Maximum results
             threshold: Similarity threshold
+            filters: Filter applied inside the vector store
+            recency_half_life_days: Half-life of the recency decay term
+            query_context: Query context carrying a precomputed embedding
+            query_vector: Precomputed query embedding
             **kwargs: Additional parameters
 
         Returns:
             List of search results
         """
-        # Generate query embedding
-        query_embedding = await generate_embedding(query)
+        # Reuse the request's query embedding, generating it only if absent
+        if query_vector is None and query_context is not None:
+            query_vector = query_context.embedding
+        query_embedding = query_vector if query_vector is not None else await self._embed(query)
 
         # Search for similar vectors
         results = await self.vector_store.search_similar(
             query_vector=query_embedding,
             user_id=user_id,
             limit=limit,
-            threshold=threshold
+            threshold=threshold,
+            filters=filters,
+            recency_half_life_days=recency_half_life_days
         )
 
         return results
 
 
+    async def search_batch(
+        self,
+        queries: List[str],
+        user_id: str,
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        query_vectors: Optional[List[List[float]]] = None,
+        **kwargs
+    ) -> List[List[SearchResult]]:
+        """
+        Perform several semantic searches with one embedding batch.
+
+        Args:
+            queries: Search queries
+            user_id: User identifier
+            limit: Maximum results per query
+            threshold: Similarity threshold
+            filters: Filter applied inside the vector store
+            recency_half_life_days: Half-life of the recency decay term
+            query_vectors: Precomputed query embeddings, one per query
+            **kwargs: Additional parameters
+
+        Returns:
+            One list of search results per query
+        """
+        query_embeddings = query_vectors
+        if query_embeddings is None:
+            query_embeddings = await self._embed_batch(queries)
+
+        # Score all queries in one matrix-matrix product when supported
+        search_similar_batch = getattr(self.vector_store, "search_similar_batch", None)
+        if search_similar_batch is not None:
+            return await search_similar_batch(
+                query_vectors=query_embeddings,
+                user_id=user_id,
+                limit=limit,
+                threshold=threshold,
+                filters=filters,
+                recency_half_life_days=recency_half_life_days
+            )
+
+        return [
+            await self.vector_store.search_similar(
+                query_vector=query_embedding,
+                user_id=user_id,
+                limit=limit,
+                threshold=threshold,
+                filters=filters,
+                recency_half_life_days=recency_half_life_days
+            )
+            for query_embedding in query_embeddings
+        ]
+
+    async def _embed(self, query: str) -> List[float]:
+        """Embed one query."""
+        if self.embedding_service is not None:
+            embedding, _ = await self.embedding_service.generate_with_fallback(query)
+            return embedding
+        return await generate_embedding(query)
+
+    async def _embed_batch(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries in one batch."""
+        if self.embedding_service is not None:
+            return [
+                embedding
+                for embedding, _ in await self.embedding_service.generate_batch(queries)
+            ]
+        return await generate_embeddings(queries)
+
+
 class KeywordSearch(SearchEngine):
     """Keyword-based search using full-text search."""
 
@@ -114,6 +228,9 @@ class KeywordSearch(SearchEngine):
         user_id: str,
         limit: int,
         threshold: float = 0.0,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        query_context: Optional[QueryContext] = None,
         **kwargs
     ) -> List[SearchResult]:
         """
@@ -124,6 +241,9 @@ class KeywordSearch(SearchEngine):
             user_id: User identifier
             limit: Maximum results
             threshold: Not used for keyword search
+            filters: Filter applied inside the full-text index
+            recency_half_life_days: Half-life of the recency decay term
+            query_context: Query context carrying pre-tokenized terms
             **kwargs: Additional parameters
 
         Returns:
@@ -132,7 +252,10 @@ class KeywordSearch(SearchEngine):
         results = await self.database.full_text_search(
             query=query,
             user_id=user_id,
-            limit=limit
+            limit=limit,
+            filters=filters,
+            recency_half_life_days=recency_half_life_days,
+            terms=query_context.terms if query_context is not None else None
         )
 
         return results
@@ -144,7 +267,8 @@ class HybridSearch(SearchEngine):
     def __init__(
         self,
         semantic_search: Optional[SemanticSearch] = None,
-        keyword_search: Optional[KeywordSearch] = None
+        keyword_search: Optional[KeywordSearch] = None,
+        fusion: Optional[ScoreFusion] = None
     ):
         """
         Initialize hybrid search.
@@ -152,9 +276,11 @@ class HybridSearch(SearchEngine):
         Args:
             semantic_search: Semantic search instance
             keyword_search: Keyword search instance
+            fusion: Score fusion strategy for merging result lists
         """
         self.semantic_search = semantic_search or SemanticSearch()
         self.keyword_search = keyword_search or KeywordSearch()
+        self.fusion = fusion or ScoreFusion()
 
     async def search(
         self,
@@ -162,7 +288,11 @@ class HybridSearch(SearchEngine):
         user_id: str,
         limit: int,
         threshold: float = 0.5,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
         alpha: float = 0.5,
+        fusion_method: Optional[FusionMethod] = None,
+        query_context: Optional[QueryContext] = None,
         **kwargs
     ) -> List[SearchResult]:
         """
@@ -173,7 +303,11 @@ class HybridSearch(SearchEngine):
             user_id: User identifier
             limit: Maximum results
             threshold: Similarity threshold
+            filters: Filter applied inside both engines
+            recency_half_life_days: Half-life of the recency decay term
             alpha: Weight for semantic search (0-1)
+            fusion_method: Fusion method overriding the default
+            query_context: Query context shared by both engines
             **kwargs: Additional parameters
 
         Returns:
@@ -184,36 +318,104 @@ class HybridSearch(SearchEngine):
         keyword_results = []
 
         if alpha > 0:
-            semantic_results = await self.semantic_search.search(
-                query=query,
+            with track_stage("vector_search"):
+                semantic_results = await self.semantic_search.search(
+                    query=query,
+                    user_id=user_id,
+                    limit=limit * 2,  # Get more for merging
+                    threshold=threshold,
+                    filters=filters,
+                    recency_half_life_days=recency_half_life_days,
+                    query_context=query_context
+                )
+
+        if alpha < 1:
+            with track_stage("keyword_search"):
+                keyword_results = await self.keyword_search.search(
+                    query=query,
+                    user_id=user_id,
+                    limit=limit * 2,
+                    filters=filters,
+                    recency_half_life_days=recency_half_life_days,
+                    query_context=query_context
+                )
+
+        # Combine results with weighted scores
+        with track_stage("fuse"):
+            combined_results = self._combine_results(
+                semantic_results,
+                keyword_results,
+                alpha,
+                limit,
+                fusion_method
+            )
+
+        return combined_results
+
+    async def search_batch(
+        self,
+        queries: List[str],
+        user_id: str,
+        limit: int,
+        threshold: float = 0.5,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        alpha: float = 0.5,
+        fusion_method: Optional[FusionMethod] = None,
+        **kwargs
+    ) -> List[List[SearchResult]]:
+        """
+        Perform several hybrid searches, batching the semantic side.
+
+        Args:
+            queries: Search queries
+            user_id: User identifier
+            limit: Maximum results per query
+            threshold: Similarity threshold
+            filters: Filter applied inside both engines
+            recency_half_life_days: Half-life of the recency decay term
+            alpha: Weight for semantic search (0-1)
+            fusion_method: Fusion method overriding the default
+            **kwargs: Additional parameters
+
+        Returns:
+            One list of combined search results per query
+        """
+        semantic_batch = [[] for _ in queries]
+        keyword_batch = [[] for _ in queries]
+
+        if alpha > 0:
+            semantic_batch = await self.semantic_search.search_batch(
+                queries=queries,
                 user_id=user_id,
-                limit=limit * 2,  # Get more for merging
-                threshold=threshold
+                limit=limit * 2,
+                threshold=threshold,
+                filters=filters,
+                recency_half_life_days=recency_half_life_days
             )
 
         if alpha < 1:
-            keyword_results = await self.keyword_search.search(
-                query=query,
+            keyword_batch = await self.keyword_search.search_batch(
+                queries=queries,
                 user_id=user_id,
-                limit=limit * 2
+                limit=limit * 2,
+                threshold=0.0,
+                filters=filters,
+                recency_half_life_days=recency_half_life_days
             )
 
-        # Combine results with weighted scores
-        combined_results = self._combine_results(
-            semantic_results,
-            keyword_results,
-            alpha,
-            limit
-        )
-
-        return combined_results
+        return [
+            self._combine_results(semantic, keyword, alpha, limit, fusion_method)
+            for semantic, keyword in zip(semantic_batch, keyword_batch)
+        ]
 
     def _combine_results(
         self,
         semantic_results: List[SearchResult],
         keyword_results: List[SearchResult],
         alpha: float,
-        limit: int
+        limit: int,
+        fusion_method: Optional[FusionMethod] = None
     ) -> List[SearchResult]:
         """
         Combine and deduplicate search results.
@@ -223,50 +425,18 @@ class HybridSearch(SearchEngine):
             keyword_results: Results from keyword search
             alpha: Weight for semantic search
             limit: Maximum results to return
+            fusion_method: Fusion method overriding the default
 
         Returns:
-            Combined and sorted results
-        """
-        # Create a dictionary to track combined scores
-        combined = {}
-
-        # Add semantic results
-        for result in semantic_results:
-            key = result.content  # Use content as key for deduplication
-            if key not in combined:
-                combined[key] = {
-                    'result': result,
-                    'score': 0.0
-                }
-            combined[key]['score'] += alpha * result.score
-
-        # Add keyword results
-        for result in keyword_results:
-            key = result.content
-            if key not in combined:
-                combined[key] = {
-                    'result': result,
-                    'score': 0.0
-                }
-            combined[key]['score'] += (1 - alpha) * result.score
-
-        # Sort by combined score
-        sorted_items = sorted(
-            combined.items(),
-            key=lambda x: x[1]['score'],
-            reverse=True
+            New result objects ranked by fused score
+        """
+        return self.fusion.fuse(
+            [semantic_results, keyword_results],
+            weights=[alpha, 1 - alpha],
+            limit=limit,
+            method=fusion_method
         )
 
-        # Create final results
-        final_results = []
-        for _, item in sorted_items[:limit]:
-            result = item['result']
-            # Update score with combined score
-            result.score = item['score']
-            final_results.append(result)
-
-        return final_results
-
 
 class SearchService:
     """Main search service with strategy selection."""
@@ -274,7 +444,14 @@ class SearchService:
     def __init__(
         self,
         enable_cache: bool = True,
-        cache_ttl: int = 300
+        cache_ttl: int = 300,
+        index: Optional[Any] = None,
+        cache_max_entries: int = 2048,
+        embedding_service: Optional[Any] = None,
+        semantic_cache: Optional[SemanticQueryCache] = None,
+        semantic_cache_audit_rate: float = 0.0,
+        page_window: int = 5,
+        max_page_window: int = 1000
     ):
         """
         Initialize search service.
@@ -282,64 +459,422 @@ class SearchService:
         Args:
             enable_cache: Enable result caching
             cache_ttl: Cache time to live in seconds
+            index: Index backing semantic and keyword search, local
+                (InMemorySearchIndex) or sharded (ShardedVectorStore)
+            cache_max_entries: Maximum cached result sets
+            embedding_service: Embedding service used for semantic cache lookups
+            semantic_cache: Cache reusing results of near-identical queries
+            semantic_cache_audit_rate: Fraction of semantic hits re-run to audit them
+            page_window: Pages ranked ahead when a cursor is first followed
+            max_page_window: Deepest result reachable through cursors
         """
-        self.semantic_search = SemanticSearch()
-        self.keyword_search = KeywordSearch()
+        self.index = index or InMemorySearchIndex()
+        self.semantic_search = SemanticSearch(
+            vector_store=self.index,
+            embedding_service=embedding_service
+        )
+        self.keyword_search = KeywordSearch(database=self.index)
         self.hybrid_search = HybridSearch(
             self.semantic_search,
             self.keyword_search
         )
         self.enable_cache = enable_cache
         self.cache_ttl = cache_ttl
-        self.cache = {} if enable_cache else None
+        self.cache = TTLCache(cache_max_entries, cache_ttl, name="search") if enable_cache else None
+        self.versions = UserVersions()
+        self.embedding_service = embedding_service
+        self.semantic_cache = semantic_cache if embedding_service is not None else None
+        self.semantic_cache_audit_rate = semantic_cache_audit_rate
+        self.page_window = page_window
+        self.max_page_window = max_page_window
+        # Called with (user_id, content_type) after every write, e.g. to prefetch
+        self.write_listeners: List[Callable[[str, Optional[ContentType]], None]] = []
 
     async def process_request(
         self,
-        request: HybridSearchRequest
+        request: HybridSearchRequest,
+        query_context: Optional[QueryContext] = None,
+        allow_embedding: bool = True
     ) -> HybridSearchResponse:
         """
         Process search request.
 
         Args:
             request: Search request
+            query_context: Query context built once for the whole request;
+                the query is encoded at most once if it carries no embedding
+            allow_embedding: Whether the query may be encoded for a semantic
+                cache lookup (keyword requests short on time skip it)
+
+        Returns:
+            Search response with a cursor to the next page, if any
+
+        Raises:
+            ValueError: If the request carries an invalid or foreign cursor
+        """
+        if request.cursor is not None:
+            return await self._process_page(request, query_context)
+
+        start_time = time.perf_counter()
+        version = self.versions.get(request.user_id)
+
+        cache_key = None
+        results = None
+        if self.cache is not None:
+            cache_key = self._request_cache_key(request)
+            results = await self.cache.get(cache_key)
+
+        semantic_cache = self.semantic_cache if allow_embedding else None
+        if results is None and semantic_cache is not None:
+            query_context = await self._embed_query(request.query, query_context)
+            results = await self._semantic_cache_lookup(request, query_context)
+            if results is not None and cache_key is not None:
+                await self.cache.set(cache_key, results, ttl=self.cache_ttl)
+
+        from_cache = results is not None
+        exhausted = from_cache and len(results) < request.limit
+        if results is None and not request.paginate:
+            # Callers that never follow a cursor only pay for their own limit
+            results = await self._execute(request, query_context)
+        elif results is None:
+            # Cut the first page from the window later pages are served from:
+            # fused scores depend on ranking depth, so pages of rankings of
+            # different depths do not line up
+            window = await self._rank_window(
+                request, version, request.limit * self.page_window, query_context
+            )
+            results = window["results"][:request.limit]
+            exhausted = window["complete"] and len(window["results"]) <= request.limit
+
+        if not from_cache:
+            if cache_key is not None:
+                await self.cache.set(cache_key, results, ttl=self.cache_ttl)
+            if semantic_cache is not None:
+                semantic_cache.store(
+                    request.user_id,
+                    version,
+                    self._request_signature(request),
+                    request.query,
+                    query_context.embedding,
+                    results,
+                    model_name=query_context.model_name
+                )
+
+        # Calculate processing time
+        processing_time_ms = (time.perf_counter() - start_time) * 1000
+
+        return HybridSearchResponse(
+            results=results,
+            search_strategy=request.search_type,
+            processing_time_ms=processing_time_ms,
+            total_results=len(results),
+            next_cursor=(
+                self._next_cursor(request, version, results, 0, exhausted) if request.paginate else None
+            ),
+            from_cache=from_cache
+        )
+
+    async def _process_page(
+        self,
+        request: HybridSearchRequest,
+        query_context: Optional[QueryContext] = None
+    ) -> HybridSearchResponse:
+        """
+        Serve the page after a cursor.
+
+        Pages are cut from the ranked window cached per data version that
+        the first page came from, so following cursors never re-runs the
+        search and pages resume at the cursor's offset. A window too short
+        for the page is extended, keeping its ranked results as a prefix so
+        earlier pages stay valid. If the window was evicted or the user's
+        data changed, a new one is ranked and the page resumes after the
+        cursor's last result.
+
+        Args:
+            request: Search request carrying a cursor
+            query_context: Query context built once for the whole request
+
+        Returns:
+            Search response with a cursor to the next page, if any
+        """
+        start_time = time.perf_counter()
+        cursor = PageCursor.decode(request.cursor)
+        if cursor.request_hash != self._page_hash(request):
+            raise ValueError("Cursor does not belong to this search request")
+
+        version = cursor.version
+        window = None
+        if self.cache is not None:
+            window = self.cache.get_nowait(self._window_key(request, version))
+
+        position = 0
+        if window is not None:
+            position = resume_index(window["results"], cursor.offset, cursor.key)
+
+        size = max(cursor.offset + request.limit, request.limit * self.page_window)
+        while window is None or (
+            not window["complete"] and position + request.limit > len(window["results"])
+        ):
+            current = self.versions.get(request.user_id)
+            prefix = window["results"] if window is not None and current == version else []
+            version = current
+            window = await self._rank_window(request, version, size, query_context, prefix)
+            position = resume_index(window["results"], cursor.offset, cursor.key)
+            size *= 2
+
+        results = window["results"][position:position + request.limit]
+        end = position + len(results)
+        processing_time_ms = (time.perf_counter() - start_time) * 1000
+
+        return HybridSearchResponse(
+            results=results,
+            search_strategy=request.search_type,
+            processing_time_ms=processing_time_ms,
+            total_results=len(results),
+            next_cursor=self._next_cursor(
+                request,
+                version,
+                results,
+                cursor.offset,
+                window["complete"] and end >= len(window["results"])
+            )
+        )
+
+    async def _rank_window(
+        self,
+        request: HybridSearchRequest,
+        version: int,
+        size: int,
+        query_context: Optional[QueryContext] = None,
+        prefix: Optional[List[SearchResult]] = None
+    ) -> Dict[str, Any]:
+        """
+        Rank the top results of a request for pagination and cache them.
+
+        Args:
+            request: Search request
+            version: User data version read before searching
+            size: Number of results to rank
+            query_context: Query context built once for the whole request
+            prefix: Results of a shallower window at the same version; kept
+                in order, with the deeper ranking only appending to them
 
         Returns:
-            Search response
+            Window with the ranked results and whether they are exhaustive
         """
-        start_time = time.time()
+        size = min(size, self.max_page_window)
+        ranked = rank_order(await self._execute(
+            request.model_copy(update={"limit": size, "cursor": None}),
+            query_context
+        ))
+        complete = len(ranked) < size or size >= self.max_page_window
+        # Fused scores shift with depth, so a deeper ranking may reorder
+        # results already paged through; only its new results are appended
+        results = list(prefix or [])
+        seen = {result_key(r) for r in results}
+        results.extend(r for r in ranked if result_key(r) not in seen)
+        window = {
+            "results": results,
+            "complete": complete,
+        }
+        if self.cache is not None:
+            self.cache.set_nowait(self._window_key(request, version), window)
+        return window
+
+    def _next_cursor(
+        self,
+        request: HybridSearchRequest,
+        version: int,
+        results: List[SearchResult],
+        offset: int,
+        exhausted: bool
+    ) -> Optional[str]:
+        """Build the cursor to the page after `results`, if there is one."""
+        if exhausted or not results:
+            return None
+        last = results[-1]
+        return PageCursor(
+            version=version,
+            request_hash=self._page_hash(request),
+            offset=offset + len(results),
+            key=result_key(last),
+        ).encode()
+
+    async def stream_results(
+        self,
+        request: HybridSearchRequest,
+        max_results: Optional[int] = None,
+        query_context: Optional[QueryContext] = None
+    ) -> AsyncIterator[SearchResult]:
+        """
+        Yield ranked results page by page.
+
+        The next page is only fetched once the consumer has taken every
+        result of the current one, so stopping early skips the rest.
 
+        Args:
+            request: Search request; its limit sets the page size
+            max_results: Stop after this many results
+            query_context: Query context built once for the whole stream
+
+        Yields:
+            Search results, best first
+        """
+        yielded = 0
+        request = request.model_copy(update={"paginate": True})
+        while True:
+            response = await self.process_request(request, query_context)
+            for result in response.results:
+                yield result
+                yielded += 1
+                if max_results is not None and yielded >= max_results:
+                    return
+            if response.next_cursor is None:
+                return
+            request = request.model_copy(update={"cursor": response.next_cursor})
+
+    async def batch_search(self, request: BatchSearchRequest) -> BatchSearchResponse:
+        """
+        Run several queries of one user in a single call.
+
+        Cached queries are answered from the cache; the rest are embedded in
+        one batch and scored against the user's vectors together.
+
+        Args:
+            request: Batched search request
+
+        Returns:
+            One search response per query, in request order
+        """
+        start_time = time.perf_counter()
+        requests = request.requests()
+
+        results: List[Optional[List[SearchResult]]] = [None] * len(requests)
+        cache_keys: List[Optional[str]] = [None] * len(requests)
+        if self.cache is not None:
+            for i, single in enumerate(requests):
+                cache_keys[i] = self._request_cache_key(single)
+                results[i] = await self.cache.get(cache_keys[i])
+
+        missing = [i for i, cached in enumerate(results) if cached is None]
+        if missing:
+            search_engine = self._get_search_engine(request.search_type)
+            batch = await search_engine.search_batch(
+                queries=[requests[i].query for i in missing],
+                user_id=request.user_id,
+                limit=request.limit,
+                threshold=request.threshold,
+                filters=self._build_filter(requests[0]),
+                recency_half_life_days=request.recency_half_life_days
+            )
+            for i, query_results in zip(missing, batch):
+                results[i] = query_results
+                if cache_keys[i] is not None:
+                    await self.cache.set(cache_keys[i], query_results, ttl=self.cache_ttl)
+
+        processing_time_ms = (time.perf_counter() - start_time) * 1000
+
+        return BatchSearchResponse(
+            responses=[
+                HybridSearchResponse(
+                    results=query_results,
+                    search_strategy=request.search_type,
+                    processing_time_ms=processing_time_ms,
+                    total_results=len(query_results),
+                    from_cache=i not in missing
+                )
+                for i, query_results in enumerate(results)
+            ],
+            processing_time_ms=processing_time_ms
+        )
+
+    async def _execute(
+        self,
+        request: HybridSearchRequest,
+        query_context: Optional[QueryContext] = None
+    ) -> List[SearchResult]:
+        """Run a request against its search engine."""
         # Select search strategy
         search_engine = self._get_search_engine(request.search_type)
 
-        # Perform search
-        results = await search_engine.search(
+        # Perform search with filters pushed down into the engine
+        return await search_engine.search(
             query=request.query,
             user_id=request.user_id,
             limit=request.limit,
-            threshold=request.threshold
+            threshold=request.threshold,
+            filters=self._build_filter(request),
+            recency_half_life_days=request.recency_half_life_days,
+            query_context=query_context
         )
 
-        # Filter by content types if specified
-        if request.content_types:
-            results = [
-                r for r in results
-                if r.content_type in request.content_types
-            ]
+    async def _embed_query(
+        self,
+        query: str,
+        query_context: Optional[QueryContext] = None
+    ) -> QueryContext:
+        """
+        Get a query context carrying the query embedding.
 
-        # Calculate processing time
-        processing_time_ms = (time.time() - start_time) * 1000
+        Args:
+            query: Query text
+            query_context: Existing context, reused if it has an embedding
 
-        return HybridSearchResponse(
-            results=results,
-            search_strategy=request.search_type,
-            processing_time_ms=processing_time_ms,
-            total_results=len(results)
+        Returns:
+            Query context with an embedding
+        """
+        if query_context is not None and query_context.embedding is not None:
+            return query_context
+        embedding, model_used = await self.embedding_service.generate_with_fallback(query)
+        if query_context is None:
+            return build_query_context(query, embedding, model_used)
+        return replace(query_context, embedding=embedding, model_name=model_used)
+
+    async def _semantic_cache_lookup(
+        self,
+        request: HybridSearchRequest,
+        query_context: QueryContext
+    ) -> Optional[List[SearchResult]]:
+        """
+        Reuse the results of a recent near-identical query.
+
+        A sampled fraction of hits is re-run to audit false hits.
+
+        Args:
+            request: Search request
+            query_context: Query context carrying the query embedding
+
+        Returns:
+            Cached results or None
+        """
+        results = self.semantic_cache.lookup(
+            request.user_id,
+            self.versions.get(request.user_id),
+            self._request_signature(request),
+            request.query,
+            query_context.embedding,
+            model_name=query_context.model_name
         )
+        if results is None:
+            return None
+
+        if self.semantic_cache_audit_rate and random.random() < self.semantic_cache_audit_rate:
+            entry = self.semantic_cache.audit_log[-1]
+            fresh = await self._execute(request, query_context)
+            cached_keys = {result_key(r) for r in results}
+            fresh_keys = {result_key(r) for r in fresh}
+            union = cached_keys | fresh_keys
+            agreement = len(cached_keys & fresh_keys) / len(union) if union else 1.0
+            self.semantic_cache.record_audit(entry, agreement)
+
+        return results
 
     async def search_with_cache(
         self,
         query: str,
-        user_id: str
+        user_id: str,
+        limit: int = 10,
+        threshold: float = 0.5
     ) -> List[SearchResult]:
         """
         Search with caching support.
@@ -347,27 +882,167 @@ class SearchService:
         Args:
             query: Search query
             user_id: User identifier
+            limit: Maximum results
+            threshold: Similarity threshold
 
         Returns:
             Search results
         """
-        if self.cache:
-            cache_key = f"{user_id}:{query}"
-            if cache_key in self.cache:
-                return self.cache[cache_key]
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key(
+                "search",
+                user_id,
+                self.versions.get(user_id),
+                query=normalize_query(query),
+                search_type=SearchStrategy.HYBRID.value,
+                limit=limit,
+                threshold=threshold
+            )
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
 
         results = await self.hybrid_search.search(
             query=query,
             user_id=user_id,
-            limit=10,
-            threshold=0.5
+            limit=limit,
+            threshold=threshold
         )
 
-        if self.cache:
-            self.cache[cache_key] = results
+        if cache_key is not None:
+            await self.cache.set(cache_key, results, ttl=self.cache_ttl)
 
         return results
 
+    async def index_record(self, embedding: Embedding) -> str:
+        """
+        Index a new record and invalidate the owner's cached results.
+
+        Args:
+            embedding: Record to index
+
+        Returns:
+            Stored record ID
+        """
+        record_id = await self.index.store(embedding)
+        self.invalidate_user(embedding.user_id)
+        self._notify_write(embedding.user_id, embedding.content_type)
+        return record_id
+
+    async def update_record(self, embedding: Embedding) -> bool:
+        """
+        Replace an indexed record and invalidate the owner's cached results.
+
+        Args:
+            embedding: Updated record
+
+        Returns:
+            True if updated
+        """
+        updated = await self.index.update(embedding)
+        self.invalidate_user(embedding.user_id)
+        self._notify_write(embedding.user_id, embedding.content_type)
+        return updated
+
+    async def upsert_record(self, embedding: Embedding) -> bool:
+        """
+        Index or replace a record and invalidate the owner's cached results.
+
+        Args:
+            embedding: Record to index
+
+        Returns:
+            True if an existing record was replaced
+        """
+        replaced = await self.index.upsert(embedding)
+        self.invalidate_user(embedding.user_id)
+        self._notify_write(embedding.user_id, embedding.content_type)
+        return replaced
+
+    async def delete_record(self, embedding_id: str, user_id: str) -> bool:
+        """
+        Remove an indexed record and invalidate the owner's cached results.
+
+        Args:
+            embedding_id: Record identifier
+            user_id: Owner of the record
+
+        Returns:
+            True if deleted
+        """
+        deleted = await self.index.delete(embedding_id)
+        self.invalidate_user(user_id)
+        self._notify_write(user_id, None)
+        return deleted
+
+    def invalidate_user(self, user_id: str) -> int:
+        """
+        Invalidate every cached result of a user in O(1).
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            New data version of the user
+        """
+        if self.semantic_cache is not None:
+            self.semantic_cache.invalidate_user(user_id)
+        return self.versions.bump(user_id)
+
+    def _notify_write(self, user_id: str, content_type: Optional[ContentType]) -> None:
+        """Tell write listeners a user's data changed."""
+        for listener in self.write_listeners:
+            listener(user_id, content_type)
+
+    def _request_params(self, request: HybridSearchRequest) -> Dict[str, Any]:
+        """Get the normalized request parameters other than query and user."""
+        params = request.model_dump(mode="json", exclude={"query", "user_id", "cursor", "paginate"})
+        if params.get("content_types"):
+            params["content_types"] = sorted(params["content_types"])
+        return params
+
+    def _request_cache_key(self, request: HybridSearchRequest) -> str:
+        """Build the cache key of a normalized search request."""
+        return make_cache_key(
+            "search",
+            request.user_id,
+            self.versions.get(request.user_id),
+            query=normalize_query(request.query),
+            paginate=request.paginate,
+            **self._request_params(request)
+        )
+
+    def _window_key(self, request: HybridSearchRequest, version: int) -> str:
+        """Build the cache key of a request's ranked pagination window."""
+        params = self._request_params(request)
+        params.pop("limit")
+        return make_cache_key(
+            "window",
+            request.user_id,
+            version,
+            query=normalize_query(request.query),
+            **params
+        )
+
+    def _page_hash(self, request: HybridSearchRequest) -> str:
+        """Hash the request a cursor belongs to; page size may change between pages."""
+        return self._window_key(request, 0).rsplit(":", 1)[1]
+
+    def _request_signature(self, request: HybridSearchRequest) -> str:
+        """Hash the request parameters that semantic cache hits must share."""
+        return make_cache_key("signature", "", 0, paginate=request.paginate, **self._request_params(request))
+
+    def _build_filter(self, request: HybridSearchRequest) -> Optional[SearchFilter]:
+        """Merge the request's content types into its structured filter."""
+        if not request.content_types:
+            return request.filters
+        filters = request.filters or SearchFilter()
+        content_types = request.content_types
+        if filters.content_types is not None:
+            content_types = [t for t in content_types if t in filters.content_types]
+        return filters.model_copy(update={"content_types": content_types})
+
     def _get_search_engine(self, strategy: SearchStrategy) -> SearchEngine:
         """Get search engine based on strategy."""
         if strategy == SearchStrategy.SEMANTIC:
@@ -379,5 +1054,5 @@ class SearchService:
 
     async def cleanup(self):
         """Cleanup resources."""
-        if self.cache:
-            self.cache.clear()
\ No newline at end of file
+        if self.cache is not None:
+            await self.cache.clear()
@@ -0,0 +1,581 @@
+"""
+Sharding module for RAG service.
+Assigns each user's index to one owning process and routes calls to it
+over local Unix sockets, so memory scales with data size, not workers.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import struct
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .interfaces import (
+    VectorStore,
+    Embedding,
+    SearchFilter,
+    SearchResult,
+)
+from .indexes import InMemorySearchIndex, decode_record, encode_record
+from .snapshot import IndexPersistence
+
+
+_HEADER = struct.Struct(">I")
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to nodes."""
+
+    def __init__(self, nodes: Optional[Iterable[str]] = None, replicas: int = 64):
+        """
+        Initialize hash ring.
+
+        Args:
+            nodes: Initial node names
+            replicas: Virtual points per node (more gives a smoother spread)
+        """
+        if replicas <= 0:
+            raise ValueError("replicas must be positive")
+        self.replicas = replicas
+        self._points: List[Tuple[int, str]] = []
+        for node in nodes or []:
+            self.add_node(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        """Names of the nodes on the ring."""
+        return sorted({node for _, node in self._points})
+
+    def add_node(self, node: str) -> None:
+        """
+        Add a node; only keys now hashing to its points move to it.
+
+        Args:
+            node: Node name
+        """
+        if node in self.nodes:
+            raise ValueError(f"Node {node} is already on the ring")
+        for replica in range(self.replicas):
+            bisect.insort(self._points, (_hash(f"{node}#{replica}"), node))
+
+    def remove_node(self, node: str) -> None:
+        """
+        Remove a node; its keys move to the next nodes on the ring.
+
+        Args:
+            node: Node name
+        """
+        self._points = [point for point in self._points if point[1] != node]
+
+    def node_for(self, key: str) -> str:
+        """
+        Get the node owning a key.
+
+        Args:
+            key: Key to place, e.g. a user ID
+
+        Returns:
+            Node name
+        """
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        position = bisect.bisect_right(self._points, (_hash(key), ""))
+        return self._points[position % len(self._points)][1]
+
+
+def _hash(key: str) -> int:
+    """Stable 64-bit hash of a string."""
+    return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+
+async def _send(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+    """Write one length-prefixed JSON message."""
+    body = json.dumps(message).encode()
+    writer.write(_HEADER.pack(len(body)) + body)
+    await writer.drain()
+
+
+async def _receive(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Read one length-prefixed JSON message, or None at end of stream."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = _HEADER.unpack(header)
+    return json.loads(await reader.readexactly(length))
+
+
+def _filters(params: Dict[str, Any]) -> Optional[SearchFilter]:
+    """Parse the optional filter of a request."""
+    filters = params.get("filters")
+    return SearchFilter.model_validate(filters) if filters is not None else None
+
+
+def _results(results: List[SearchResult]) -> List[Dict[str, Any]]:
+    """Serialize search results."""
+    return [result.model_dump(mode="json") for result in results]
+
+
+class ShardServer:
+    """Serve the user indexes owned by this process over a Unix socket."""
+
+    def __init__(self, path: str, index: Optional[InMemorySearchIndex] = None):
+        """
+        Initialize shard server.
+
+        Args:
+            path: Unix socket path
+            index: Index holding this shard's users
+        """
+        self.path = path
+        self.index = index or InMemorySearchIndex()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Start listening."""
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def serve_forever(self) -> None:
+        """Serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop listening."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer requests on one connection until the client disconnects."""
+        try:
+            while True:
+                message = await _receive(reader)
+                if message is None:
+                    break
+                try:
+                    result = await self.dispatch(message["method"], message.get("params", {}))
+                    await _send(writer, {"result": result})
+                except Exception as e:
+                    await _send(writer, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, params: Dict[str, Any]) -> Any:
+        """
+        Run one shard call against the local index.
+
+        Args:
+            method: Call name
+            params: Call parameters
+
+        Returns:
+            JSON-safe result
+        """
+        index = self.index
+        if method == "store":
+            return await index.store(decode_record(params["record"]))
+        if method == "update":
+            return await index.update(decode_record(params["record"]))
+        if method == "upsert":
+            return await index.upsert(decode_record(params["record"]))
+        if method == "delete":
+            return await index.delete(params["embedding_id"])
+        if method == "search_similar":
+            return _results(await index.search_similar(
+                params["query_vector"], params["user_id"], params["limit"],
+                params["threshold"], _filters(params), params.get("recency_half_life_days")
+            ))
+        if method == "search_similar_batch":
+            batch = await index.search_similar_batch(
+                params["query_vectors"], params["user_id"], params["limit"],
+                params["threshold"], _filters(params), params.get("recency_half_life_days")
+            )
+            return [_results(results) for results in batch]
+        if method == "full_text_search":
+            return _results(await index.full_text_search(
+                params["query"], params["user_id"], params["limit"], _filters(params),
+                params.get("recency_half_life_days"), terms=params.get("terms")
+            ))
+        if method == "users":
+            return list(index.users)
+        if method == "export_user":
+            return [encode_record(r) for r in index.export_user(params["user_id"])]
+        if method == "import_records":
+            imported = 0
+            for data in params["records"]:
+                # Writes routed here during a move are newer than the export
+                if data["id"] not in index.owners:
+                    await index.store(decode_record(data))
+                    imported += 1
+            return imported
+        if method == "drop_user":
+            return index.drop_user(params["user_id"])
+        raise ValueError(f"Unknown shard method: {method}")
+
+
+class ShardClient:
+    """Pool of connections to one shard server."""
+
+    def __init__(self, path: str, pool_size: int = 4):
+        """
+        Initialize shard client.
+
+        Args:
+            path: Unix socket path of the shard server
+            pool_size: Most calls in flight to the shard at once
+        """
+        if pool_size <= 0:
+            raise ValueError("pool_size must be positive")
+        self.path = path
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def call(self, method: str, **params: Any) -> Any:
+        """
+        Call a method on the shard.
+
+        A connection only goes back to the pool once its response has
+        been read, so a call cancelled mid-flight can never leave a
+        response behind for the next caller.
+
+        Args:
+            method: Call name
+            **params: JSON-safe parameters
+
+        Returns:
+            Call result
+
+        Raises:
+            RuntimeError: If the shard reports an error or disconnects
+        """
+        async with self._slots:
+            if self._idle:
+                reader, writer = self._idle.pop()
+            else:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            try:
+                await _send(writer, {"method": method, "params": params})
+                response = await _receive(reader)
+            except BaseException:
+                # Includes cancellation: the response may still arrive on this connection
+                writer.close()
+                raise
+            if response is None:
+                writer.close()
+                raise RuntimeError(f"Shard {self.path} closed the connection")
+            self._idle.append((reader, writer))
+        if "error" in response:
+            raise RuntimeError(f"Shard {self.path} failed: {response['error']}")
+        return response["result"]
+
+    async def close(self) -> None:
+        """Close the idle connections."""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    Vector store and full-text index spread over shard processes.
+
+    Each user lives on exactly one shard, chosen by consistent hashing on
+    the user ID, so every worker can serve any user while each index is
+    held in memory once.
+    """
+
+    def __init__(self, clients: Dict[str, ShardClient], replicas: int = 64):
+        """
+        Initialize sharded store.
+
+        Args:
+            clients: Shard clients keyed by node name
+            replicas: Virtual points per node on the hash ring
+        """
+        self.clients = dict(clients)
+        self.ring = HashRing(self.clients, replicas=replicas)
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str], replicas: int = 64) -> "ShardedVectorStore":
+        """
+        Connect to shard servers by socket path.
+
+        Args:
+            paths: Unix socket paths, also used as node names
+            replicas: Virtual points per node on the hash ring
+
+        Returns:
+            Sharded store
+        """
+        return cls({path: ShardClient(path) for path in paths}, replicas=replicas)
+
+    def owner(self, user_id: str) -> ShardClient:
+        """
+        Get the shard owning a user.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            Shard client
+        """
+        return self.clients[self.ring.node_for(user_id)]
+
+    async def store(self, embedding: Embedding) -> str:
+        """
+        Store embedding on its owner's shard.
+
+        Args:
+            embedding: Embedding to store
+
+        Returns:
+            Stored embedding ID
+        """
+        return await self.owner(embedding.user_id).call("store", record=encode_record(embedding))
+
+    async def search_similar(
+        self,
+        query_vector: List[float],
+        user_id: str,
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None
+    ) -> List[SearchResult]:
+        """
+        Search for similar vectors on the user's shard.
+
+        Args:
+            query_vector: Query embedding
+            user_id: User identifier
+            limit: Maximum results
+            threshold: Similarity threshold
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+
+        Returns:
+            List of similar results
+        """
+        results = await self.owner(user_id).call(
+            "search_similar",
+            query_vector=[float(x) for x in query_vector],
+            user_id=user_id,
+            limit=limit,
+            threshold=threshold,
+            filters=filters.model_dump(mode="json") if filters is not None else None,
+            recency_half_life_days=recency_half_life_days
+        )
+        return [SearchResult.model_validate(r) for r in results]
+
+    async def search_similar_batch(
+        self,
+        query_vectors: List[List[float]],
+        user_id: str,
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Search for vectors similar to each of several queries on the user's shard.
+
+        Args:
+            query_vectors: Query embeddings
+            user_id: User identifier
+            limit: Maximum results per query
+            threshold: Similarity threshold
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+
+        Returns:
+            One result list per query
+        """
+        batch = await self.owner(user_id).call(
+            "search_similar_batch",
+            query_vectors=[[float(x) for x in vector] for vector in query_vectors],
+            user_id=user_id,
+            limit=limit,
+            threshold=threshold,
+            filters=filters.model_dump(mode="json") if filters is not None else None,
+            recency_half_life_days=recency_half_life_days
+        )
+        return [[SearchResult.model_validate(r) for r in results] for results in batch]
+
+    async def full_text_search(
+        self,
+        query: str,
+        user_id: str,
+        limit: int,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        terms: Optional[List[str]] = None
+    ) -> List[SearchResult]:
+        """
+        Full-text search on the user's shard.
+
+        Args:
+            query: Search query
+            user_id: User identifier
+            limit: Maximum results
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+            terms: Pre-tokenized query terms
+
+        Returns:
+            List of matching results
+        """
+        results = await self.owner(user_id).call(
+            "full_text_search",
+            query=query,
+            user_id=user_id,
+            limit=limit,
+            filters=filters.model_dump(mode="json") if filters is not None else None,
+            recency_half_life_days=recency_half_life_days,
+            terms=terms
+        )
+        return [SearchResult.model_validate(r) for r in results]
+
+    async def delete(self, embedding_id: str) -> bool:
+        """
+        Delete embedding from whichever shard holds it.
+
+        The record ID alone does not name its owner, so every shard is asked.
+
+        Args:
+            embedding_id: ID of embedding to delete
+
+        Returns:
+            True if deleted, False otherwise
+        """
+        deleted = await asyncio.gather(*(
+            client.call("delete", embedding_id=embedding_id)
+            for client in self.clients.values()
+        ))
+        return any(deleted)
+
+    async def update(self, embedding: Embedding) -> bool:
+        """
+        Update existing embedding on its owner's shard.
+
+        Args:
+            embedding: Updated embedding data
+
+        Returns:
+            True if updated, False otherwise
+        """
+        return await self.owner(embedding.user_id).call("update", record=encode_record(embedding))
+
+    async def upsert(self, embedding: Embedding) -> bool:
+        """
+        Store or replace an embedding on its owner's shard.
+
+        Args:
+            embedding: Embedding to store
+
+        Returns:
+            True if an existing record was replaced
+        """
+        return await self.owner(embedding.user_id).call("upsert", record=encode_record(embedding))
+
+    async def rebalance(self) -> int:
+        """
+        Move every user that is not on its owning shard.
+
+        The ring is fixed per worker, so changing the shard list takes a
+        restart of every worker with the new `RAG_SHARD_SOCKETS`, then one
+        run of this (`python -m rag_service.sharding --rebalance PATHS`).
+        Writes go to the new owners once workers restart; a user's searches
+        may miss records until that user's move completes.
+
+        Returns:
+            Number of users moved
+        """
+        moved = 0
+        for node, client in list(self.clients.items()):
+            for user_id in await client.call("users"):
+                owner = self.ring.node_for(user_id)
+                if owner == node:
+                    continue
+                records = await client.call("export_user", user_id=user_id)
+                await self.clients[owner].call("import_records", records=records)
+                await client.call("drop_user", user_id=user_id)
+                moved += 1
+        return moved
+
+    async def close(self) -> None:
+        """Close every shard connection."""
+        for client in self.clients.values():
+            await client.close()
+
+
+async def run_shard_server(
+    path: str,
+    data_dir: Optional[str] = None,
+    checkpoint_interval: float = 300.0
+) -> None:
+    """
+    Run a shard server until cancelled.
+
+    With a data directory the shard restores its index from the latest
+    snapshot plus write-ahead log, and snapshots it periodically.
+
+    Args:
+        path: Unix socket path
+        data_dir: Directory for snapshots and the write-ahead log
+        checkpoint_interval: Seconds between snapshots
+    """
+    persistence = None
+    index = None
+    if data_dir:
+        persistence = IndexPersistence(data_dir)
+        index = persistence.restore()
+
+    server = ShardServer(path, index)
+    await server.start()
+    print(f"Shard server listening on {path}")
+
+    checkpoints = None
+    if persistence is not None:
+        checkpoints = asyncio.create_task(
+            persistence.run_checkpoints(lambda: server.index, checkpoint_interval)
+        )
+    try:
+        await server.serve_forever()
+    finally:
+        if persistence is not None:
+            checkpoints.cancel()
+            await persistence.checkpoint_async(server.index)
+            persistence.close()
+
+
+async def rebalance_shards(paths: List[str]) -> int:
+    """
+    Move users onto their owners under a new shard list.
+
+    Args:
+        paths: Unix socket paths of every shard, as in `RAG_SHARD_SOCKETS`
+
+    Returns:
+        Number of users moved
+    """
+    store = ShardedVectorStore.from_paths(paths)
+    try:
+        return await store.rebalance()
+    finally:
+        await store.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "--rebalance":
+        print(f"Moved {asyncio.run(rebalance_shards(sys.argv[2].split(',')))} users")
+    else:
+        asyncio.run(run_shard_server(*sys.argv[1:3]))
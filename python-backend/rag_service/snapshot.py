@@ -0,0 +1,1001 @@
+"""
+Snapshot persistence module for RAG service.
+Writes versioned, checksummed index snapshots plus a write-ahead log, so a
+restart memory-maps the last snapshot and only replays recent writes.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+from .interfaces import ContentType, SearchResult
+from .indexes import (
+    InMemorySearchIndex,
+    KeywordSubIndex,
+    Segment,
+    UserIndex,
+    VectorSubIndex,
+    compact_rows,
+    decode_record,
+)
+
+
+FORMAT_VERSION = 2
+
+# Format 1 stored payloads and postings as JSON; it is still readable
+_READABLE_FORMATS = (1, FORMAT_VERSION)
+
+_MANIFEST = "manifest.json"
+_LOCK = "LOCK"
+
+
+class MappedPayloads:
+    """
+    Row payloads decoded on demand from a memory-mapped snapshot.
+
+    Each row is one JSON document in a byte array, so loading a snapshot
+    maps the file instead of parsing it and a row is only decoded the
+    first time it is read. Rows appended after loading are kept as objects.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, ids: List[str]):
+        """
+        Initialize mapped payloads.
+
+        Args:
+            data: Concatenated JSON documents (uint8, may be memory-mapped)
+            offsets: Start of every row in `data`, plus the end of the last
+            ids: Record id of every mapped row
+        """
+        self.data = data
+        self.offsets = offsets
+        self.ids = ids
+        self.mapped = len(offsets) - 1
+        self._decoded: Dict[int, SearchResult] = {}
+        self._appended: List[SearchResult] = []
+
+    def __len__(self) -> int:
+        return self.mapped + len(self._appended)
+
+    def __getitem__(self, row: int) -> SearchResult:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if row >= self.mapped:
+            return self._appended[row - self.mapped]
+        payload = self._decoded.get(row)
+        if payload is None:
+            payload = SearchResult.model_validate_json(self.encoded(row))
+            self._decoded[row] = payload
+        return payload
+
+    def __iter__(self) -> Iterator[SearchResult]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def encoded(self, row: int) -> bytes:
+        """Get the stored JSON of a mapped row without decoding it."""
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes()
+
+    def record_ids(self) -> List[str]:
+        """Record id of every row, without decoding mapped rows."""
+        return self.ids + [payload.id for payload in self._appended]
+
+    def resident(self) -> List[SearchResult]:
+        """Payloads held as objects: decoded and appended rows."""
+        return list(self._decoded.values()) + self._appended
+
+    def append(self, payload: SearchResult) -> None:
+        """Add a row after the mapped ones."""
+        self._appended.append(payload)
+
+    def copy(self) -> "MappedPayloads":
+        """Copy sharing the mapped rows and the decoded ones."""
+        copied = MappedPayloads(self.data, self.offsets, self.ids)
+        copied._decoded = self._decoded
+        copied._appended = list(self._appended)
+        return copied
+
+
+class MappedPostings(Mapping):
+    """
+    BM25 postings read on demand from memory-mapped snapshot arrays.
+
+    The rows and counts of every term are stored back to back (CSR
+    layout); a term's posting dict is only built the first time the term
+    is looked up, and is kept so later writes can add to it.
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        counts: np.ndarray
+    ):
+        """
+        Initialize mapped postings.
+
+        Args:
+            terms: Terms in storage order
+            offsets: Start of every term's postings, plus the end of the last
+            rows: Posting rows (may be memory-mapped)
+            counts: Term frequency of every posting (may be memory-mapped)
+        """
+        self.offsets = offsets
+        self.rows = rows
+        self.counts = counts
+        self._positions = {term: position for position, term in enumerate(terms)}
+        self._loaded: Dict[str, Dict[int, int]] = {}
+
+    def __getitem__(self, term: str) -> Dict[int, int]:
+        postings = self._loaded.get(term)
+        if postings is None:
+            start, end = self._bounds(term)
+            postings = dict(zip(self.rows[start:end].tolist(), self.counts[start:end].tolist()))
+            self._loaded[term] = postings
+        return postings
+
+    def __iter__(self) -> Iterator[str]:
+        # Listed up front: compaction iterates from a worker thread while writes add terms
+        added = [term for term in list(self._loaded) if term not in self._positions]
+        return iter(list(self._positions) + added)
+
+    def __len__(self) -> int:
+        return len(self._positions) + sum(1 for term in list(self._loaded) if term not in self._positions)
+
+    def __contains__(self, term: object) -> bool:
+        return term in self._loaded or term in self._positions
+
+    def _bounds(self, term: str) -> Tuple[int, int]:
+        """Get the slice of a mapped term's postings."""
+        position = self._positions[term]
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    def arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get a term's posting rows and counts without building its dict.
+
+        Args:
+            term: Indexed term
+
+        Returns:
+            Tuple of (rows, counts)
+        """
+        postings = self._loaded.get(term)
+        if postings is not None:
+            return _posting_arrays(postings)
+        start, end = self._bounds(term)
+        return self.rows[start:end], self.counts[start:end]
+
+    def resident(self) -> List[Dict[int, int]]:
+        """Posting dicts built so far."""
+        return list(self._loaded.values())
+
+    def setdefault(self, term: str, default: Dict[int, int]) -> Dict[int, int]:
+        """Get a term's postings, adding `default` for a new term."""
+        if term in self:
+            return self[term]
+        self._loaded[term] = default
+        return default
+
+
+@dataclass
+class FrozenRows:
+    """One sub-index pair as of a checkpoint."""
+    content_type: ContentType
+    vectors: VectorSubIndex
+    keywords: KeywordSubIndex
+    # Rows past `upto` were appended later; rows before it never change
+    upto: int
+    deleted: np.ndarray
+
+
+@dataclass
+class FrozenUser:
+    """One user's index as of a checkpoint."""
+    user_id: str
+    dimension: Optional[int]
+    k1: float
+    b: float
+    segments: List[Tuple[str, bool, List[FrozenRows]]]
+
+
+def freeze_user(user_id: str, user_index: UserIndex) -> FrozenUser:
+    """
+    Capture a user's index for writing while it keeps taking writes.
+
+    Only row counts and tombstone bitmaps are copied, so this is cheap
+    enough for the event loop; the rows themselves are append-only.
+
+    Args:
+        user_id: User identifier
+        user_index: Index to capture
+
+    Returns:
+        Frozen view of the index
+    """
+    segments = []
+    for key, segment in sorted(user_index.segments.items()):
+        rows = [
+            FrozenRows(
+                content_type,
+                vectors,
+                segment.keywords[content_type],
+                len(vectors),
+                np.array(vectors.deleted[:len(vectors)])
+            )
+            for content_type, vectors in segment.vectors.items()
+        ]
+        segments.append((key, segment.cold, rows))
+    return FrozenUser(user_id, user_index.dimension, user_index.k1, user_index.b, segments)
+
+
+def freeze_index(index: InMemorySearchIndex) -> List[FrozenUser]:
+    """
+    Capture every user of an index (see `freeze_user`).
+
+    Args:
+        index: Index to capture
+
+    Returns:
+        Frozen users ordered by user ID
+    """
+    return [freeze_user(user_id, user_index) for user_id, user_index in sorted(index.users.items())]
+
+
+class WriteAheadLog:
+    """Append-only JSON-lines log of index writes."""
+
+    def __init__(self, path: str, fsync: bool = False):
+        """
+        Open (or create) a write-ahead log.
+
+        Args:
+            path: Log file path
+            fsync: Force every entry to disk before returning
+        """
+        self.path = path
+        self.fsync = fsync
+        self.sequence = 0
+        self._repair()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _repair(self) -> None:
+        """Cut off a torn final entry so new entries follow the last intact one."""
+        if not os.path.exists(self.path):
+            return
+        intact = 0
+        with open(self.path, "rb") as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                intact += len(line)
+                self.sequence = entry["seq"]
+        if intact < os.path.getsize(self.path):
+            os.truncate(self.path, intact)
+
+    def append(self, op: str, **data: Any) -> int:
+        """
+        Record one write.
+
+        Args:
+            op: Operation name (store, update, delete, drop_user)
+            **data: JSON-safe operation arguments
+
+        Returns:
+            Sequence number of the entry
+        """
+        self.sequence += 1
+        self._file.write(json.dumps({"seq": self.sequence, "op": op, **data}) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        return self.sequence
+
+    def replay(self, after: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Read logged writes in order.
+
+        A torn final line left by a crash ends the replay.
+
+        Args:
+            after: Skip entries up to and including this sequence number
+
+        Yields:
+            Log entries
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry["seq"] > after:
+                    yield entry
+
+    def truncate(self, upto: int) -> None:
+        """
+        Drop entries already covered by a snapshot.
+
+        Args:
+            upto: Highest sequence number that may be dropped
+        """
+        end = self._size()
+        self._swap(self._copy_tail(upto, end), end)
+
+    async def truncate_async(self, upto: int) -> None:
+        """
+        Drop entries already covered by a snapshot, copying the kept
+        entries in a worker thread while new entries are appended.
+
+        Args:
+            upto: Highest sequence number that may be dropped
+        """
+        end = self._size()
+        temporary = await asyncio.to_thread(self._copy_tail, upto, end)
+        self._swap(temporary, end)
+
+    def _size(self) -> int:
+        """Bytes written so far, all of them whole entries."""
+        self._file.flush()
+        return os.path.getsize(self.path)
+
+    def _copy_tail(self, upto: int, end: int) -> str:
+        """Copy the entries after `upto` among the first `end` bytes to a new file."""
+        temporary = self.path + ".tmp"
+        with open(self.path, "rb") as log, open(temporary, "wb") as kept:
+            for line in log:
+                if end <= 0:
+                    break
+                end -= len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry["seq"] > upto:
+                    kept.write(line)
+        return temporary
+
+    def _swap(self, temporary: str, end: int) -> None:
+        """Replace the log with a copied tail plus entries written after `end`."""
+        self._file.flush()
+        with open(self.path, "rb") as log:
+            log.seek(end)
+            newer = log.read()
+        with open(temporary, "ab") as kept:
+            kept.write(newer)
+            kept.flush()
+            os.fsync(kept.fileno())
+        self._file.close()
+        os.replace(temporary, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        """Close the log file."""
+        self._file.close()
+
+
+def apply_entry(index: InMemorySearchIndex, entry: Dict[str, Any]) -> None:
+    """
+    Re-apply one logged write to an index.
+
+    Args:
+        index: Index being recovered
+        entry: Write-ahead log entry
+    """
+    op = entry["op"]
+    if op == "store":
+        index.apply_store(decode_record(entry["record"]))
+    elif op == "update":
+        index.apply_update(decode_record(entry["record"]))
+    elif op == "upsert":
+        index.apply_upsert(decode_record(entry["record"]))
+    elif op == "delete":
+        index.apply_delete(entry["embedding_id"])
+    elif op == "drop_user":
+        index.apply_drop_user(entry["user_id"])
+    else:
+        raise ValueError(f"Unknown log operation: {op}")
+
+
+class SnapshotStore:
+    """
+    Versioned index snapshots in one directory.
+
+    Each snapshot is a directory of .npy arrays (vectors, payload JSON
+    bytes, CSR postings) that are memory-mapped on load, and a manifest
+    listing every file with its size and SHA-256 checksum. Loads always
+    compare sizes, which catches truncated files; reading every byte to
+    compare checksums is opt-in.
+    """
+
+    def __init__(self, directory: str, keep: int = 2, verify: bool = False):
+        """
+        Initialize snapshot store.
+
+        Args:
+            directory: Directory holding the snapshots
+            keep: Number of snapshots retained
+            verify: Also check file checksums when loading
+        """
+        if keep <= 0:
+            raise ValueError("keep must be positive")
+        self.directory = directory
+        self.keep = keep
+        self.verify = verify
+        os.makedirs(directory, exist_ok=True)
+
+    def versions(self) -> List[int]:
+        """Snapshot versions on disk, newest first."""
+        return sorted(
+            (int(name) for name in os.listdir(self.directory) if name.isdigit()),
+            reverse=True
+        )
+
+    def save(self, index: InMemorySearchIndex, wal_sequence: int = 0) -> str:
+        """
+        Write a snapshot of an index.
+
+        The snapshot is built in a temporary directory and renamed into
+        place, so a crash never leaves a partial snapshot behind.
+
+        Args:
+            index: Index to snapshot
+            wal_sequence: Last write-ahead log entry reflected in the index
+
+        Returns:
+            Path of the new snapshot
+        """
+        return self.write(freeze_index(index), wal_sequence)
+
+    def write(self, users: List[FrozenUser], wal_sequence: int = 0) -> str:
+        """
+        Write a snapshot of frozen users.
+
+        Safe to run in a worker thread while the index keeps taking writes.
+
+        Args:
+            users: Output of `freeze_index`
+            wal_sequence: Last write-ahead log entry reflected in the users
+
+        Returns:
+            Path of the new snapshot
+        """
+        versions = self.versions()
+        version = versions[0] + 1 if versions else 1
+        name = f"{version:08d}"
+        temporary = os.path.join(self.directory, f".{name}.tmp")
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+
+        files: Dict[str, Dict[str, Any]] = {}
+        entries = [
+            _save_user(temporary, f"u{ordinal}", user, files)
+            for ordinal, user in enumerate(users)
+        ]
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "version": version,
+            "wal_sequence": wal_sequence,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "users": entries,
+            "files": files,
+        }
+        with open(os.path.join(temporary, _MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        path = os.path.join(self.directory, name)
+        os.replace(temporary, path)
+        for old in self.versions()[self.keep:]:
+            shutil.rmtree(os.path.join(self.directory, f"{old:08d}"), ignore_errors=True)
+        return path
+
+    def load(self, version: int) -> Tuple[InMemorySearchIndex, Dict[str, Any]]:
+        """
+        Load one snapshot, memory-mapping its arrays.
+
+        Args:
+            version: Snapshot version
+
+        Returns:
+            Tuple of (index, manifest)
+
+        Raises:
+            ValueError: If the snapshot is corrupt or of an unknown format
+        """
+        path = os.path.join(self.directory, f"{version:08d}")
+        with open(os.path.join(path, _MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") not in _READABLE_FORMATS:
+            raise ValueError(f"Unsupported snapshot format: {manifest.get('format')}")
+        _verify_files(path, manifest["files"], self.verify, f"snapshot {version}")
+
+        index = InMemorySearchIndex()
+        for user in manifest["users"]:
+            user_index = _load_user(path, user)
+            index.users[user["user_id"]] = user_index
+            for record_id in user_index.locations:
+                index.owners[record_id] = user["user_id"]
+        return index, manifest
+
+    def load_latest(self) -> Optional[Tuple[InMemorySearchIndex, Dict[str, Any]]]:
+        """
+        Load the newest intact snapshot, falling back to older ones.
+
+        Returns:
+            Tuple of (index, manifest), or None if no snapshot is usable
+        """
+        for version in self.versions():
+            try:
+                return self.load(version)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping snapshot {version}: {e}")
+        return None
+
+
+class IndexPersistence:
+    """
+    Snapshot plus write-ahead log persistence for one index.
+
+    Only one process may own a data directory at a time: two writers
+    would interleave their entries in the same log and overwrite each
+    other's snapshots.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        keep: int = 2,
+        fsync: bool = False,
+        verify: bool = False
+    ):
+        """
+        Initialize index persistence.
+
+        Args:
+            directory: Data directory for snapshots and the log
+            keep: Number of snapshots retained
+            fsync: Force every log entry to disk
+            verify: Also check snapshot checksums when loading
+        """
+        self.directory = directory
+        self.fsync = fsync
+        self.snapshots = SnapshotStore(os.path.join(directory, "snapshots"), keep, verify)
+        self.log_path = os.path.join(directory, "wal.log")
+        self.write_log: Optional[WriteAheadLog] = None
+        self._lock = None
+        self._checkpointing = asyncio.Lock()
+
+    def restore(self) -> InMemorySearchIndex:
+        """
+        Rebuild the index from the latest snapshot and the log.
+
+        Returns:
+            Index with logging enabled for further writes
+
+        Raises:
+            RuntimeError: If another process owns the data directory
+        """
+        self._acquire()
+        loaded = self.snapshots.load_latest()
+        index, sequence = InMemorySearchIndex(), 0
+        if loaded is not None:
+            index, manifest = loaded
+            sequence = manifest["wal_sequence"]
+
+        self.write_log = WriteAheadLog(self.log_path, fsync=self.fsync)
+        for entry in self.write_log.replay(after=sequence):
+            apply_entry(index, entry)
+        index.write_log = self.write_log
+        return index
+
+    def checkpoint(self, index: InMemorySearchIndex) -> str:
+        """
+        Snapshot the index and drop log entries every kept snapshot covers.
+
+        Args:
+            index: Index returned by `restore`
+
+        Returns:
+            Path of the new snapshot
+        """
+        sequence = self.write_log.sequence if self.write_log is not None else 0
+        path = self.snapshots.save(index, sequence)
+        if self.write_log is not None:
+            self.write_log.truncate(upto=self._covered_sequence())
+        return path
+
+    async def checkpoint_async(self, index: InMemorySearchIndex) -> str:
+        """
+        Snapshot the index without blocking the event loop.
+
+        The index is frozen on the loop; files are written, hashed and the
+        log is copied in worker threads. A cancelled caller does not stop a
+        checkpoint midway, and checkpoints never overlap.
+
+        Args:
+            index: Index returned by `restore`
+
+        Returns:
+            Path of the new snapshot
+        """
+        return await asyncio.shield(self._checkpoint_off_loop(index))
+
+    async def _checkpoint_off_loop(self, index: InMemorySearchIndex) -> str:
+        """Run one checkpoint with its file work in worker threads."""
+        async with self._checkpointing:
+            sequence = self.write_log.sequence if self.write_log is not None else 0
+            users = freeze_index(index)
+            path = await asyncio.to_thread(self.snapshots.write, users, sequence)
+            if self.write_log is not None:
+                await self.write_log.truncate_async(upto=self._covered_sequence())
+            return path
+
+    async def run_checkpoints(
+        self,
+        get_index: Callable[[], InMemorySearchIndex],
+        interval: float
+    ) -> None:
+        """
+        Checkpoint periodically until cancelled; failures are logged and retried.
+
+        Args:
+            get_index: Returns the index to snapshot
+            interval: Seconds between checkpoints
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.checkpoint_async(get_index())
+            except Exception as e:
+                print(f"Checkpoint of {self.directory} failed: {e}")
+
+    def _covered_sequence(self) -> int:
+        """Last log entry reflected in every kept snapshot."""
+        oldest = self.snapshots.versions()[-1]
+        with open(os.path.join(self.snapshots.directory, f"{oldest:08d}", _MANIFEST), encoding="utf-8") as f:
+            return json.load(f)["wal_sequence"]
+
+    def close(self) -> None:
+        """Close the log and release the data directory."""
+        if self.write_log is not None:
+            self.write_log.close()
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def _acquire(self) -> None:
+        """Lock the data directory for this process."""
+        if self._lock is not None:
+            return
+        lock = open(os.path.join(self.directory, _LOCK), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            raise RuntimeError(f"Data directory {self.directory} is in use by another process")
+        self._lock = lock
+
+
+def _save_user(
+    root: str,
+    prefix: str,
+    user: FrozenUser,
+    files: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Write one frozen user's sub-indexes and return their manifest entry."""
+    segments = []
+    for key, cold, frozen_rows in user.segments:
+        types = []
+        for frozen in frozen_rows:
+            vectors, keywords, upto = frozen.vectors, frozen.keywords, frozen.upto
+            if frozen.deleted.any():
+                # Snapshots only hold live rows
+                vectors, keywords, _ = compact_rows(vectors, keywords, upto, frozen.deleted)
+                upto = len(vectors)
+                if not upto:
+                    continue
+            ids, id_offsets = _pack([record_id.encode() for record_id in _record_ids(vectors.payloads, upto)])
+            payloads, payload_offsets = _pack(_encode_payloads(vectors.payloads, upto))
+            terms, term_offsets, posting_offsets, posting_rows, posting_counts = _pack_postings(
+                keywords.postings, upto
+            )
+            arrays = {
+                "vectors": np.ascontiguousarray(vectors.matrix[:upto]),
+                "times": np.ascontiguousarray(vectors.times[:upto]),
+                "ids": ids,
+                "id_offsets": id_offsets,
+                "payloads": payloads,
+                "payload_offsets": payload_offsets,
+                "terms": terms,
+                "term_offsets": term_offsets,
+                "posting_offsets": posting_offsets,
+                "posting_rows": posting_rows,
+                "posting_counts": posting_counts,
+                "doc_lengths": np.asarray(keywords.doc_lengths[:upto], dtype=np.int32),
+            }
+            base = f"{prefix}-{key}-{frozen.content_type.value}"
+            entry: Dict[str, Any] = {"content_type": frozen.content_type.value}
+            for name, array in arrays.items():
+                entry[name] = f"{base}.{name}.npy"
+                path = os.path.join(root, entry[name])
+                np.save(path, array)
+                files[entry[name]] = {"size": os.path.getsize(path), "sha256": _checksum(path)}
+            types.append(entry)
+        if types:
+            segments.append({"key": key, "cold": cold, "types": types})
+    return {
+        "user_id": user.user_id,
+        "dimension": user.dimension,
+        "k1": user.k1,
+        "b": user.b,
+        "segments": segments,
+    }
+
+
+def _load_user(root: str, user: Dict[str, Any]) -> UserIndex:
+    """Rebuild one user's index from its manifest entry."""
+    user_index = _load_vectors(root, user)
+    _load_keywords(root, user, user_index)
+    return user_index
+
+
+def _load_vectors(root: str, user: Dict[str, Any]) -> UserIndex:
+    """Rebuild one user's vector sub-indexes, leaving keywords unloaded."""
+    user_index = UserIndex(k1=user["k1"], b=user["b"])
+    user_index.dimension = user["dimension"]
+    for entry in user["segments"]:
+        segment = Segment(entry["key"])
+        segment.cold = entry["cold"]
+        for files in entry["types"]:
+            content_type = ContentType(files["content_type"])
+            if "payload_offsets" in files:
+                ids = _unpack(_map(root, files["ids"]), _map(root, files["id_offsets"]))
+                payloads = MappedPayloads(
+                    _map(root, files["payloads"]), _map(root, files["payload_offsets"]), ids
+                )
+            else:
+                with open(os.path.join(root, files["payloads"]), encoding="utf-8") as f:
+                    payloads = [SearchResult.model_validate(p) for p in json.load(f)]
+                ids = [payload.id for payload in payloads]
+
+            vectors = VectorSubIndex(user_index.dimension)
+            vectors.restore(payloads, _map(root, files["times"]))
+            vectors.matrix = _map(root, files["vectors"])
+            segment.vectors[content_type] = vectors
+            for row, record_id in enumerate(ids):
+                user_index.locations[record_id] = (segment.key, content_type, row)
+        user_index.segments[segment.key] = segment
+    return user_index
+
+
+def _load_keywords(root: str, user: Dict[str, Any], user_index: UserIndex) -> None:
+    """Attach the keyword sub-indexes to an index built by `_load_vectors`."""
+    doc_freq: Dict[str, int] = {}
+    total_length = 0
+    keyword_indexes = []
+    for entry in user["segments"]:
+        segment = user_index.segments[entry["key"]]
+        for files in entry["types"]:
+            content_type = ContentType(files["content_type"])
+            vectors = segment.vectors[content_type]
+            keywords = KeywordSubIndex()
+            keywords.restore(vectors.payloads, vectors.times[:len(vectors)])
+            if "posting_offsets" in files:
+                terms = _unpack(_map(root, files["terms"]), _map(root, files["term_offsets"]))
+                offsets = _map(root, files["posting_offsets"])
+                keywords.postings = MappedPostings(
+                    terms, offsets, _map(root, files["posting_rows"]), _map(root, files["posting_counts"])
+                )
+                keywords.doc_lengths = _map(root, files["doc_lengths"]).tolist()
+                document_counts = zip(terms, np.diff(offsets).tolist())
+            else:
+                with open(os.path.join(root, files["postings"]), encoding="utf-8") as f:
+                    postings = json.load(f)
+                keywords.doc_lengths = postings["doc_lengths"]
+                keywords.postings = {
+                    term: {int(row): count for row, count in rows}
+                    for term, rows in postings["postings"].items()
+                }
+                document_counts = ((term, len(rows)) for term, rows in keywords.postings.items())
+            keyword_indexes.append((segment, content_type, keywords))
+            for term, count in document_counts:
+                doc_freq[term] = doc_freq.get(term, 0) + count
+            total_length += sum(keywords.doc_lengths)
+
+    # Attach everything at once so searches never see a partial keyword index
+    for segment, content_type, keywords in keyword_indexes:
+        segment.keywords[content_type] = keywords
+    user_index.doc_freq = doc_freq
+    user_index.total_length = total_length
+
+
+def save_user_index(directory: str, user_id: str, user_index: UserIndex) -> str:
+    """
+    Write one user's index to its own checksummed directory.
+
+    Args:
+        directory: Parent directory
+        user_id: User identifier
+        user_index: Index to write
+
+    Returns:
+        Path of the user's directory
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, hashlib.sha256(user_id.encode()).hexdigest()[:32])
+    temporary, previous = path + ".tmp", path + ".old"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    files: Dict[str, Dict[str, Any]] = {}
+    user = _save_user(temporary, "u", freeze_user(user_id, user_index), files)
+    with open(os.path.join(temporary, _MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"format": FORMAT_VERSION, "user": user, "files": files}, f)
+
+    # Earlier files may still be memory-mapped, so move them aside instead of overwriting
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, previous)
+    os.replace(temporary, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return path
+
+
+def load_user_vectors(path: str, verify: bool = False) -> Tuple[UserIndex, Dict[str, Any]]:
+    """
+    Load the vector half of a user index written by `save_user_index`.
+
+    Vector search works as soon as this returns; keyword search needs
+    `load_user_keywords` first.
+
+    Args:
+        path: User directory
+        verify: Also check file checksums (sizes are always checked)
+
+    Returns:
+        Tuple of (user index, manifest)
+
+    Raises:
+        ValueError: If the files are corrupt or of an unknown format
+    """
+    with open(os.path.join(path, _MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") not in _READABLE_FORMATS:
+        raise ValueError(f"Unsupported user index format: {manifest.get('format')}")
+    _verify_files(path, manifest["files"], verify, path)
+    return _load_vectors(path, manifest["user"]), manifest
+
+
+def load_user_keywords(path: str, manifest: Dict[str, Any], user_index: UserIndex) -> None:
+    """
+    Load the keyword half of a user index returned by `load_user_vectors`.
+
+    Args:
+        path: User directory
+        manifest: Manifest returned by `load_user_vectors`
+        user_index: Index to complete
+    """
+    _load_keywords(path, manifest["user"], user_index)
+
+
+def _record_ids(payloads: Any, upto: int) -> List[str]:
+    """Record id of the first `upto` rows, without decoding mapped rows."""
+    if isinstance(payloads, MappedPayloads):
+        return payloads.record_ids()[:upto]
+    return [payload.id for payload in payloads[:upto]]
+
+
+def _encode_payloads(payloads: Any, upto: int) -> List[bytes]:
+    """JSON of the first `upto` payloads, copying mapped rows as stored."""
+    if isinstance(payloads, MappedPayloads):
+        return [
+            payloads.encoded(row) if row < payloads.mapped else payloads[row].model_dump_json().encode()
+            for row in range(upto)
+        ]
+    return [payload.model_dump_json().encode() for payload in payloads[:upto]]
+
+
+def _posting_arrays(postings: Dict[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Rows and counts of a posting dict that may be written to concurrently."""
+    items = list(postings.items())
+    return (
+        np.fromiter((row for row, _ in items), dtype=np.int32, count=len(items)),
+        np.fromiter((count for _, count in items), dtype=np.int32, count=len(items))
+    )
+
+
+def _pack_postings(postings: Any, upto: int) -> Tuple[np.ndarray, ...]:
+    """Lay the postings of the first `upto` rows out as (terms, term offsets, posting offsets, rows, counts)."""
+    terms, rows, counts = [], [], []
+    offsets = [0]
+    if isinstance(postings, MappedPostings):
+        entries = ((term, postings.arrays(term)) for term in postings)
+    else:
+        entries = ((term, _posting_arrays(term_rows)) for term, term_rows in list(postings.items()))
+    for term, (term_rows, term_counts) in entries:
+        # Rows appended after the index was frozen are left out
+        kept = term_rows < upto
+        term_rows, term_counts = term_rows[kept], term_counts[kept]
+        if not len(term_rows):
+            continue
+        terms.append(term.encode())
+        rows.append(term_rows)
+        counts.append(term_counts)
+        offsets.append(offsets[-1] + len(term_rows))
+    term_data, term_offsets = _pack(terms)
+    return (
+        term_data,
+        term_offsets,
+        np.asarray(offsets, dtype=np.int64),
+        np.concatenate(rows).astype(np.int32) if rows else np.zeros(0, dtype=np.int32),
+        np.concatenate(counts).astype(np.int32) if counts else np.zeros(0, dtype=np.int32),
+    )
+
+
+def _pack(values: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate byte strings into (uint8 data, int64 offsets)."""
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in values], dtype=np.int64)
+    return np.frombuffer(b"".join(values), dtype=np.uint8), offsets
+
+
+def _unpack(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Split data written by `_pack` back into strings."""
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[start:end].decode() for start, end in zip(bounds, bounds[1:])]
+
+
+def _map(root: str, relative: str) -> np.ndarray:
+    """Memory-map an array inside a snapshot."""
+    return np.load(os.path.join(root, relative), mmap_mode="r")
+
+
+def _verify_files(root: str, files: Dict[str, Any], checksums: bool, label: str) -> None:
+    """
+    Check snapshot files against the manifest.
+
+    Args:
+        root: Snapshot directory
+        files: Manifest file entries
+        checksums: Also compare SHA-256 checksums, reading every file
+        label: Snapshot name used in errors
+
+    Raises:
+        ValueError: If a file has the wrong size or checksum
+    """
+    for relative, expected in files.items():
+        path = os.path.join(root, relative)
+        if isinstance(expected, str):
+            # Format 1 only recorded checksums
+            expected = {"sha256": expected}
+        if "size" in expected and os.path.getsize(path) != expected["size"]:
+            raise ValueError(f"Size mismatch in {label}: {relative}")
+        if checksums and _checksum(path) != expected["sha256"]:
+            raise ValueError(f"Checksum mismatch in {label}: {relative}")
+
+
+def _checksum(path: str) -> str:
+    """SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
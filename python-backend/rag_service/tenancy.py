@@ -0,0 +1,431 @@
+"""
+Tenancy module for RAG service.
+Keeps only recently active users' indexes in memory under a global byte
+budget, evicting cold users and reloading them on their next query.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .interfaces import (
+    VectorStore,
+    Embedding,
+    SearchFilter,
+    SearchResult,
+)
+from .indexes import InMemorySearchIndex, UserIndex
+from .snapshot import (
+    MappedPayloads,
+    MappedPostings,
+    load_user_keywords,
+    load_user_vectors,
+    save_user_index,
+)
+
+
+# Rough per-row and per-posting overheads of the Python objects behind an index
+_PAYLOAD_OVERHEAD = 512
+_POSTING_OVERHEAD = 96
+
+RecordLoader = Callable[[str], Awaitable[List[Embedding]]]
+
+
+def estimate_bytes(user_index: UserIndex) -> int:
+    """
+    Estimate the memory held by one user's index.
+
+    Args:
+        user_index: User index
+
+    Returns:
+        Approximate size in bytes
+    """
+    total = 0
+    for segment in user_index.segments.values():
+        for content_type, vectors in segment.vectors.items():
+            total += vectors.matrix.nbytes + vectors.times.nbytes + vectors.deleted.nbytes
+            payloads = vectors.payloads
+            if isinstance(payloads, MappedPayloads):
+                # Rows still mapped from a snapshot cost their stored bytes until decoded
+                total += payloads.data.nbytes
+                payloads = payloads.resident()
+            total += sum(_PAYLOAD_OVERHEAD + len(p.content) for p in payloads)
+            keywords = segment.keywords.get(content_type)
+            if keywords is not None:
+                postings = keywords.postings
+                if isinstance(postings, MappedPostings):
+                    total += postings.rows.nbytes + postings.counts.nbytes
+                    postings = postings.resident()
+                else:
+                    postings = postings.values()
+                total += _POSTING_OVERHEAD * sum(len(rows) for rows in postings)
+    return total + _POSTING_OVERHEAD * (len(user_index.locations) + len(user_index.doc_freq))
+
+
+class TenantIndexManager(VectorStore):
+    """
+    Memory-budgeted set of resident user indexes.
+
+    Users are kept in LRU order of access. When the resident indexes grow
+    past the budget, the least recently used users are evicted, either to
+    per-user files or dropped and rebuilt by a loader, and reloaded on
+    their next call: vectors first, the keyword index in the background.
+    Evictions bypass the index's write-ahead log, so use this instead of
+    snapshot persistence rather than alongside it.
+    """
+
+    def __init__(
+        self,
+        index: Optional[InMemorySearchIndex] = None,
+        memory_budget_bytes: int = 256 * 1024 * 1024,
+        directory: Optional[str] = None,
+        loader: Optional[RecordLoader] = None,
+        rate_window: float = 60.0
+    ):
+        """
+        Initialize tenant index manager.
+
+        Args:
+            index: Index holding the resident users
+            memory_budget_bytes: Budget for all resident user indexes
+            directory: Directory evicted users are written to
+            loader: Rebuilds an evicted user's records when there is no directory
+            rate_window: Seconds over which eviction rates are measured
+        """
+        if directory is None and loader is None:
+            raise ValueError("Evicted users need a directory or a loader")
+        self.index = index or InMemorySearchIndex()
+        self.memory_budget_bytes = memory_budget_bytes
+        self.directory = directory
+        self.loader = loader
+        self.rate_window = rate_window
+
+        self._resident: "OrderedDict[str, int]" = OrderedDict(
+            (user_id, estimate_bytes(user_index))
+            for user_id, user_index in self.index.users.items()
+        )
+        # Evicted user -> file path (None when dropped)
+        self._evicted: Dict[str, Optional[str]] = {}
+        # Record -> owner for evicted users, so deletes by ID still find them
+        self._cold_owners: Dict[str, str] = {}
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._keyword_loads: Dict[str, asyncio.Task] = {}
+        self._eviction_times: Deque[float] = deque()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    @property
+    def resident_bytes(self) -> int:
+        """Estimated size of all resident user indexes."""
+        return sum(self._resident.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Get residency, memory and eviction counters."""
+        lookups = self.hits + self.misses
+        self._trim_eviction_times()
+        return {
+            "resident_users": len(self._resident),
+            "evicted_users": len(self._evicted),
+            "resident_bytes": self.resident_bytes,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+            "evictions_per_minute": len(self._eviction_times) * 60.0 / self.rate_window,
+        }
+
+    async def store(self, embedding: Embedding) -> str:
+        """
+        Store embedding in its owner's index.
+
+        Args:
+            embedding: Embedding to store
+
+        Returns:
+            Stored embedding ID
+        """
+        await self._acquire(embedding.user_id, keywords=True)
+        record_id = await self.index.store(embedding)
+        await self._account(embedding.user_id)
+        return record_id
+
+    async def upsert(self, embedding: Embedding) -> bool:
+        """
+        Store an embedding, replacing any record with the same ID.
+
+        Args:
+            embedding: Embedding to store
+
+        Returns:
+            True if an existing record was replaced
+        """
+        await self._acquire(embedding.user_id, keywords=True)
+        replaced = await self.index.upsert(embedding)
+        await self._account(embedding.user_id)
+        return replaced
+
+    async def search_similar(
+        self,
+        query_vector: List[float],
+        user_id: str,
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None
+    ) -> List[SearchResult]:
+        """
+        Search for similar vectors.
+
+        Args:
+            query_vector: Query embedding
+            user_id: User identifier
+            limit: Maximum results
+            threshold: Similarity threshold
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+
+        Returns:
+            List of similar results
+        """
+        await self._acquire(user_id)
+        return await self.index.search_similar(
+            query_vector, user_id, limit, threshold, filters, recency_half_life_days
+        )
+
+    async def search_similar_batch(
+        self,
+        query_vectors: List[List[float]],
+        user_id: str,
+        limit: int,
+        threshold: float,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Search for vectors similar to each of several queries.
+
+        Args:
+            query_vectors: Query embeddings
+            user_id: User identifier
+            limit: Maximum results per query
+            threshold: Similarity threshold
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+
+        Returns:
+            One result list per query
+        """
+        await self._acquire(user_id)
+        return await self.index.search_similar_batch(
+            query_vectors, user_id, limit, threshold, filters, recency_half_life_days
+        )
+
+    async def full_text_search(
+        self,
+        query: str,
+        user_id: str,
+        limit: int,
+        filters: Optional[SearchFilter] = None,
+        recency_half_life_days: Optional[float] = None,
+        terms: Optional[List[str]] = None
+    ) -> List[SearchResult]:
+        """
+        Full-text search.
+
+        Args:
+            query: Search query
+            user_id: User identifier
+            limit: Maximum results
+            filters: Filter applied before ranking
+            recency_half_life_days: Half-life of the recency decay term
+            terms: Pre-tokenized query terms
+
+        Returns:
+            List of matching results
+        """
+        await self._acquire(user_id, keywords=True)
+        return await self.index.full_text_search(
+            query, user_id, limit, filters, recency_half_life_days, terms=terms
+        )
+
+    async def delete(self, embedding_id: str) -> bool:
+        """
+        Delete embedding, reloading its owner first if evicted.
+
+        Args:
+            embedding_id: ID of embedding to delete
+
+        Returns:
+            True if deleted, False otherwise
+        """
+        user_id = self.index.owners.get(embedding_id) or self._cold_owners.get(embedding_id)
+        if user_id is None:
+            return False
+        await self._acquire(user_id, keywords=True)
+        deleted = await self.index.delete(embedding_id)
+        await self._account(user_id)
+        return deleted
+
+    async def update(self, embedding: Embedding) -> bool:
+        """
+        Update existing embedding.
+
+        Args:
+            embedding: Updated embedding data
+
+        Returns:
+            True if updated, False otherwise
+        """
+        await self._acquire(embedding.user_id, keywords=True)
+        updated = await self.index.update(embedding)
+        await self._account(embedding.user_id)
+        return updated
+
+    async def evict(self, user_id: str) -> bool:
+        """
+        Evict one resident user now.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            True if the user was evicted
+        """
+        if user_id not in self._resident or user_id in self._keyword_loads:
+            return False
+        task = self._pending[user_id] = asyncio.ensure_future(self._evict(user_id))
+        task.add_done_callback(lambda _: self._settle(user_id, task))
+        await task
+        return True
+
+    async def _acquire(self, user_id: str, keywords: bool = False) -> None:
+        """
+        Make a user's index resident and mark it most recently used.
+
+        Args:
+            user_id: User identifier
+            keywords: Also wait for the keyword index
+        """
+        pending = self._pending.get(user_id)
+        if pending is not None:
+            await pending
+        if user_id in self._evicted:
+            self.misses += 1
+            pending = self._pending.get(user_id)
+            if pending is None:
+                pending = self._pending[user_id] = asyncio.ensure_future(self._reload(user_id))
+                pending.add_done_callback(lambda task: self._settle(user_id, task))
+            await pending
+        elif user_id in self._resident:
+            self.hits += 1
+
+        if user_id in self._resident:
+            self._resident.move_to_end(user_id)
+        if keywords and user_id in self._keyword_loads:
+            await self._keyword_loads[user_id]
+
+    def _settle(self, user_id: str, task: asyncio.Task) -> None:
+        """Forget a finished eviction or reload."""
+        if self._pending.get(user_id) is task:
+            del self._pending[user_id]
+
+    async def _account(self, user_id: str) -> None:
+        """Refresh a user's size after a write and enforce the budget."""
+        user_index = self.index.user_index(user_id)
+        if user_index is not None:
+            self._resident[user_id] = estimate_bytes(user_index)
+            self._resident.move_to_end(user_id)
+        await self._enforce_budget(keep=user_id)
+
+    async def _enforce_budget(self, keep: str) -> None:
+        """
+        Evict least recently used users until the budget holds.
+
+        Args:
+            keep: User being served, never evicted by its own call
+        """
+        while self.resident_bytes > self.memory_budget_bytes:
+            victim = next(
+                (
+                    user_id for user_id in self._resident
+                    if user_id != keep
+                    and user_id not in self._pending
+                    and user_id not in self._keyword_loads
+                ),
+                None
+            )
+            if victim is None:
+                return
+            await self.evict(victim)
+
+    async def _evict(self, user_id: str) -> None:
+        """Remove a user from memory, writing it out first when configured."""
+        user_index = self.index.users.pop(user_id)
+        del self._resident[user_id]
+        for record_id in user_index.locations:
+            self.index.owners.pop(record_id, None)
+            self._cold_owners[record_id] = user_id
+        self._evicted[user_id] = None
+        if self.directory is not None:
+            # Nothing else touches the detached index, so it is safe to write off-loop
+            self._evicted[user_id] = await asyncio.to_thread(
+                save_user_index, self.directory, user_id, user_index
+            )
+        self.evictions += 1
+        self._eviction_times.append(time.monotonic())
+        self._trim_eviction_times()
+
+    async def _reload(self, user_id: str) -> None:
+        """Bring an evicted user back, vectors first."""
+        path = self._evicted[user_id]
+        if path is not None:
+            user_index, manifest = await asyncio.to_thread(load_user_vectors, path)
+            self._install(user_id, user_index)
+            self._keyword_loads[user_id] = asyncio.ensure_future(
+                self._load_keywords(user_id, path, manifest, user_index)
+            )
+        else:
+            records = await self.loader(user_id)
+            self._install(user_id, UserIndex())
+            for record in records:
+                self.index.apply_store(record)
+            self._resident[user_id] = estimate_bytes(self.index.users[user_id])
+        self.reloads += 1
+        await self._enforce_budget(keep=user_id)
+
+    def _install(self, user_id: str, user_index: UserIndex) -> None:
+        """Make a reloaded index resident."""
+        del self._evicted[user_id]
+        self.index.users[user_id] = user_index
+        for record_id in user_index.locations:
+            self._cold_owners.pop(record_id, None)
+            self.index.owners[record_id] = user_id
+        self._resident[user_id] = estimate_bytes(user_index)
+
+    async def _load_keywords(
+        self,
+        user_id: str,
+        path: str,
+        manifest: Dict[str, Any],
+        user_index: UserIndex
+    ) -> None:
+        """Load a reloaded user's keyword index in the background."""
+        try:
+            await asyncio.to_thread(load_user_keywords, path, manifest, user_index)
+            if self.index.users.get(user_id) is user_index:
+                self._resident[user_id] = estimate_bytes(user_index)
+        finally:
+            self._keyword_loads.pop(user_id, None)
+
+    def _trim_eviction_times(self) -> None:
+        """Drop eviction timestamps older than the rate window."""
+        cutoff = time.monotonic() - self.rate_window
+        while self._eviction_times and self._eviction_times[0] < cutoff:
+            self._eviction_times.popleft()
@@ -50,4 +50,62 @@ def add_workout_history():
     def _add_history(user_id, workouts):
         # Mock function - in production would add to database
         return True
-    return _add_history
\ No newline at end of file
+    return _add_history
+
+@pytest.fixture
+def make_pipeline():
+    """Build RAG pipelines whose search and rerank return canned results."""
+    def _make_pipeline(contents, rerank=True):
+        from datetime import datetime
+        from unittest.mock import AsyncMock, Mock, patch
+        from rag_service.indexes import build_query_context
+        from rag_service.interfaces import (
+            ContentType,
+            HybridSearchResponse,
+            RerankResponse,
+            RerankResult,
+            RerankStage,
+            SearchResult,
+            SearchStrategy,
+        )
+        from rag_service.main import RAGPipeline
+        from rag_service.packing import ContextPacker
+
+        # The gate decides from `rerank`; reranking reverses the search order
+        gate = Mock()
+        gate.should_rerank.return_value = (rerank, {})
+        gate.sample_shadow.return_value = False
+        with patch("rag_service.main.EmbeddingService") as embedding_class, \
+                patch("rag_service.main.RerankService") as rerank_class:
+            embedding_class.return_value.build_query_context = AsyncMock(
+                side_effect=lambda query, embed=True: build_query_context(query)
+            )
+            rerank_class.return_value.pair_cost_ms = 1.0
+            rerank_class.return_value.process_request = AsyncMock(return_value=RerankResponse(
+                reranked=[
+                    RerankResult(content=content, relevance_score=0.9 - rank * 0.1, original_rank=rank)
+                    for rank, content in enumerate(reversed(contents))
+                ],
+                model_used="test",
+                processing_time_ms=5.0,
+                stages=[RerankStage(
+                    name="cross_encoder", candidates_in=len(contents),
+                    candidates_out=len(contents), time_ms=5.0
+                )]
+            ))
+            pipeline = RAGPipeline(rerank_gate=gate, context_packer=ContextPacker())
+        pipeline.search_service.process_request = AsyncMock(return_value=HybridSearchResponse(
+            results=[
+                SearchResult(
+                    id=str(i), content=content, content_type=ContentType.WORKOUT,
+                    score=0.9 - i * 0.1, metadata={}, source="workouts",
+                    timestamp=datetime(2024, 1, 15)
+                )
+                for i, content in enumerate(contents)
+            ],
+            search_strategy=SearchStrategy.HYBRID,
+            processing_time_ms=1.0,
+            total_results=len(contents)
+        ))
+        return pipeline
+    return _make_pipeline
@@ -0,0 +1,80 @@
+"""
+Tests for the RAG HTTP API.
+"""
+
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rag_service.api import router, get_search_service
+from rag_service.interfaces import ContentType, Embedding
+from rag_service.search import SearchService
+
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+VECTORS = {
+    "chest workouts": [1.0, 0.0],
+    "leg workouts": [0.0, 1.0],
+}
+
+
+@pytest.fixture
+def search_service():
+    """Provide a search service with a deterministic embedder."""
+    embedding_service = Mock()
+    embedding_service.generate_batch = AsyncMock(
+        side_effect=lambda texts: [(VECTORS[t], "test-model") for t in texts]
+    )
+    return SearchService(embedding_service=embedding_service)
+
+
+@pytest.fixture
+def client(search_service):
+    """Provide a test client with the search service injected."""
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_search_service] = lambda: search_service
+    return TestClient(app)
+
+
+@pytest.mark.asyncio
+async def test_batch_search_endpoint(client, search_service):
+    """Test the batch endpoint embeds once and answers every query."""
+    # Given
+    for record_id, vector in [("chest", [1.0, 0.0]), ("legs", [0.0, 1.0])]:
+        await search_service.index_record(Embedding(
+            id=record_id, user_id=USER_ID, content=f"{record_id} session",
+            content_type=ContentType.WORKOUT, embedding_vector=vector,
+            model_name="test", dimension=2, metadata={}, created_at=datetime(2024, 1, 15)
+        ))
+
+    # When
+    response = client.post("/api/rag/search/batch", json={
+        "queries": ["chest workouts", "leg workouts"],
+        "user_id": USER_ID,
+        "search_type": "semantic",
+        "limit": 1,
+    })
+
+    # Then
+    assert response.status_code == 200
+    responses = response.json()["responses"]
+    assert [r["results"][0]["id"] for r in responses] == ["chest", "legs"]
+    search_service.embedding_service.generate_batch.assert_awaited_once()
+
+
+def test_search_endpoint_rejects_bad_cursor(client):
+    """Test malformed cursors are a client error."""
+    # When
+    response = client.post("/api/rag/search", json={
+        "query": "chest workouts",
+        "user_id": USER_ID,
+        "cursor": "garbage",
+    })
+
+    # Then
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
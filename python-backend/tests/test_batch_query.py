@@ -0,0 +1,138 @@
+"""
+Unit tests for the bulk RAG pipeline.
+"""
+
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rag_service.api import get_pipeline, router
+from rag_service.interfaces import (
+    ContentType,
+    HybridSearchResponse,
+    RAGQueryRequest,
+    RerankResult,
+    SearchResult,
+    SearchStrategy,
+)
+from rag_service.main import RAGPipeline
+from rag_service.packing import ContextPacker
+
+
+ALICE = "00000000-0000-0000-0000-00000000000a"
+BOB = "00000000-0000-0000-0000-00000000000b"
+CONTENTS = ["Easy run", "Heavy squats", "Tempo run"]
+
+
+async def fake_search(request, query_context=None):
+    """Return the same three results for every user except a broken one."""
+    if request.user_id == BOB and request.query == "fail":
+        raise RuntimeError("index unavailable")
+    return HybridSearchResponse(
+        results=[
+            SearchResult(
+                id=str(i), content=content, content_type=ContentType.WORKOUT,
+                score=0.9 - i * 0.1, metadata={}, source="workouts",
+                timestamp=datetime(2024, 1, 15)
+            )
+            for i, content in enumerate(CONTENTS)
+        ],
+        search_strategy=SearchStrategy.HYBRID,
+        processing_time_ms=1.0,
+        total_results=3
+    )
+
+
+async def fake_rerank_batch(groups, query_contexts=None):
+    """Reverse every group's candidates."""
+    return [
+        [
+            RerankResult(content=c, relevance_score=1.0 - rank * 0.1, original_rank=rank)
+            for rank, c in enumerate(reversed(candidates))
+        ][:top_k]
+        for _, candidates, top_k in groups
+    ]
+
+
+def make_pipeline():
+    """Build a pipeline with canned embedding, search and rerank."""
+    gate = Mock()
+    gate.should_rerank.return_value = (True, {})
+    with patch("rag_service.main.EmbeddingService") as embedding_class, \
+            patch("rag_service.main.RerankService") as rerank_class:
+        embedding_class.return_value.generate_batch = AsyncMock(
+            side_effect=lambda texts: [([1.0, 0.0], "test-model") for _ in texts]
+        )
+        rerank_class.return_value.rerank_batch = AsyncMock(side_effect=fake_rerank_batch)
+        pipeline = RAGPipeline(rerank_gate=gate, context_packer=ContextPacker())
+    pipeline.search_service.process_request = AsyncMock(side_effect=fake_search)
+    return pipeline
+
+
+def make_requests():
+    """Weekly summary queries for two users."""
+    return [
+        RAGQueryRequest(query="weekly summary", user_id=ALICE, max_context_items=2),
+        RAGQueryRequest(query="weekly summary", user_id=BOB, max_context_items=2),
+        RAGQueryRequest(query="fail", user_id=BOB, max_context_items=2),
+    ]
+
+
+class TestBatchPipeline:
+    """Test cases for bulk RAG queries."""
+
+    @pytest.mark.asyncio
+    async def test_chunks_share_embedding_and_rerank_calls(self):
+        """Test each chunk embeds once and reranks every query in one call."""
+        # Given
+        pipeline = make_pipeline()
+
+        # When
+        results = [r async for r in pipeline.process_batch(make_requests(), chunk_size=2)]
+
+        # Then
+        assert [r.index for r in results] == [0, 1, 2]
+        embed_calls = pipeline.embedding_service.generate_batch.await_args_list
+        assert [call.args[0] for call in embed_calls] == [["weekly summary"], ["fail"]]
+        assert pipeline.rerank_service.rerank_batch.await_count == 1
+        groups = pipeline.rerank_service.rerank_batch.await_args.args[0]
+        assert len(groups) == 2
+        for result in results[:2]:
+            assert [c.content for c in result.response.context] == ["Tempo run", "Heavy squats"]
+
+    @pytest.mark.asyncio
+    async def test_failed_query_does_not_fail_the_batch(self):
+        """Test a failing search is reported for its query alone."""
+        # Given
+        pipeline = make_pipeline()
+
+        # When
+        results = [r async for r in pipeline.process_batch(make_requests())]
+
+        # Then
+        assert results[2].response is None
+        assert "index unavailable" in results[2].error
+        assert all(r.error is None for r in results[:2])
+
+    def test_batch_endpoint_streams_ndjson(self):
+        """Test the endpoint writes one JSON line per request."""
+        # Given
+        pipeline = make_pipeline()
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_pipeline] = lambda: pipeline
+
+        # When
+        response = TestClient(app).post(
+            "/api/rag/query/batch",
+            json={"requests": [r.model_dump(mode="json") for r in make_requests()]}
+        )
+
+        # Then
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["index"] for line in lines] == [0, 1, 2]
+        assert lines[2]["error"]
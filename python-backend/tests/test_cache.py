@@ -0,0 +1,182 @@
+"""
+Unit tests for caching utilities.
+"""
+
+import pytest
+from unittest.mock import patch
+
+from rag_service.cache import (
+    SemanticQueryCache,
+    TTLCache,
+    UserVersions,
+    make_cache_key,
+    normalize_query,
+)
+
+
+class TestTTLCache:
+    """Test cases for the TTL/LRU cache."""
+
+    @pytest.mark.asyncio
+    async def test_get_and_set(self):
+        """Test basic cache round trip."""
+        # Given
+        cache = TTLCache(max_entries=4, ttl=60)
+
+        # When
+        await cache.set("key", [1, 2, 3])
+
+        # Then
+        assert await cache.get("key") == [1, 2, 3]
+        assert await cache.get("missing") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_entries_expire(self):
+        """Test entries are dropped after their TTL."""
+        # Given
+        cache = TTLCache(max_entries=4, ttl=10)
+
+        with patch("rag_service.cache.time.monotonic", return_value=100.0):
+            await cache.set("key", "value")
+
+        # When / Then
+        with patch("rag_service.cache.time.monotonic", return_value=109.0):
+            assert await cache.get("key") == "value"
+        with patch("rag_service.cache.time.monotonic", return_value=111.0):
+            assert await cache.get("key") is None
+        assert cache.size == 0
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_entry_is_evicted(self):
+        """Test LRU bound."""
+        # Given
+        cache = TTLCache(max_entries=2, ttl=None)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+
+        # When
+        await cache.get("a")
+        await cache.set("c", 3)
+
+        # Then
+        assert await cache.get("a") == 1
+        assert await cache.get("b") is None
+        assert cache.evictions == 1
+
+    @pytest.mark.asyncio
+    async def test_delete_and_clear(self):
+        """Test explicit removal."""
+        # Given
+        cache = TTLCache()
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+
+        # When / Then
+        assert await cache.delete("a")
+        assert not await cache.delete("a")
+        assert await cache.clear()
+        assert cache.size == 0
+
+
+class TestCacheKeys:
+    """Test cases for versioned cache keys."""
+
+    def test_version_bump_changes_key(self):
+        """Test bumping a user's version invalidates their keys only."""
+        # Given
+        versions = UserVersions()
+        before = make_cache_key("search", "u1", versions.get("u1"), query="protein")
+        other = make_cache_key("search", "u2", versions.get("u2"), query="protein")
+
+        # When
+        versions.bump("u1")
+
+        # Then
+        assert make_cache_key("search", "u1", versions.get("u1"), query="protein") != before
+        assert make_cache_key("search", "u2", versions.get("u2"), query="protein") == other
+
+    def test_key_depends_on_every_parameter(self):
+        """Test parameters are part of the key, in any order."""
+        # Then
+        assert make_cache_key("s", "u", 0, limit=5, threshold=0.5) == make_cache_key("s", "u", 0, threshold=0.5, limit=5)
+        assert make_cache_key("s", "u", 0, limit=5) != make_cache_key("s", "u", 0, limit=10)
+
+    def test_normalize_query(self):
+        """Test query normalization."""
+        assert normalize_query("  How's my   PROTEIN ") == "how's my protein"
+
+
+class TestSemanticQueryCache:
+    """Test cases for the semantic query cache."""
+
+    def test_near_identical_query_hits(self):
+        """Test a query within the distance threshold reuses results."""
+        # Given
+        cache = SemanticQueryCache(max_distance=0.05)
+        cache.store("u1", 0, "sig", "how's my protein", [1.0, 0.0], ["result"])
+
+        # When
+        hit = cache.lookup("u1", 0, "sig", "am I hitting protein goals", [0.99, 0.05])
+        miss = cache.lookup("u1", 0, "sig", "leg day plan", [0.0, 1.0])
+
+        # Then
+        assert hit == ["result"]
+        assert miss is None
+        assert cache.stats()["hit_rate"] == 0.5
+        assert cache.audit_log[-1]["matched_query"] == "how's my protein"
+
+    def test_signature_version_and_user_must_match(self):
+        """Test hits require the same parameters, data version and user."""
+        # Given
+        cache = SemanticQueryCache()
+        cache.store("u1", 0, "sig", "protein", [1.0, 0.0], ["result"])
+
+        # Then
+        assert cache.lookup("u1", 0, "other-sig", "protein", [1.0, 0.0]) is None
+        assert cache.lookup("u1", 1, "sig", "protein", [1.0, 0.0]) is None
+        assert cache.lookup("u2", 0, "sig", "protein", [1.0, 0.0]) is None
+
+    def test_queries_of_other_embedding_models_are_not_compared(self):
+        """Test a fallback model's query neither matches nor breaks on other dimensions."""
+        # Given
+        cache = SemanticQueryCache()
+        cache.store("u1", 0, "sig", "protein", [1.0, 0.0, 0.0], ["openai"], model_name="openai")
+        cache.store("u1", 0, "sig", "protein", [1.0, 0.0], ["minilm"], model_name="minilm")
+
+        # When
+        fallback = cache.lookup("u1", 0, "sig", "protein", [1.0, 0.0], model_name="minilm")
+        other_model = cache.lookup("u1", 0, "sig", "protein", [1.0, 0.0, 0.0], model_name="minilm")
+
+        # Then
+        assert fallback == ["minilm"]
+        assert other_model is None
+
+    def test_entries_expire(self):
+        """Test TTL applies to semantic entries."""
+        # Given
+        cache = SemanticQueryCache(ttl=10)
+        with patch("rag_service.cache.time.monotonic", return_value=100.0):
+            cache.store("u1", 0, "sig", "protein", [1.0, 0.0], ["result"])
+
+        # When
+        with patch("rag_service.cache.time.monotonic", return_value=200.0):
+            result = cache.lookup("u1", 0, "sig", "protein", [1.0, 0.0])
+
+        # Then
+        assert result is None
+
+    def test_false_hit_audit_counters(self):
+        """Test audited hits with low agreement count as false hits."""
+        # Given
+        cache = SemanticQueryCache()
+        cache.store("u1", 0, "sig", "protein", [1.0, 0.0], ["result"])
+        cache.lookup("u1", 0, "sig", "protein intake", [1.0, 0.01])
+
+        # When
+        cache.record_audit(cache.audit_log[-1], agreement=0.2)
+
+        # Then
+        assert cache.stats()["false_hits"] == 1
+        assert cache.audit_log[-1]["agreement"] == 0.2
@@ -0,0 +1,151 @@
+"""
+Unit tests for the application-scoped pipeline container.
+"""
+
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rag_service import container as container_module
+from rag_service.api import get_search_service, router
+from rag_service.container import (
+    SHARED_INDEX_CONTEXT_TTL,
+    PipelineContainer,
+    build_persistence_from_env,
+    get_container,
+    lifespan,
+    set_container,
+)
+from rag_service.interfaces import ContentType, Embedding, RAGQueryResponse, SearchStrategy
+from rag_service.main import rag_pipeline, rerank_search_results
+from rag_service.search import SearchService
+from rag_service.sharding import ShardedVectorStore
+from rag_service.snapshot import IndexPersistence
+
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def make_pipeline():
+    """Build a pipeline double around a real search service."""
+    pipeline = Mock()
+    pipeline.search_service = SearchService(embedding_service=Mock())
+    pipeline.cleanup = AsyncMock()
+    pipeline.process = AsyncMock(return_value=RAGQueryResponse(
+        context=[],
+        embeddings_used=[],
+        search_strategy=SearchStrategy.HYBRID,
+        total_tokens=0,
+        processing_time_ms=1.0
+    ))
+    return pipeline
+
+
+@pytest.fixture
+def test_container():
+    """Install a container around a pipeline double for one test."""
+    container = PipelineContainer(pipeline=make_pipeline())
+    previous = set_container(container)
+    yield container
+    set_container(previous)
+
+
+class TestPipelineContainer:
+    """Test cases for the shared pipeline container."""
+
+    @pytest.mark.asyncio
+    async def test_convenience_functions_reuse_the_container(self, test_container):
+        """Test convenience functions use the shared pipeline instead of building one."""
+        # Given
+        test_container.rerank_service.rerank_with_fallback = AsyncMock(return_value=[])
+
+        with patch("rag_service.main.RAGPipeline") as pipeline_class, \
+                patch("rag_service.main.RerankService") as rerank_class:
+            # When
+            await rag_pipeline("leg day", USER_ID)
+            await rag_pipeline("arm day", USER_ID)
+            await rerank_search_results("leg day", ["squats"], top_k=1)
+
+        # Then
+        pipeline_class.assert_not_called()
+        rerank_class.assert_not_called()
+        assert test_container.pipeline.process.await_count == 2
+
+    def test_api_uses_the_container_search_service(self, test_container):
+        """Test the search dependency resolves to the shared service."""
+        assert get_search_service() is test_container.search_service
+
+    def test_sharded_index_shortens_context_ttl(self):
+        """Test prefetched contexts expire quickly when other workers may write."""
+        # Given
+        pipeline = make_pipeline()
+        pipeline.search_service = SearchService(index=ShardedVectorStore.from_paths(["/tmp/shard.sock"]))
+
+        # When
+        container = PipelineContainer(pipeline=pipeline)
+
+        # Then
+        assert container.prefetcher.cache.ttl == SHARED_INDEX_CONTEXT_TTL
+
+    def test_data_dir_persists_only_the_per_process_index(self, tmp_path, monkeypatch):
+        """Test RAG_DATA_DIR is ignored when shards or a memory budget hold the index."""
+        # Given
+        monkeypatch.setenv("RAG_DATA_DIR", str(tmp_path))
+
+        # Then
+        assert isinstance(build_persistence_from_env(), IndexPersistence)
+        monkeypatch.setenv("RAG_MEMORY_BUDGET_MB", "64")
+        assert build_persistence_from_env() is None
+
+    @pytest.mark.asyncio
+    async def test_shutdown_snapshots_persisted_index(self, tmp_path):
+        """Test a restarted container gets the index back from its snapshot."""
+        # Given
+        persistence = IndexPersistence(str(tmp_path))
+        pipeline = make_pipeline()
+        pipeline.search_service = SearchService(embedding_service=Mock(), index=persistence.restore())
+        container = PipelineContainer(pipeline=pipeline, persistence=persistence)
+        await pipeline.search_service.index.store(Embedding(
+            id="w1", user_id=USER_ID, content="Heavy squats", content_type=ContentType.WORKOUT,
+            embedding_vector=[1.0, 0.0], model_name="test", dimension=2, metadata={},
+            created_at=datetime(2024, 1, 15)
+        ))
+
+        # When
+        await container.shutdown()
+        restarted = IndexPersistence(str(tmp_path))
+        index = restarted.restore()
+
+        # Then
+        assert restarted.snapshots.versions() == [1]
+        assert list(restarted.write_log.replay()) == []
+        assert [r.id for r in await index.full_text_search("squats", USER_ID, 10)] == ["w1"]
+        restarted.close()
+
+    @pytest.mark.asyncio
+    async def test_lifespan_starts_and_cleans_up(self):
+        """Test the FastAPI lifespan builds the container once and cleans it up."""
+        # Given
+        pipeline = make_pipeline()
+        previous = set_container(None)
+        app = FastAPI(lifespan=lifespan)
+        app.include_router(router)
+
+        try:
+            with patch.object(container_module, "PipelineContainer",
+                              side_effect=lambda: PipelineContainer(pipeline=pipeline)) as build:
+                # When
+                with TestClient(app) as client:
+                    response = client.get("/api/rag/index/stats")
+                    started = get_container()
+
+            # Then
+            assert response.status_code == 200
+            assert build.call_count == 1
+            assert started.pipeline is pipeline
+            pipeline.cleanup.assert_awaited_once()
+            assert container_module._container is None
+        finally:
+            set_container(previous)
@@ -0,0 +1,228 @@
+"""
+Unit tests for deadline-aware degradation of the RAG pipeline.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rag_service.api import get_pipeline, router
+from rag_service.deadline import Deadline, StageCosts
+from rag_service.interfaces import (
+    ContentType,
+    Degradation,
+    RAGQueryRequest,
+    SearchStrategy,
+)
+
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+CONTENTS = ["Easy run", "Heavy squats", "Tempo run"]
+
+
+def make_request(deadline_ms=None):
+    """Build a RAG query request."""
+    return RAGQueryRequest(
+        query="running", user_id=USER_ID, max_context_items=3, deadline_ms=deadline_ms
+    )
+
+
+class TestDeadline:
+    """Test cases for deadlines and stage cost estimates."""
+
+    def test_no_deadline_allows_everything(self):
+        """Test a request without a deadline never degrades."""
+        # Given
+        deadline = Deadline()
+
+        # Then
+        assert deadline.allows(1e9)
+
+    def test_tight_deadline_rejects_expensive_stage(self):
+        """Test a stage costing more than the budget left does not fit."""
+        # Given
+        deadline = Deadline(budget_ms=50)
+
+        # Then
+        assert deadline.allows(10)
+        assert not deadline.allows(100)
+
+    def test_costs_follow_measurements(self):
+        """Test stage estimates move towards measured costs."""
+        # Given
+        costs = StageCosts({"search": 100.0}, smoothing=0.5)
+
+        # When
+        costs.observe("search", 20.0)
+        costs.observe("rerank", 30.0)
+
+        # Then
+        assert costs.estimate("search") == 60.0
+        assert costs.estimate("rerank") == 30.0
+        assert costs.estimate("unknown") == 0.0
+
+
+class TestDeadlinePipeline:
+    """Test cases for degrading pipeline stages to meet a deadline."""
+
+    @pytest.mark.asyncio
+    async def test_without_deadline_nothing_degrades(self, make_pipeline):
+        """Test the full pipeline runs when no deadline is set."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+
+        # When
+        response = await pipeline.process(make_request())
+
+        # Then
+        assert response.degradations == []
+        pipeline.rerank_service.process_request.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_skips_rerank_that_would_miss_deadline(self, make_pipeline):
+        """Test first-stage results are served when reranking costs too much."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+        pipeline.rerank_service.pair_cost_ms = 10_000.0
+
+        # When
+        response = await pipeline.process(make_request(deadline_ms=500))
+
+        # Then
+        assert response.degradations == [Degradation.SKIPPED_RERANK]
+        assert [c.content for c in response.context] == CONTENTS
+        pipeline.rerank_service.process_request.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_rerank_cost_counts_every_candidate(self, make_pipeline):
+        """Test the rerank estimate covers all candidates, not just the items served."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+        pipeline.rerank_service.pair_cost_ms = 200.0
+        request = make_request(deadline_ms=500).model_copy(update={"max_context_items": 1})
+
+        # When
+        response = await pipeline.process(request)
+
+        # Then
+        assert response.degradations == [Degradation.SKIPPED_RERANK]
+        pipeline.rerank_service.process_request.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_cached_searches_do_not_lower_search_cost(self, make_pipeline):
+        """Test only searches that ran feed the search cost estimate."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+        pipeline.stage_costs = StageCosts({"search_hybrid": 100.0}, smoothing=0.5)
+        response = pipeline.search_service.process_request.return_value
+        pipeline.search_service.process_request.return_value = response.model_copy(
+            update={"from_cache": True}
+        )
+
+        # When
+        await pipeline.process(make_request())
+
+        # Then
+        assert pipeline.stage_costs.estimate("search_hybrid") == 100.0
+
+    @pytest.mark.asyncio
+    async def test_rerank_budget_is_capped_by_deadline(self, make_pipeline):
+        """Test the rerank cascade gets no more than the time left."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+
+        # When
+        await pipeline.process(make_request(deadline_ms=500))
+
+        # Then
+        rerank_request = pipeline.rerank_service.process_request.await_args.args[0]
+        assert rerank_request.cascade
+        assert rerank_request.latency_budget_ms <= 500
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_keyword_search(self, make_pipeline):
+        """Test a hybrid search that would miss the deadline runs on keywords alone."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+        pipeline.stage_costs = StageCosts({"search_keyword": 10.0, "search_hybrid": 10_000.0})
+
+        # When
+        response = await pipeline.process(make_request(deadline_ms=500))
+
+        # Then
+        assert Degradation.KEYWORD_ONLY in response.degradations
+        assert response.search_strategy == SearchStrategy.KEYWORD
+        search_request = pipeline.search_service.process_request.await_args.args[0]
+        assert search_request.search_type == SearchStrategy.KEYWORD
+        assert pipeline.search_service.process_request.await_args.kwargs["allow_embedding"] is False
+
+    @pytest.mark.asyncio
+    async def test_serves_cached_context_when_no_search_fits(self, make_pipeline):
+        """Test the last context served is reused when even keyword search is too slow."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+        first = await pipeline.process(make_request())
+        pipeline.stage_costs = StageCosts({"search_keyword": 10_000.0, "search_hybrid": 10_000.0})
+        pipeline.search_service.process_request.reset_mock()
+
+        # When
+        response = await pipeline.process(make_request(deadline_ms=500))
+
+        # Then
+        assert response.degradations == [Degradation.CACHED_CONTEXT]
+        assert [c.content for c in response.context] == [c.content for c in first.context]
+        pipeline.search_service.process_request.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_keyword_search_when_nothing_fits_or_is_cached(self, make_pipeline):
+        """Test a deadline too tight for any search runs the cheapest one, not the request's."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+
+        # When
+        response = await pipeline.process(make_request(deadline_ms=0.001))
+
+        # Then
+        assert response.degradations == [Degradation.KEYWORD_ONLY, Degradation.SKIPPED_RERANK]
+        search_request = pipeline.search_service.process_request.await_args.args[0]
+        assert search_request.search_type == SearchStrategy.KEYWORD
+        assert pipeline.search_service.process_request.await_args.kwargs["allow_embedding"] is False
+
+    @pytest.mark.asyncio
+    async def test_cached_context_must_match_request_filters(self, make_pipeline):
+        """Test context cached for one content type is not served for another."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+        await pipeline.process(make_request())
+        pipeline.stage_costs = StageCosts({"search_keyword": 10_000.0, "search_hybrid": 10_000.0})
+        nutrition = make_request(deadline_ms=500).model_copy(
+            update={"include_context": [ContentType.NUTRITION]}
+        )
+        pipeline.search_service.process_request.reset_mock()
+
+        # When
+        response = await pipeline.process(nutrition)
+
+        # Then
+        assert Degradation.CACHED_CONTEXT not in response.degradations
+        pipeline.search_service.process_request.assert_awaited_once()
+
+    def test_query_endpoint_honors_deadline_header(self, make_pipeline):
+        """Test the deadline header applies when the body sets none."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+        pipeline.rerank_service.pair_cost_ms = 10_000.0
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_pipeline] = lambda: pipeline
+
+        # When
+        response = TestClient(app).post(
+            "/api/rag/query",
+            json=make_request().model_dump(mode="json"),
+            headers={"X-Request-Deadline-Ms": "500"}
+        )
+
+        # Then
+        assert response.status_code == 200
+        assert response.json()["degradations"] == ["skipped_rerank"]
@@ -0,0 +1,142 @@
+"""
+Unit tests for score fusion.
+"""
+
+import pytest
+
+from rag_service.fusion import ScoreFusion, fuse_results, result_key
+from rag_service.interfaces import (
+    ContentType,
+    FusionMethod,
+    SearchResult,
+)
+
+
+def make_result(record_id, score, content=None):
+    """Build a search result with a stable id."""
+    return SearchResult(
+        id=record_id,
+        content=content or f"content {record_id}",
+        content_type=ContentType.WORKOUT,
+        score=score,
+        metadata={},
+        source="db",
+        timestamp="2024-01-15"
+    )
+
+
+class TestScoreFusion:
+    """Test cases for score fusion."""
+
+    def test_min_max_fusion_ranks_by_weighted_score(self):
+        """Test min-max fusion combines normalized scores."""
+        # Given
+        semantic = [make_result("a", 0.9), make_result("b", 0.5), make_result("c", 0.1)]
+        keyword = [make_result("c", 8.0 / 10), make_result("b", 0.4)]
+
+        # When
+        fused = ScoreFusion(FusionMethod.MIN_MAX).fuse(
+            [semantic, keyword], weights=[0.5, 0.5], limit=3
+        )
+
+        # Then
+        assert [r.id for r in fused] == ["a", "c", "b"]
+        assert fused[0].score == pytest.approx(0.5)
+        assert fused[1].score == pytest.approx(0.5)
+
+    def test_rrf_scores_record_ranked_first_everywhere_as_one(self):
+        """Test reciprocal rank fusion scaling."""
+        # Given
+        first = [make_result("a", 0.2), make_result("b", 0.1)]
+        second = [make_result("a", 0.9), make_result("c", 0.8)]
+
+        # When
+        fused = ScoreFusion(FusionMethod.RRF).fuse([first, second], limit=3)
+
+        # Then
+        assert fused[0].id == "a"
+        assert fused[0].score == pytest.approx(1.0)
+        assert all(0.0 <= r.score <= 1.0 for r in fused)
+
+    def test_z_score_fusion_stays_in_unit_range(self):
+        """Test z-score fusion maps scores into [0, 1]."""
+        # Given
+        results = [make_result(str(i), 1.0 - i * 0.1) for i in range(5)]
+
+        # When
+        fused = ScoreFusion(FusionMethod.Z_SCORE).fuse([results], limit=5)
+
+        # Then
+        assert [r.id for r in fused] == ["0", "1", "2", "3", "4"]
+        assert all(0.0 <= r.score <= 1.0 for r in fused)
+
+    def test_fusion_deduplicates_on_record_id(self):
+        """Test records with the same id are merged, not content."""
+        # Given
+        semantic = [make_result("a", 0.9, content="same text")]
+        keyword = [
+            make_result("a", 0.7, content="same text"),
+            make_result("b", 0.5, content="same text"),
+        ]
+
+        # When
+        fused = fuse_results([semantic, keyword], limit=10)
+
+        # Then
+        assert sorted(r.id for r in fused) == ["a", "b"]
+
+    def test_fusion_does_not_mutate_inputs(self):
+        """Test fused results are new objects."""
+        # Given
+        original = make_result("a", 0.3)
+
+        # When
+        fused = fuse_results([[original], [make_result("b", 0.9)]], limit=2)
+
+        # Then
+        assert original.score == 0.3
+        assert all(r is not original for r in fused)
+
+    def test_early_stop_matches_full_scan(self):
+        """Test threshold algorithm returns the same top-k as a full scan."""
+        # Given
+        lists = [
+            [make_result(f"s{i}", 1.0 - i / 100) for i in range(100)],
+            [make_result(f"s{99 - i}", 1.0 - i / 100) for i in range(100)],
+            [make_result(f"k{i}", 1.0 - i / 50) for i in range(50)],
+        ]
+
+        for method in FusionMethod:
+            # When
+            fast = ScoreFusion(method, early_stop=True).fuse(lists, limit=5)
+            full = ScoreFusion(method, early_stop=False).fuse(lists, limit=5)
+
+            # Then
+            assert [r.id for r in fast] == [r.id for r in full]
+
+    def test_zero_weight_list_is_ignored(self):
+        """Test lists with zero weight do not contribute."""
+        # Given
+        semantic = [make_result("a", 0.9)]
+        keyword = [make_result("b", 0.9)]
+
+        # When
+        fused = fuse_results([semantic, keyword], weights=[0.0, 1.0])
+
+        # Then
+        assert [r.id for r in fused] == ["b"]
+
+    def test_mismatched_weights_raise(self):
+        """Test invalid weights are rejected."""
+        with pytest.raises(ValueError):
+            ScoreFusion().fuse([[make_result("a", 0.5)]], weights=[0.5, 0.5])
+
+    def test_result_key_falls_back_to_content_digest(self):
+        """Test results without ids are keyed by content."""
+        # Given
+        first = make_result(None, 0.5, content="squats")
+        second = make_result(None, 0.9, content="squats")
+
+        # Then
+        assert result_key(first) == result_key(second)
+        assert result_key(make_result("id-1", 0.5)) == "id-1"
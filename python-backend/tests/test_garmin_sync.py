@@ -0,0 +1,78 @@
+"""
+Unit tests for indexing synced Garmin activities.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+pytest.importorskip("garminconnect")
+
+import main
+from rag_service.container import PipelineContainer, set_container
+from rag_service.search import SearchService
+
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+ACTIVITY = {
+    "activityId": 1234,
+    "activityName": "Morning Run",
+    "activityType": {"typeKey": "running"},
+    "startTimeLocal": "2024-01-15 07:00:00",
+    "startTimeGMT": "2024-01-15 12:00:00",
+    "duration": 1800.0,
+    "distance": 5000.0,
+    "averageHR": 150,
+    "calories": 400,
+}
+
+
+@pytest.fixture
+def test_container():
+    """Install a container around a real search service for one test."""
+    pipeline = Mock()
+    pipeline.search_service = SearchService(embedding_service=Mock())
+    pipeline.cleanup = AsyncMock()
+    container = PipelineContainer(pipeline=pipeline)
+    container.embedding_service.generate_batch = AsyncMock(return_value=[([1.0, 0.0], "test")])
+    previous = set_container(container)
+    yield container
+    set_container(previous)
+
+
+class TestGarminSync:
+    """Test cases for the Garmin sync write path."""
+
+    @pytest.mark.asyncio
+    async def test_sync_indexes_activities_and_prefetches_context(self, test_container):
+        """Test synced activities are searchable and refresh the coaching context."""
+        # Given
+        request = main.SyncRequest(email="a@b.c", password="secret", user_id=USER_ID)
+
+        with patch("main.Garmin") as garmin_class:
+            garmin_class.return_value.get_activities_by_date.return_value = [ACTIVITY]
+            # When
+            response = await main.sync_activities(request)
+
+        # Then
+        assert response["indexed"] == 1
+        assert test_container.prefetcher.queue.pending == 1
+        results = await test_container.search_service.index.full_text_search("run", USER_ID, 10)
+        assert [r.id for r in results] == ["garmin-1234"]
+        await test_container.prefetcher.close()
+
+    @pytest.mark.asyncio
+    async def test_sync_without_user_only_fetches(self, test_container):
+        """Test a sync that names no user leaves the index untouched."""
+        # Given
+        request = main.SyncRequest(email="a@b.c", password="secret")
+
+        with patch("main.Garmin") as garmin_class:
+            garmin_class.return_value.get_activities_by_date.return_value = [ACTIVITY]
+            # When
+            response = await main.sync_activities(request)
+
+        # Then
+        assert response["count"] == 1
+        assert response["indexed"] == 0
+        assert test_container.prefetcher.queue.pending == 0
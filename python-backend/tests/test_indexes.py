@@ -0,0 +1,364 @@
+"""
+Unit tests for the in-memory search indexes.
+"""
+
+import asyncio
+import pytest
+import numpy as np
+from datetime import datetime
+from unittest.mock import patch
+
+from rag_service.indexes import InMemorySearchIndex, build_query_context, term_id, tokenize
+from rag_service.interfaces import (
+    ContentType,
+    Embedding,
+    SearchFilter,
+)
+
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def make_record(record_id, content, vector, content_type=ContentType.WORKOUT, **metadata):
+    """Build an embedding record."""
+    return Embedding(
+        id=record_id,
+        user_id=USER_ID,
+        content=content,
+        content_type=content_type,
+        embedding_vector=vector,
+        model_name="test",
+        dimension=len(vector),
+        metadata=metadata,
+        created_at=datetime(2024, 1, 15),
+    )
+
+
+@pytest.fixture
+async def index():
+    """Provide an index with a few workouts and meals."""
+    index = InMemorySearchIndex()
+    records = [
+        make_record("w1", "Bench press and push-ups", [1.0, 0.0, 0.0], source="workout_db", day="mon"),
+        make_record("w2", "Squats and lunges leg day", [0.0, 1.0, 0.0], source="workout_db", day="tue"),
+        make_record("n1", "High protein breakfast with eggs", [0.9, 0.1, 0.0], ContentType.NUTRITION, source="meal_db"),
+        make_record("n2", "Protein shake after bench press", [0.7, 0.3, 0.0], ContentType.NUTRITION, source="meal_db"),
+    ]
+    for record in records:
+        await index.store(record)
+    return index
+
+
+class TestInMemorySearchIndex:
+    """Test cases for the in-memory search index."""
+
+    @pytest.mark.asyncio
+    async def test_vector_search_ranks_by_cosine(self, index):
+        """Test vector search returns nearest records first."""
+        # When
+        results = await index.search_similar([1.0, 0.0, 0.0], USER_ID, limit=2, threshold=0.0)
+
+        # Then
+        assert [r.id for r in results] == ["w1", "n1"]
+        assert results[0].score == pytest.approx(1.0)
+
+    @pytest.mark.asyncio
+    async def test_content_type_filter_is_applied_before_limit(self, index):
+        """Test narrow content type filters still fill the limit."""
+        # Given
+        filters = SearchFilter(content_types=[ContentType.NUTRITION])
+
+        # When
+        results = await index.search_similar([1.0, 0.0, 0.0], USER_ID, limit=2, threshold=0.0, filters=filters)
+
+        # Then
+        assert [r.id for r in results] == ["n1", "n2"]
+
+    @pytest.mark.asyncio
+    async def test_metadata_and_source_filters(self, index):
+        """Test metadata equality and source filters."""
+        # When
+        by_metadata = await index.search_similar(
+            [1.0, 0.0, 0.0], USER_ID, limit=10, threshold=0.0,
+            filters=SearchFilter(metadata={"day": "tue"})
+        )
+        by_source = await index.full_text_search(
+            "bench press", USER_ID, limit=10,
+            filters=SearchFilter(sources=["meal_db"])
+        )
+
+        # Then
+        assert [r.id for r in by_metadata] == ["w2"]
+        assert [r.id for r in by_source] == ["n2"]
+
+    @pytest.mark.asyncio
+    async def test_empty_content_type_filter_matches_nothing(self, index):
+        """Test an empty content type list excludes every record."""
+        # When
+        results = await index.full_text_search(
+            "protein", USER_ID, limit=10, filters=SearchFilter(content_types=[])
+        )
+
+        # Then
+        assert results == []
+
+    @pytest.mark.asyncio
+    async def test_keyword_search_uses_bm25(self, index):
+        """Test keyword search ranks documents matching more terms higher."""
+        # When
+        results = await index.full_text_search("protein bench", USER_ID, limit=10)
+
+        # Then
+        assert results[0].id == "n2"
+        assert {r.id for r in results} == {"n2", "n1", "w1"}
+        assert all(0.0 <= r.score < 1.0 for r in results)
+
+    @pytest.mark.asyncio
+    async def test_delete_and_update(self, index):
+        """Test records can be removed and replaced."""
+        # When
+        deleted = await index.delete("n2")
+        updated = await index.update(
+            make_record("w2", "Deadlift session", [0.0, 1.0, 0.0], source="workout_db")
+        )
+        missing = await index.delete("unknown")
+
+        # Then
+        assert deleted and updated and not missing
+        assert [r.id for r in await index.full_text_search("protein", USER_ID, 10)] == ["n1"]
+        assert [r.id for r in await index.full_text_search("deadlift", USER_ID, 10)] == ["w2"]
+
+    @pytest.mark.asyncio
+    async def test_batch_vector_search_matches_single_queries(self, index):
+        """Test batched scoring returns the same rankings as one-by-one search."""
+        # Given
+        queries = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.5, 0.5, 0.0]]
+
+        # When
+        batch = await index.search_similar_batch(queries, USER_ID, limit=2, threshold=0.0)
+
+        # Then
+        for query, results in zip(queries, batch):
+            single = await index.search_similar(query, USER_ID, limit=2, threshold=0.0)
+            assert [r.id for r in results] == [r.id for r in single]
+
+    @pytest.mark.asyncio
+    async def test_unknown_user_returns_nothing(self, index):
+        """Test searches are scoped to the requesting user."""
+        # When
+        results = await index.search_similar([1.0, 0.0, 0.0], "someone-else", 10, 0.0)
+
+        # Then
+        assert results == []
+
+
+class TestTombstones:
+    """Test cases for tombstoned deletes, upserts and compaction."""
+
+    @pytest.mark.asyncio
+    async def test_delete_tombstones_without_rebuilding(self, index):
+        """Test deletes only flag the row and searches skip it."""
+        # Given
+        user_index = index.user_index(USER_ID)
+        key, content_type, row = user_index.locations["n2"]
+        vectors = user_index.segments[key].vectors[content_type]
+
+        # When
+        await index.delete("n2")
+        similar = await index.search_similar([0.7, 0.3, 0.0], USER_ID, 10, 0.0)
+        batch = await index.search_similar_batch([[0.7, 0.3, 0.0]], USER_ID, 10, 0.0)
+        keywords = await index.full_text_search("shake", USER_ID, 10)
+
+        # Then
+        assert user_index.segments[key].vectors[content_type] is vectors
+        assert vectors.deleted[row]
+        assert user_index.tombstones == 1
+        assert "n2" not in [r.id for r in similar]
+        assert "n2" not in [r.id for r in batch[0]]
+        assert keywords == []
+        assert "n2" not in [r.id for r in index.export_user(USER_ID)]
+
+    @pytest.mark.asyncio
+    async def test_upsert_inserts_or_replaces(self, index):
+        """Test upsert stores new records and replaces existing ones."""
+        # When
+        inserted = await index.upsert(make_record("w3", "Rowing intervals", [0.0, 0.0, 1.0]))
+        replaced = await index.upsert(make_record("w1", "Incline press", [1.0, 0.0, 0.0]))
+
+        # Then
+        assert not inserted and replaced
+        assert [r.id for r in await index.full_text_search("rowing", USER_ID, 10)] == ["w3"]
+        assert [r.id for r in await index.full_text_search("incline", USER_ID, 10)] == ["w1"]
+        assert await index.full_text_search("push", USER_ID, 10) == []
+
+    @pytest.mark.asyncio
+    async def test_compaction_reclaims_rows(self, index):
+        """Test compaction drops tombstoned rows and keeps results identical."""
+        # Given
+        await index.delete("w2")
+        await index.delete("n1")
+        before = await index.full_text_search("protein bench", USER_ID, 10)
+
+        # When
+        reclaimed = await index.compact_user(USER_ID)
+        after = await index.full_text_search("protein bench", USER_ID, 10)
+
+        # Then
+        user_index = index.user_index(USER_ID)
+        assert reclaimed == 2
+        assert user_index.tombstones == 0
+        assert [r.id for r in after] == [r.id for r in before]
+        assert [r.score for r in after] == pytest.approx([r.score for r in before])
+        key, content_type, row = user_index.locations["n2"]
+        assert row == 0
+        assert len(user_index.segments[key].vectors[content_type]) == 1
+
+    @pytest.mark.asyncio
+    async def test_writes_during_compaction_are_kept(self, index):
+        """Test rows added and deleted while a copy is built survive the swap."""
+        # Given
+        await index.delete("w2")
+        original = asyncio.to_thread
+
+        async def with_concurrent_writes(func, *args):
+            result = await original(func, *args)
+            await index.store(make_record("w3", "Rowing intervals", [0.0, 0.0, 1.0]))
+            await index.delete("w1")
+            return result
+
+        # When
+        with patch("rag_service.indexes.asyncio.to_thread", with_concurrent_writes):
+            await index.compact_user(USER_ID)
+
+        # Then
+        assert [r.id for r in await index.full_text_search("rowing", USER_ID, 10)] == ["w3"]
+        assert [r.id for r in await index.full_text_search("bench", USER_ID, 10)] == ["n2"]
+        results = await index.search_similar([1.0, 0.0, 0.0], USER_ID, 10, 0.0)
+        assert "w1" not in [r.id for r in results]
+        assert "w3" in [r.id for r in results]
+
+    @pytest.mark.asyncio
+    async def test_compaction_is_scheduled_past_threshold(self):
+        """Test deletes trigger background compaction once enough rows are dead."""
+        # Given
+        index = InMemorySearchIndex(compaction_threshold=0.5, min_compaction_tombstones=2)
+        for i in range(4):
+            await index.store(make_record(f"w{i}", f"Session {i}", [1.0, float(i)]))
+
+        # When
+        await index.delete("w0")
+        scheduled_early = USER_ID in index._compactions
+        await index.delete("w1")
+        await asyncio.gather(*index._compactions.values())
+
+        # Then
+        assert not scheduled_early
+        assert index.user_index(USER_ID).tombstones == 0
+        assert len(index.user_index(USER_ID)) == 2
+
+    @pytest.mark.asyncio
+    async def test_cold_tombstones_do_not_schedule_compaction(self, tmp_path):
+        """Test deletes in frozen segments, which compaction skips, schedule nothing."""
+        # Given
+        index = InMemorySearchIndex(compaction_threshold=0.5, min_compaction_tombstones=2)
+        for i in range(4):
+            await index.store(make_record(f"w{i}", f"Session {i}", [1.0, float(i)]))
+        index.freeze_segments(datetime(2024, 3, 1), str(tmp_path))
+
+        # When
+        for i in range(3):
+            await index.delete(f"w{i}")
+
+        # Then
+        assert USER_ID not in index._compactions
+        assert index.user_index(USER_ID).tombstones == 3
+
+
+def test_tokenize():
+    """Test tokenization lowercases and strips punctuation."""
+    assert tokenize("Push-ups, 3x10!") == ["push", "ups", "3x10"]
+
+
+def test_build_query_context():
+    """Test query contexts carry terms with stable ids."""
+    # When
+    context = build_query_context("  Leg   DAY ", embedding=[0.1, 0.2], model_name="test")
+
+    # Then
+    assert context.normalized == "leg day"
+    assert context.terms == ["leg", "day"]
+    assert context.token_ids == [term_id("leg"), term_id("day")]
+    assert context.embedding == [0.1, 0.2]
+
+
+class TestTimePartitionedIndex:
+    """Test cases for time partitions, date ranges and recency decay."""
+
+    @pytest.fixture
+    async def history(self):
+        """Provide an index with one workout per month in 2024."""
+        index = InMemorySearchIndex()
+        for month in range(1, 7):
+            record = make_record(f"m{month}", f"Run month {month}", [1.0, 0.0])
+            record.created_at = datetime(2024, month, 10)
+            await index.store(record)
+        return index
+
+    @pytest.mark.asyncio
+    async def test_records_are_partitioned_by_month(self, history):
+        """Test each month gets its own segment."""
+        # Then
+        assert sorted(history.user_index(USER_ID).segments) == [
+            "2024-01", "2024-02", "2024-03", "2024-04", "2024-05", "2024-06"
+        ]
+
+    @pytest.mark.asyncio
+    async def test_date_range_only_scans_overlapping_segments(self, history):
+        """Test since/until prune segments and filter rows at the edges."""
+        # Given
+        user_index = history.user_index(USER_ID)
+        filters = SearchFilter(since=datetime(2024, 5, 1), until=datetime(2024, 6, 5))
+        old = user_index.segments["2024-01"].vectors[ContentType.WORKOUT]
+
+        with patch.object(old, "search") as old_search:
+            # When
+            results = await history.search_similar([1.0, 0.0], USER_ID, 10, 0.0, filters=filters)
+            keyword_results = await history.full_text_search("run", USER_ID, 10, filters=filters)
+
+        # Then
+        old_search.assert_not_called()
+        assert [r.id for r in results] == ["m5"]
+        assert [r.id for r in keyword_results] == ["m5"]
+
+    @pytest.mark.asyncio
+    async def test_recency_decay_prefers_recent_records(self, history):
+        """Test recency decay ranks newer records above equally similar old ones."""
+        # Given
+        now = datetime(2024, 6, 20).timestamp()
+
+        # When
+        results = history.user_index(USER_ID).search_vectors(
+            [1.0, 0.0], limit=2, threshold=0.0,
+            recency_half_life_days=14, now=now
+        )
+
+        # Then
+        assert [r.id for r in results] == ["m6", "m5"]
+        assert results[0].score > results[1].score
+
+    @pytest.mark.asyncio
+    async def test_frozen_segments_are_memory_mapped(self, history, tmp_path):
+        """Test old segments can be kept cold on disk and still searched."""
+        # When
+        frozen = history.freeze_segments(datetime(2024, 3, 1), str(tmp_path))
+        results = await history.search_similar(
+            [1.0, 0.0], USER_ID, 10, 0.0,
+            filters=SearchFilter(until=datetime(2024, 1, 31))
+        )
+
+        # Then
+        assert frozen == 2
+        segment = history.user_index(USER_ID).segments["2024-01"]
+        assert segment.cold
+        assert isinstance(segment.vectors[ContentType.WORKOUT].matrix, np.memmap)
+        assert [r.id for r in results] == ["m1"]
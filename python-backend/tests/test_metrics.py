@@ -0,0 +1,82 @@
+"""
+Unit tests for Prometheus metrics.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from rag_service.api import metrics_router
+from rag_service.cache import TTLCache
+from rag_service.metrics import record_batch, record_fallback, track_garmin, track_stage
+
+
+def sample(name, **labels):
+    """Read a metric sample, treating an unseen series as zero."""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics:
+    """Test cases for stage timers and counters."""
+
+    def test_stage_timer_observes_latency(self):
+        """Test a timed stage adds one observation to its histogram."""
+        # Given
+        before = sample("rag_stage_latency_seconds_count", stage="test_stage")
+
+        # When
+        with track_stage("test_stage"):
+            pass
+
+        # Then
+        assert sample("rag_stage_latency_seconds_count", stage="test_stage") == before + 1
+
+    def test_garmin_timer_labels_failures(self):
+        """Test a raising Garmin call is recorded with the error outcome."""
+        # Given
+        before = sample("garmin_call_latency_seconds_count", call="login", outcome="error")
+
+        # When
+        with pytest.raises(RuntimeError):
+            with track_garmin("login"):
+                raise RuntimeError("401 Unauthorized")
+
+        # Then
+        assert sample(
+            "garmin_call_latency_seconds_count", call="login", outcome="error"
+        ) == before + 1
+
+    @pytest.mark.asyncio
+    async def test_cache_lookups_are_counted_per_cache(self):
+        """Test hits and misses are labelled with the cache name."""
+        # Given
+        cache = TTLCache(name="test_cache")
+        hits = sample("rag_cache_lookups_total", cache="test_cache", result="hit")
+        misses = sample("rag_cache_lookups_total", cache="test_cache", result="miss")
+
+        # When
+        await cache.get("key")
+        await cache.set("key", "value")
+        await cache.get("key")
+
+        # Then
+        assert sample("rag_cache_lookups_total", cache="test_cache", result="hit") == hits + 1
+        assert sample("rag_cache_lookups_total", cache="test_cache", result="miss") == misses + 1
+
+    def test_metrics_endpoint_serves_prometheus_text(self):
+        """Test /metrics exposes the registered metrics in the text format."""
+        # Given
+        app = FastAPI()
+        app.include_router(metrics_router)
+        record_batch("test-model", 8)
+        record_fallback("test")
+
+        # When
+        response = TestClient(app).get("/metrics")
+
+        # Then
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'rag_inference_batch_size_count{model="test-model"}' in response.text
+        assert 'rag_fallbacks_total{component="test"}' in response.text
@@ -0,0 +1,129 @@
+"""
+Unit tests for token-budgeted context packing.
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from rag_service.interfaces import ContentType, RAGContext
+from rag_service.packing import ContextPacker, TokenCounter, split_sentences
+
+
+def whitespace_tokenizer(texts):
+    """One token per whitespace-separated word."""
+    return [text.split() for text in texts]
+
+
+def make_item(content, relevance, content_type=ContentType.WORKOUT):
+    """Build a context item."""
+    return RAGContext(
+        source="test",
+        content=content,
+        relevance=relevance,
+        content_type=content_type,
+        metadata={}
+    )
+
+
+def words(n, word="rep"):
+    """A sentence of n words."""
+    return " ".join([word] * (n - 1) + [word + "."])
+
+
+@pytest.fixture
+def packer():
+    """Provide a packer counting whitespace tokens."""
+    return ContextPacker(counter=TokenCounter(whitespace_tokenizer), min_trim_tokens=2)
+
+
+class TestTokenCounter:
+    """Test cases for cached token counting."""
+
+    def test_counts_are_cached_per_content(self):
+        """Test repeated texts are tokenized once, misses in one batch."""
+        # Given
+        tokenizer = Mock(side_effect=whitespace_tokenizer)
+        counter = TokenCounter(tokenizer)
+
+        # When
+        first = counter.count(["heavy squats today", "easy run"])
+        second = counter.count(["easy run", "tempo run at threshold"])
+
+        # Then
+        assert first == [3, 2]
+        assert second == [2, 4]
+        assert tokenizer.call_count == 2
+        assert tokenizer.call_args[0][0] == ["tempo run at threshold"]
+
+
+class TestContextPacker:
+    """Test cases for the token-budget knapsack."""
+
+    def test_fits_budget_by_relevance_per_token(self, packer):
+        """Test short relevant items beat a long one and ranked order is kept."""
+        # Given
+        context = [
+            make_item(words(4), 0.9),
+            make_item(words(10), 0.8),
+            make_item(words(3), 0.7),
+            make_item(words(3), 0.6),
+        ]
+
+        # When
+        packed, total = packer.pack(context, token_budget=10)
+
+        # Then
+        assert [c.relevance for c in packed] == [0.9, 0.7, 0.6]
+        assert total == 10
+
+    def test_type_cap_leaves_room_for_other_types(self, packer):
+        """Test one content type cannot take the whole budget."""
+        # Given
+        packer.max_type_share = 0.5
+        context = [
+            make_item(words(2), 0.9),
+            make_item(words(2), 0.85),
+            make_item(words(2), 0.8),
+            make_item(words(3), 0.5, ContentType.NUTRITION),
+        ]
+
+        # When
+        packed, _ = packer.pack(context, token_budget=8)
+
+        # Then
+        types = [c.content_type for c in packed]
+        assert types.count(ContentType.WORKOUT) == 2
+        assert ContentType.NUTRITION in types
+
+    def test_trims_at_sentence_boundaries(self, packer):
+        """Test an item that does not fit keeps only its leading sentences."""
+        # Given
+        context = [
+            make_item(words(4), 0.9),
+            make_item(f"{words(3, 'squat')} {words(3, 'lunge')} {words(3, 'press')}", 0.8),
+        ]
+
+        # When
+        packed, total = packer.pack(context, token_budget=10)
+
+        # Then
+        assert packed[1].content == f"{words(3, 'squat')} {words(3, 'lunge')}"
+        assert packed[1].metadata["truncated"] is True
+        assert total == 10
+
+    def test_top_item_is_never_dropped(self, packer):
+        """Test the top item is trimmed rather than dropped when it overflows."""
+        # Given
+        context = [make_item(f"{words(5)} {words(5)}", 0.9), make_item(words(2), 0.1)]
+
+        # When
+        packed, total = packer.pack(context, token_budget=6)
+
+        # Then
+        assert packed[0].relevance == 0.9
+        assert packed[0].content == words(5)
+        assert total <= 6
+
+    def test_split_sentences(self):
+        """Test sentences keep their punctuation."""
+        assert split_sentences("Squats. Then lunges! Rest? ") == ["Squats.", "Then lunges!", "Rest?"]
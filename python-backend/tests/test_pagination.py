@@ -0,0 +1,64 @@
+"""
+Unit tests for search result pagination.
+"""
+
+import pytest
+
+from rag_service.interfaces import ContentType, SearchResult
+from rag_service.pagination import PageCursor, rank_order, resume_index
+
+
+def make_result(record_id, score):
+    """Build a search result with a stable id."""
+    return SearchResult(
+        id=record_id,
+        content=f"content {record_id}",
+        content_type=ContentType.WORKOUT,
+        score=score,
+        metadata={},
+        source="db",
+        timestamp="2024-01-15"
+    )
+
+
+class TestPageCursor:
+    """Test cases for page cursors."""
+
+    def test_cursor_round_trip(self):
+        """Test cursors decode to what was encoded."""
+        # Given
+        cursor = PageCursor(version=3, request_hash="abc", offset=20, key="w-17")
+
+        # When
+        token = cursor.encode()
+
+        # Then
+        assert "=" not in token
+        assert PageCursor.decode(token) == cursor
+
+    @pytest.mark.parametrize("token", ["not a cursor", "", "W10", "eyJhIjoxfQ"])
+    def test_malformed_cursor_raises(self, token):
+        """Test garbage tokens are rejected."""
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            PageCursor.decode(token)
+
+
+def test_rank_order_breaks_ties_by_id():
+    """Test equal scores are ordered by record id."""
+    # Given
+    results = [make_result("b", 0.5), make_result("c", 0.9), make_result("a", 0.5)]
+
+    # Then
+    assert [r.id for r in rank_order(results)] == ["c", "a", "b"]
+
+
+def test_resume_index_skips_returned_results():
+    """Test pages resume at the offset, or after the last result if the ranking moved."""
+    # Given
+    results = rank_order([make_result(i, s) for i, s in [("a", 0.9), ("b", 0.7), ("d", 0.7), ("e", 0.1)]])
+
+    # Then
+    assert resume_index(results, 2, "b") == 2
+    assert resume_index(results, 1, "b") == 2
+    assert resume_index(results, 3, "c") == 3
+    assert resume_index(results, 9, "z") == 4
@@ -0,0 +1,167 @@
+"""
+Unit tests for event-driven coaching context prefetch.
+"""
+
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+
+from rag_service.container import PipelineContainer, set_container
+from rag_service.interfaces import ContentType, Embedding
+from rag_service.main import index_user_records
+from rag_service.prefetch import CANONICAL_QUERIES, ContextPrefetcher, PrefetchQueue
+from rag_service.search import SearchService
+
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def make_record(record_id, content_type=ContentType.WORKOUT):
+    """Build an embedding record."""
+    return Embedding(
+        id=record_id,
+        user_id=USER_ID,
+        content="Heavy squats",
+        content_type=content_type,
+        embedding_vector=[1.0, 0.0],
+        model_name="test",
+        dimension=2,
+        metadata={},
+        created_at=datetime(2024, 1, 15),
+    )
+
+
+def make_prefetcher():
+    """Wire a prefetcher to a search service's writes."""
+    service = SearchService()
+    compute = AsyncMock(side_effect=lambda query, user_id: {"query": query, "user_id": user_id})
+    prefetcher = ContextPrefetcher(compute, service.versions, debounce_seconds=0.01)
+    service.write_listeners.append(prefetcher.on_write)
+    return service, prefetcher, compute
+
+
+class TestPrefetchQueue:
+    """Test cases for the debounced per-user job queue."""
+
+    @pytest.mark.asyncio
+    async def test_burst_of_writes_runs_once(self):
+        """Test scheduling a user repeatedly runs one job after the quiet period."""
+        # Given
+        job = AsyncMock()
+        queue = PrefetchQueue(job, debounce_seconds=0.01)
+
+        # When
+        for _ in range(5):
+            queue.schedule(USER_ID)
+        await queue.drain()
+
+        # Then
+        job.assert_awaited_once_with(USER_ID)
+        assert queue.stats()["coalesced"] == 4
+        assert queue.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_write_during_job_runs_again(self):
+        """Test a write landing mid-job schedules exactly one more run."""
+        # Given
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def job(user_id):
+            started.set()
+            await release.wait()
+
+        queue = PrefetchQueue(job, debounce_seconds=0.0)
+        queue.schedule(USER_ID)
+        await started.wait()
+
+        # When
+        queue.schedule(USER_ID)
+        queue.schedule(USER_ID)
+        release.set()
+        await queue.drain()
+
+        # Then
+        assert queue.completed == 2
+
+
+class TestContextPrefetcher:
+    """Test cases for prefetching coaching contexts on writes."""
+
+    @pytest.mark.asyncio
+    async def test_write_prefetches_canonical_contexts(self):
+        """Test the chat request after a workout write is a cache hit."""
+        # Given
+        service, prefetcher, compute = make_prefetcher()
+
+        # When
+        await service.index_record(make_record("w1"))
+        await prefetcher.queue.drain()
+        compute.reset_mock()
+        context = await prefetcher.get(CANONICAL_QUERIES[0], USER_ID)
+
+        # Then
+        compute.assert_not_awaited()
+        assert context == {"query": CANONICAL_QUERIES[0], "user_id": USER_ID}
+
+    @pytest.mark.asyncio
+    async def test_later_write_hides_prefetched_contexts(self):
+        """Test contexts computed before a write are never served after it."""
+        # Given
+        service, prefetcher, compute = make_prefetcher()
+        await service.index_record(make_record("w1"))
+        await prefetcher.queue.drain()
+        compute.reset_mock()
+
+        # When
+        await service.index_record(make_record("w2"))
+        await prefetcher.get(CANONICAL_QUERIES[0], USER_ID)
+
+        # Then
+        compute.assert_awaited_once()
+        await prefetcher.close()
+
+    @pytest.mark.asyncio
+    async def test_unrelated_writes_do_not_prefetch(self):
+        """Test content that does not shape coaching context schedules nothing."""
+        # Given
+        service, prefetcher, compute = make_prefetcher()
+
+        # When
+        await service.index_record(make_record("c1", ContentType.CONVERSATION))
+
+        # Then
+        assert prefetcher.queue.pending == 0
+        compute.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_ingested_records_prefetch_through_the_container(self):
+        """Test records ingested for a user reach the index and schedule their prefetch."""
+        # Given
+        pipeline = Mock()
+        pipeline.search_service = SearchService(embedding_service=Mock())
+        pipeline.cleanup = AsyncMock()
+        container = PipelineContainer(pipeline=pipeline)
+        container.embedding_service.generate_batch = AsyncMock(
+            return_value=[([1.0, 0.0], "test"), ([0.0, 1.0], "test")]
+        )
+        previous = set_container(container)
+        records = [
+            {"id": "garmin-1", "content": "Morning run, 5.00 km"},
+            {"id": "garmin-2", "content": "Evening ride, 20.00 km"},
+        ]
+
+        try:
+            # When
+            indexed = await index_user_records(USER_ID, ContentType.ACTIVITY, records)
+            indexed_again = await index_user_records(USER_ID, ContentType.ACTIVITY, records)
+
+            # Then
+            assert indexed == indexed_again == 2
+            assert container.prefetcher.queue.pending == 1
+            results = await container.search_service.index.search_similar([1.0, 0.0], USER_ID, 10, 0.0)
+            assert sorted(r.id for r in results) == ["garmin-1", "garmin-2"]
+        finally:
+            set_container(previous)
+            await container.prefetcher.close()
@@ -11,9 +11,14 @@ from typing import List
 # These imports will fail initially (TDD - Red phase)
 from rag_service.reranking import (
     CrossEncoderReranker,
+    LexicalReranker,
+    RerankGate,
     RerankService,
+    plan_batches,
     rerank_results,
 )
+from rag_service.cache import PairScoreCache, TokenCache
+from rag_service.indexes import build_query_context, tokenize
 from rag_service.interfaces import (
     RerankRequest,
     RerankResponse,
@@ -157,6 +162,154 @@ class TestCrossEncoderReranker:
             assert min(scores) == 0.0  # Lowest score normalized to 0
 
 
+class TestLengthSortedBatching:
+    """Test cases for token-budgeted rerank batches."""
+
+    def test_plan_batches_groups_similar_lengths(self):
+        """Test batches are length-sorted and respect the padded token budget."""
+        # Given
+        lengths = [10, 200, 12, 190, 11, 50]
+
+        # When
+        batches = plan_batches(lengths, max_batch_tokens=400, max_batch_size=16)
+
+        # Then
+        assert batches == [[1, 3], [5, 2, 4, 0]]
+        for batch in batches:
+            assert len(batch) * max(lengths[i] for i in batch) <= 400
+
+    @pytest.mark.asyncio
+    async def test_scores_are_restored_to_candidate_order(self):
+        """Test mixed-length candidates are scored in sorted batches but returned in order."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            reranker = CrossEncoderReranker(batch_size=16, max_batch_tokens=512)
+        reranker.model = Mock()
+        reranker.model.predict.side_effect = lambda pairs, **kwargs: np.array(
+            [float(len(text)) for _, text in pairs]
+        )
+        candidates = [("squat " * (i % 7 * 20 + 1)).strip() for i in range(40)]
+
+        # When
+        scores = await reranker.score_pairs_raw("leg day", candidates)
+
+        # Then
+        assert scores == [float(len(c)) for c in candidates]
+        calls = reranker.model.predict.call_args_list
+        assert 1 < len(calls) < 40
+        for call in calls:
+            pairs = call.args[0]
+            assert call.kwargs["batch_size"] == len(pairs)
+            batch_lengths = [len(text) for _, text in pairs]
+            assert batch_lengths == sorted(batch_lengths, reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_queries_share_batches(self):
+        """Test candidates of several queries are scored in one model call."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            reranker = CrossEncoderReranker(batch_size=16, score_cache=PairScoreCache())
+        reranker.model = Mock(spec=["predict"])
+        reranker.model.predict.side_effect = lambda pairs, **kwargs: np.array(
+            [float(len(query) + len(text)) for query, text in pairs]
+        )
+        groups = [("run", ["easy run", "tempo"]), ("leg day", ["squats", "lunges", "rest"])]
+
+        # When
+        reranked = await reranker.rerank_groups([(q, c, 2) for q, c in groups])
+        cached = await reranker.score_pairs_raw("leg day", ["squats", "rest"])
+
+        # Then
+        assert reranker.model.predict.call_count == 1
+        assert len(reranker.model.predict.call_args.args[0]) == 5
+        assert [r.content for r in reranked[0]] == ["easy run", "tempo"]
+        assert [r.content for r in reranked[1]] == ["squats", "lunges"]
+        assert cached == [13.0, 11.0]
+
+    @pytest.mark.asyncio
+    async def test_groups_keep_every_candidate_without_a_model(self):
+        """Test grouped reranking without a model keeps all candidates in order."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            reranker = CrossEncoderReranker()
+        reranker.model = None
+        candidates = ["squats", "lunges", "deadlifts", "rest", "tempo run"]
+
+        # When
+        scores = await reranker.score_groups_raw([("leg day", candidates)])
+        reranked = await reranker.rerank_groups([("leg day", candidates, 5)])
+
+        # Then
+        assert scores == [[0.5] * 5]
+        assert [r.content for r in reranked[0]] == candidates
+
+
+    def test_detached_scoring_uses_its_own_model(self):
+        """Test worker-thread scoring never shares the request path's model."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            reranker = CrossEncoderReranker()
+        reranker.model = Mock()
+        shadow_model = Mock()
+        shadow_model.predict.return_value = np.array([0.2, 0.8])
+
+        # When
+        with patch.object(reranker, '_build_model', return_value=shadow_model) as build:
+            first = reranker.predict_detached("leg day", ["rest", "squats"])
+            reranker.predict_detached("leg day", ["rest", "squats"])
+
+        # Then
+        assert first == [0.2, 0.8]
+        build.assert_called_once()
+        assert shadow_model.predict.call_count == 2
+        reranker.model.predict.assert_not_called()
+
+
+class TestPairScoreCache:
+    """Test cases for pair-level score caching."""
+
+    @pytest.mark.asyncio
+    async def test_only_new_pairs_are_scored(self):
+        """Test overlapping candidate sets reuse cached pair scores."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            service = RerankService(enable_cache=True)
+        service.reranker.model = Mock(spec=["predict"])
+        service.reranker.model.predict.side_effect = lambda pairs, **kwargs: np.array(
+            [float(len(text)) for _, text in pairs]
+        )
+
+        # When
+        first = await service.rerank_with_cache("leg day", ["squats", "lunges", "rest"], top_k=3)
+        second = await service.rerank_with_cache("leg day", ["squats", "deadlifts", "lunges"], top_k=2)
+
+        # Then
+        scored = [
+            text for call in service.reranker.model.predict.call_args_list
+            for _, text in call.args[0]
+        ]
+        assert sorted(scored) == ["deadlifts", "lunges", "rest", "squats"]
+        assert [r.content for r in first] == ["squats", "lunges", "rest"]
+        assert [r.content for r in second] == ["deadlifts", "squats"]
+        assert service.score_cache.stats()["hits"] == 2
+
+    def test_cache_is_keyed_by_model_and_query(self):
+        """Test scores are not shared across models or queries."""
+        # Given
+        cache = PairScoreCache()
+        cache.store("model-a", "leg day", ["squats"], [1.5])
+
+        # When
+        hits = cache.lookup("model-a", "leg day", ["squats", "lunges"])
+        other_model = cache.lookup("model-b", "leg day", ["squats"])
+        other_query = cache.lookup("model-a", "arm day", ["squats"])
+
+        # Then
+        assert hits == [1.5, None]
+        assert other_model == [None]
+        assert other_query == [None]
+
+
 class TestRerankService:
     """Test cases for the main rerank service."""
 
@@ -226,6 +379,30 @@ class TestRerankService:
                 assert len(results) == 2
                 mock_fallback.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_fallback_reuses_query_context_terms(self):
+        """Test the fallback scorer uses the request's pre-tokenized query."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            service = RerankService()
+        context = build_query_context("Leg day")
+        request = RerankRequest(
+            query="Leg day",
+            candidates=["Upper body push", "Leg day squats"],
+            user_id="00000000-0000-0000-0000-000000000001",
+            top_k=1
+        )
+
+        with patch.object(service.reranker, 'rerank', side_effect=Exception("Model error")), \
+                patch("rag_service.reranking.tokenize", wraps=tokenize) as mock_tokenize:
+            # When
+            response = await service.process_request(request, query_context=context)
+
+        # Then
+        assert [r.content for r in response.reranked] == ["Leg day squats"]
+        tokenized = [call.args[0] for call in mock_tokenize.call_args_list]
+        assert "Leg day" not in tokenized
+
     @pytest.mark.asyncio
     async def test_rerank_caching(self):
         """Test caching of rerank results."""
@@ -299,6 +476,324 @@ class TestRerankService:
                 await service.rerank_with_validation(query, candidates, top_k=1)
 
 
+class FakeTokenizer:
+    """Word-level tokenizer with BERT-style special tokens."""
+
+    model_input_names = ["input_ids", "token_type_ids", "attention_mask"]
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, add_special_tokens=True):
+        self.calls.append(list(texts))
+        return {"input_ids": [[len(word) + 10 for word in text.split()] for text in texts]}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 3 if pair else 2
+
+    def build_inputs_with_special_tokens(self, first, second):
+        return [1] + first + [2] + second + [2]
+
+    def create_token_type_ids_from_sequences(self, first, second):
+        return [0] * (len(first) + 2) + [1] * (len(second) + 1)
+
+    def pad(self, features, padding=True, return_tensors="pt"):
+        import torch
+        width = max(len(ids) for ids in features["input_ids"])
+        padded = {
+            name: torch.tensor([ids + [0] * (width - len(ids)) for ids in rows])
+            for name, rows in features.items()
+        }
+        padded["attention_mask"] = torch.tensor([
+            [1] * len(ids) + [0] * (width - len(ids)) for ids in features["input_ids"]
+        ])
+        return padded
+
+
+class FakeCrossEncoder:
+    """Cross-encoder whose logit is the number of document tokens."""
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.max_length = 16
+        self.model = self
+
+    def __call__(self, input_ids, token_type_ids, attention_mask, return_dict=True):
+        document_tokens = (token_type_ids * attention_mask).sum(dim=1, keepdim=True) - 1
+        return Mock(logits=document_tokens.float())
+
+
+class TestPretokenizedScoring:
+    """Test cases for scoring from cached document token ids."""
+
+    @pytest.mark.asyncio
+    async def test_documents_are_tokenized_once(self):
+        """Test repeated reranks only tokenize the query."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            reranker = CrossEncoderReranker(token_cache=TokenCache())
+        reranker.model = FakeCrossEncoder()
+        candidates = ["easy run", "long slow run today", "rest"]
+
+        # When
+        first = await reranker.score_pairs_raw("run", candidates)
+        second = await reranker.score_pairs_raw("long run", candidates)
+
+        # Then
+        assert first == [2.0, 4.0, 1.0]
+        assert second == first
+        documents = [text for call in reranker.model.tokenizer.calls for text in call]
+        assert sorted(documents) == sorted(["run", "long run"] + candidates)
+        assert reranker.token_cache.stats()["misses"] == 3
+
+    @pytest.mark.asyncio
+    async def test_batches_are_planned_by_token_length(self):
+        """Test the batch budget counts tokenizer tokens, not characters."""
+        # Given
+        on_batch = Mock()
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            reranker = CrossEncoderReranker(
+                max_batch_tokens=40, token_cache=TokenCache(), on_batch=on_batch
+            )
+        reranker.model = FakeCrossEncoder()
+        # Five long words: over 25 tokens by characters, 5 by the tokenizer
+        candidates = [" ".join(["supercalifragilistic"] * 5)] * 4
+
+        # When
+        await reranker.score_pairs_raw("run", candidates)
+
+        # Then
+        on_batch.assert_called_once()
+        assert on_batch.call_args.args[0] == 4
+
+    @pytest.mark.asyncio
+    async def test_long_documents_are_truncated_to_model_length(self):
+        """Test query plus document ids never exceed the model's limit."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            reranker = CrossEncoderReranker(token_cache=TokenCache())
+        reranker.model = FakeCrossEncoder()
+
+        # When
+        scores = await reranker.score_pairs_raw("long run", ["run " * 40, "rest"])
+
+        # Then
+        assert scores == [16.0 - 3 - 2, 1.0]
+
+    def test_token_cache_resets_when_full(self):
+        """Test the buffer is replaced once the token budget is used up."""
+        # Given
+        cache = TokenCache(max_tokens=5)
+        kept = cache.put("a", [1, 2, 3])
+
+        # When
+        cache.put("b", [4, 5, 6])
+
+        # Then
+        assert cache.get("a") is None
+        assert cache.get("b").tolist() == [4, 5, 6]
+        assert kept.tolist() == [1, 2, 3]
+        assert cache.stats()["resets"] == 1
+
+
+class TestLexicalReranker:
+    """Test cases for the vectorized lexical reranker."""
+
+    def test_jaccard_matches_set_overlap(self):
+        """Test sparse Jaccard scores equal plain set overlap."""
+        # Given
+        reranker = LexicalReranker(method="jaccard")
+        candidates = ["Leg day squats", "squats squats and lunges", "Rest", ""]
+        query_terms = tokenize("leg day lunges")
+
+        # When
+        scores = reranker.score(query_terms, candidates)
+
+        # Then
+        for candidate, score in zip(candidates, scores):
+            terms = set(tokenize(candidate))
+            union = terms | set(query_terms)
+            assert score == pytest.approx(len(terms & set(query_terms)) / len(union))
+
+    def test_bm25_prefers_rare_terms(self):
+        """Test BM25 weights rare query terms above common ones."""
+        # Given
+        reranker = LexicalReranker(method="bm25")
+        candidates = ["protein shake", "protein oats", "protein bar", "deadlift protein"]
+
+        # When
+        scores = reranker.score(["deadlift", "protein"], candidates)
+
+        # Then
+        assert int(np.argmax(scores)) == 3
+        assert scores[0] == pytest.approx(scores[1])
+
+    @pytest.mark.asyncio
+    async def test_rerank_builds_only_top_k_results(self):
+        """Test only the top-k candidates become result objects, scaled to [0, 1]."""
+        # Given
+        reranker = LexicalReranker()
+        candidates = [f"run {i}" for i in range(50)] + ["tempo run intervals"]
+
+        # When
+        results = await reranker.rerank("tempo intervals", candidates, top_k=3)
+
+        # Then
+        assert len(results) == 3
+        assert results[0].original_rank == 50
+        assert results[0].relevance_score == 1.0
+        assert all(0.0 <= r.relevance_score <= 1.0 for r in results)
+
+
+class TestCascadeReranking:
+    """Test cases for two-stage cascade reranking."""
+
+    @pytest.fixture
+    def service(self):
+        """Provide a service whose cross-encoder scores by candidate length."""
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            service = RerankService(enable_cache=False, cascade_top_n=3)
+        service.reranker.model = Mock(spec=["predict"])
+        service.reranker.model.predict.side_effect = lambda pairs, **kwargs: np.array(
+            [float(len(text)) for _, text in pairs]
+        )
+        return service
+
+    @pytest.mark.asyncio
+    async def test_lexical_stage_prunes_before_cross_encoder(self, service):
+        """Test only the top lexical candidates reach the cross-encoder."""
+        # Given
+        candidates = ["leg day squats", "arm curls", "leg press", "bench press", "leg day lunges and squats"]
+        request = RerankRequest(
+            query="leg day",
+            candidates=candidates,
+            user_id="00000000-0000-0000-0000-000000000001",
+            top_k=2,
+            cascade=True
+        )
+
+        # When
+        response = await service.process_request(request)
+
+        # Then
+        scored = [text for call in service.reranker.model.predict.call_args_list for _, text in call.args[0]]
+        assert sorted(scored) == sorted(["leg day squats", "leg press", "leg day lunges and squats"])
+        assert [r.original_rank for r in response.reranked] == [4, 0]
+        assert [(s.name, s.candidates_in, s.candidates_out) for s in response.stages] == [
+            ("lexical", 5, 3), ("cross_encoder", 3, 2)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_precomputed_scores_drive_first_stage(self, service):
+        """Test search scores can replace the lexical stage."""
+        # When
+        results, stages = await service.cascade_rerank(
+            "leg day", ["a", "bb", "ccc", "dddd"], top_k=1,
+            first_stage_scores=[0.9, 0.1, 0.8, 0.7]
+        )
+
+        # Then
+        assert stages[0].name == "precomputed"
+        assert [r.content for r in results] == ["dddd"]
+        assert results[0].original_rank == 3
+
+    def test_cascade_size_follows_budget_and_pair_cost(self, service):
+        """Test the cross-encoder stage shrinks as pairs get more expensive."""
+        # Given
+        service.pair_cost_ms = 5.0
+
+        # Then
+        assert service.cascade_size(40, top_k=5, latency_budget_ms=100.0) == 20
+        assert service.cascade_size(40, top_k=5, latency_budget_ms=100.0, spent_ms=90.0) == 5
+        assert service.cascade_size(10, top_k=5, latency_budget_ms=1000.0) == 10
+        assert service.cascade_size(40, top_k=5, latency_budget_ms=None) == 5
+
+    @pytest.mark.asyncio
+    async def test_pair_cost_is_measured(self, service):
+        """Test the per-pair cost estimate tracks observed cross-encoder time."""
+        # Given
+        service.pair_cost_ms = 1000.0
+
+        # When
+        await service.cascade_rerank("leg day", ["a", "bb", "ccc"], top_k=3, latency_budget_ms=50.0)
+
+        # Then
+        assert service.pair_cost_ms < 1000.0
+
+    @pytest.mark.asyncio
+    async def test_cached_pairs_do_not_lower_pair_cost(self):
+        """Test pairs served from the score cache are not counted as model work."""
+        # Given
+        with patch.object(CrossEncoderReranker, '_load_model'):
+            service = RerankService(cascade_top_n=3)
+        service.reranker.model = Mock(spec=["predict"])
+        service.reranker.model.predict.side_effect = lambda pairs, **kwargs: np.array(
+            [float(len(text)) for _, text in pairs]
+        )
+        await service.cascade_rerank("leg day", ["a", "bb", "ccc"], top_k=3)
+        service.pair_cost_ms = 1000.0
+
+        # When
+        await service.cascade_rerank("leg day", ["a", "bb", "ccc"], top_k=3)
+
+        # Then
+        assert service.reranker.model.predict.call_count == 1
+        assert service.pair_cost_ms == 1000.0
+
+
+class TestRerankGate:
+    """Test cases for adaptive rerank skipping."""
+
+    def test_confident_ranking_skips_rerank(self):
+        """Test a wide top-k margin with peaked scores skips the reranker."""
+        # Given
+        gate = RerankGate(min_gap=0.25, max_entropy=0.6)
+
+        # When
+        rerank, features = gate.should_rerank([0.95, 0.9, 0.2, 0.15, 0.1, 0.05], top_k=2)
+
+        # Then
+        assert not rerank
+        assert features["gap"] == pytest.approx(0.7 / 0.95)
+        assert gate.stats()["skip_rate"] == 1.0
+
+    def test_flat_ranking_is_reranked(self):
+        """Test a flat score distribution still goes through the reranker."""
+        # Given
+        gate = RerankGate()
+
+        # When
+        rerank, features = gate.should_rerank([0.52, 0.51, 0.5, 0.5, 0.49, 0.48], top_k=3)
+
+        # Then
+        assert rerank
+        assert features["entropy"] > gate.max_entropy
+
+    def test_few_candidates_skip_rerank(self):
+        """Test too few candidates are never reranked."""
+        # Given
+        gate = RerankGate(min_candidates=3)
+
+        # Then
+        assert gate.should_rerank([0.5, 0.49], top_k=2)[0] is False
+
+    def test_shadow_comparisons_track_agreement(self):
+        """Test shadow reranks record how often skipping changed the result."""
+        # Given
+        gate = RerankGate()
+        features = {"count": 4, "gap": 0.5, "entropy": 0.2}
+
+        # When
+        gate.record_shadow(["a", "b"], ["a", "b", "c"], features)
+        gate.record_shadow(["a", "b"], ["c", "a", "b"], features)
+
+        # Then
+        stats = gate.stats()
+        assert stats["shadow_comparisons"] == 2
+        assert stats["shadow_agreement"] == pytest.approx(0.75)
+        assert stats["shadow_same_top"] == pytest.approx(0.5)
+
+
 class TestRerankIntegration:
     """Integration tests for reranking functionality."""
 
@@ -7,6 +7,7 @@ import pytest
 import numpy as np
 from unittest.mock import Mock, patch, AsyncMock
 from typing import List, Dict
+from datetime import datetime
 
 # These imports will fail initially (TDD - Red phase)
 from rag_service.search import (
@@ -15,12 +16,16 @@ from rag_service.search import (
     HybridSearch,
     SearchService,
 )
+from rag_service.cache import SemanticQueryCache
+from rag_service.indexes import build_query_context
 from rag_service.interfaces import (
+    BatchSearchRequest,
     HybridSearchRequest,
     HybridSearchResponse,
     SearchResult,
     SearchStrategy,
     ContentType,
+    Embedding,
 )
 
 
@@ -461,6 +466,305 @@ class TestSearchService:
             mock_search.assert_called_once()  # Only called once due to cache
             cache_mock.set.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_content_type_filter_pushed_down(self):
+        """Test narrow content type requests are filtered inside the engine."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService()
+        for i in range(5):
+            await service.index.store(Embedding(
+                id=f"workout-{i}", user_id=user_id, content=f"Workout {i}",
+                content_type=ContentType.WORKOUT, embedding_vector=[1.0, 0.0],
+                model_name="test", dimension=2, metadata={}, created_at=datetime(2024, 1, 15)
+            ))
+        await service.index.store(Embedding(
+            id="meal-1", user_id=user_id, content="Protein oats",
+            content_type=ContentType.NUTRITION, embedding_vector=[0.5, 0.5],
+            model_name="test", dimension=2, metadata={}, created_at=datetime(2024, 1, 15)
+        ))
+        request = HybridSearchRequest(
+            query="protein",
+            user_id=user_id,
+            search_type=SearchStrategy.SEMANTIC,
+            limit=2,
+            threshold=0.0,
+            content_types=[ContentType.NUTRITION]
+        )
+
+        with patch("rag_service.search.generate_embedding", AsyncMock(return_value=[1.0, 0.0])):
+            # When
+            response = await service.process_request(request)
+
+        # Then
+        assert [r.id for r in response.results] == ["meal-1"]
+
+    @pytest.mark.asyncio
+    async def test_cache_key_includes_request_parameters(self):
+        """Test requests differing only in limit are cached separately."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService()
+        first = HybridSearchRequest(query="Leg day", user_id=user_id, limit=5)
+        same = HybridSearchRequest(query="  leg DAY ", user_id=user_id, limit=5)
+        wider = HybridSearchRequest(query="leg day", user_id=user_id, limit=20)
+
+        with patch.object(service.hybrid_search, 'search', return_value=[]) as mock_search:
+            # When
+            await service.process_request(first)
+            await service.process_request(same)
+            await service.process_request(wider)
+
+        # Then
+        assert mock_search.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_writes_invalidate_cached_results(self):
+        """Test indexing a record bumps the user's cache version."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService()
+        request = HybridSearchRequest(
+            query="squats", user_id=user_id, search_type=SearchStrategy.KEYWORD
+        )
+        assert (await service.process_request(request)).results == []
+
+        # When
+        await service.index_record(Embedding(
+            id="w1", user_id=user_id, content="Heavy squats",
+            content_type=ContentType.WORKOUT, embedding_vector=[1.0, 0.0],
+            model_name="test", dimension=2, metadata={}, created_at=datetime(2024, 1, 15)
+        ))
+        response = await service.process_request(request)
+
+        # Then
+        assert [r.id for r in response.results] == ["w1"]
+
+    @pytest.mark.asyncio
+    async def test_semantic_cache_reuses_rephrased_query(self):
+        """Test near-identical questions skip the search engine."""
+        # Given
+        vectors = {
+            "how's my protein": [1.0, 0.0],
+            "am i hitting protein goals": [0.98, 0.05],
+        }
+        embedding_service = Mock()
+        embedding_service.generate_with_fallback = AsyncMock(
+            side_effect=lambda text: (vectors[text.lower()], "test-model")
+        )
+        service = SearchService(
+            embedding_service=embedding_service,
+            semantic_cache=SemanticQueryCache(max_distance=0.05),
+            semantic_cache_audit_rate=1.0
+        )
+        user_id = "00000000-0000-0000-0000-000000000001"
+        results = [
+            SearchResult(id="n1", content="Protein 150g", content_type=ContentType.NUTRITION, score=0.9, metadata={}, source="db", timestamp="2024-01-15")
+        ]
+
+        with patch.object(service.hybrid_search, 'search', return_value=results) as mock_search:
+            # When
+            first = await service.process_request(HybridSearchRequest(query="how's my protein", user_id=user_id))
+            second = await service.process_request(HybridSearchRequest(query="am I hitting protein goals", user_id=user_id))
+
+        # Then
+        assert first.results == second.results
+        assert not first.from_cache and second.from_cache
+        # Each request encodes its query once for both lookup and store
+        assert embedding_service.generate_with_fallback.call_count == 2
+        # One real search plus one audit re-run of the semantic hit
+        assert mock_search.call_count == 2
+        stats = service.semantic_cache.stats()
+        assert stats["hits"] == 1
+        assert stats["audited_hits"] == 1
+        assert stats["false_hits"] == 0
+
+    @pytest.mark.asyncio
+    async def test_query_context_is_shared_by_both_engines(self):
+        """Test a precomputed query context skips re-encoding and re-tokenizing."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService(enable_cache=False)
+        await service.index.store(Embedding(
+            id="w1", user_id=user_id, content="Heavy squats",
+            content_type=ContentType.WORKOUT, embedding_vector=[1.0, 0.0],
+            model_name="test", dimension=2, metadata={}, created_at=datetime(2024, 1, 15)
+        ))
+        context = build_query_context("Squats?", embedding=[1.0, 0.0], model_name="test")
+        request = HybridSearchRequest(query="Squats?", user_id=user_id, threshold=0.0)
+
+        with patch("rag_service.search.generate_embedding", AsyncMock()) as mock_embed, \
+                patch("rag_service.indexes.tokenize", wraps=lambda text: []) as mock_tokenize:
+            # When
+            response = await service.process_request(request, query_context=context)
+
+        # Then
+        mock_embed.assert_not_called()
+        mock_tokenize.assert_not_called()
+        assert [r.id for r in response.results] == ["w1"]
+
+    @pytest.mark.asyncio
+    async def test_cursor_pages_through_results_without_rerunning(self):
+        """Test cursors walk the full ranking and reuse the ranked window."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService(page_window=4)
+        for i in range(12):
+            await service.index.store(Embedding(
+                id=f"w{i:02d}", user_id=user_id, content=f"Workout {i}",
+                content_type=ContentType.WORKOUT, embedding_vector=[1.0, i / 10],
+                model_name="test", dimension=2, metadata={}, created_at=datetime(2024, 1, 15)
+            ))
+        request = HybridSearchRequest(
+            query="workout", user_id=user_id, search_type=SearchStrategy.SEMANTIC,
+            limit=4, threshold=0.0, paginate=True
+        )
+        pages = []
+
+        with patch("rag_service.search.generate_embedding", AsyncMock(return_value=[1.0, 0.0])), \
+                patch.object(service.index, "search_similar", wraps=service.index.search_similar) as mock_search:
+            # When
+            response = await service.process_request(request)
+            pages.append(response.results)
+            while response.next_cursor:
+                response = await service.process_request(
+                    request.model_copy(update={"cursor": response.next_cursor})
+                )
+                pages.append(response.results)
+
+        # Then
+        assert [len(page) for page in pages] == [4, 4, 4]
+        assert [r.id for page in pages for r in page] == [f"w{i:02d}" for i in range(12)]
+        # One ranked window serves the first page and every later one
+        assert mock_search.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_hybrid_cursor_pages_through_every_result(self):
+        """Test min-max fused pages neither skip nor repeat results."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService()
+        for i in range(60):
+            await service.index.store(Embedding(
+                id=f"r{i:02d}", user_id=user_id, content=f"Workout {i} " + "squats " * (i % 7),
+                content_type=ContentType.WORKOUT, embedding_vector=[1.0, (i * 37 % 60) / 30],
+                model_name="test", dimension=2, metadata={}, created_at=datetime(2024, 1, 15)
+            ))
+        request = HybridSearchRequest(
+            query="workout squats", user_id=user_id, search_type=SearchStrategy.HYBRID,
+            limit=5, threshold=0.0, paginate=True
+        )
+        ids = []
+
+        with patch("rag_service.search.generate_embedding", AsyncMock(return_value=[1.0, 0.0])):
+            # When
+            response = await service.process_request(request)
+            ids.extend(r.id for r in response.results)
+            while response.next_cursor:
+                response = await service.process_request(
+                    request.model_copy(update={"cursor": response.next_cursor})
+                )
+                ids.extend(r.id for r in response.results)
+
+        # Then
+        assert len(ids) == len(set(ids))
+        assert sorted(ids) == [f"r{i:02d}" for i in range(60)]
+
+    @pytest.mark.asyncio
+    async def test_first_page_ranks_a_window_only_when_paginating(self):
+        """Test requests that do not paginate search only their own limit."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService(page_window=4)
+        results = [
+            SearchResult(id=f"r{i}", content=f"Result {i}", content_type=ContentType.WORKOUT, score=0.9, metadata={}, source="db", timestamp="2024-01-15")
+            for i in range(10)
+        ]
+
+        with patch.object(
+            service.hybrid_search, 'search',
+            side_effect=lambda **kwargs: results[:kwargs["limit"]]
+        ) as mock_search:
+            # When
+            plain = await service.process_request(
+                HybridSearchRequest(query="squats", user_id=user_id, limit=2)
+            )
+            paged = await service.process_request(
+                HybridSearchRequest(query="squats", user_id=user_id, limit=2, paginate=True)
+            )
+
+        # Then
+        assert [call.kwargs["limit"] for call in mock_search.call_args_list] == [2, 8]
+        assert plain.next_cursor is None
+        assert paged.next_cursor is not None
+        assert [r.id for r in plain.results] == [r.id for r in paged.results]
+
+    @pytest.mark.asyncio
+    async def test_cursor_from_other_request_is_rejected(self):
+        """Test a cursor cannot be replayed against a different query."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService()
+        results = [
+            SearchResult(id=f"r{i}", content=f"Result {i}", content_type=ContentType.WORKOUT, score=0.9, metadata={}, source="db", timestamp="2024-01-15")
+            for i in range(3)
+        ]
+        with patch.object(service.hybrid_search, 'search', return_value=results):
+            first = await service.process_request(
+                HybridSearchRequest(query="squats", user_id=user_id, limit=2, paginate=True)
+            )
+
+        # When/Then
+        with pytest.raises(ValueError, match="does not belong"):
+            await service.process_request(HybridSearchRequest(
+                query="bench", user_id=user_id, limit=2, cursor=first.next_cursor
+            ))
+
+    @pytest.mark.asyncio
+    async def test_stream_results_fetches_pages_lazily(self):
+        """Test the async generator stops searching when the consumer stops."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService(page_window=2)
+        results = [
+            SearchResult(id=f"r{i:02d}", content=f"Result {i}", content_type=ContentType.WORKOUT, score=1 - i / 100, metadata={}, source="db", timestamp="2024-01-15")
+            for i in range(30)
+        ]
+        request = HybridSearchRequest(query="squats", user_id=user_id, limit=5)
+
+        with patch.object(
+            service.hybrid_search, 'search',
+            side_effect=lambda **kwargs: results[:kwargs["limit"]]
+        ) as mock_search:
+            # When
+            streamed = [r.id async for r in service.stream_results(request, max_results=12)]
+
+        # Then
+        assert streamed == [f"r{i:02d}" for i in range(12)]
+        # A two-page window, then one extension for the third page
+        assert mock_search.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_batch_search_serves_cached_queries(self):
+        """Test batched search only runs the queries missing from the cache."""
+        # Given
+        user_id = "00000000-0000-0000-0000-000000000001"
+        service = SearchService()
+        cached = HybridSearchRequest(query="protein", user_id=user_id)
+
+        with patch.object(service.hybrid_search, 'search', return_value=[]):
+            await service.process_request(cached)
+
+        with patch.object(service.hybrid_search, 'search_batch', return_value=[[]]) as mock_batch:
+            # When
+            response = await service.batch_search(BatchSearchRequest(
+                queries=["protein", "sleep"], user_id=user_id
+            ))
+
+        # Then
+        assert len(response.responses) == 2
+        assert mock_batch.call_args.kwargs["queries"] == ["sleep"]
+
 
 @pytest.fixture
 def mock_vector_store():
@@ -0,0 +1,227 @@
+"""
+Unit tests for user-sharded search indexes.
+"""
+
+import asyncio
+import pytest
+from datetime import datetime
+
+from rag_service.interfaces import ContentType, Embedding, SearchFilter
+from rag_service.search import SearchService
+from rag_service.sharding import (
+    HashRing,
+    ShardClient,
+    ShardServer,
+    ShardedVectorStore,
+    rebalance_shards,
+)
+
+
+USER_IDS = [f"00000000-0000-0000-0000-{i:012d}" for i in range(12)]
+
+
+def make_record(record_id, user_id, vector, content_type=ContentType.WORKOUT):
+    """Build an embedding record."""
+    return Embedding(
+        id=record_id,
+        user_id=user_id,
+        content=f"Squats session {record_id}",
+        content_type=content_type,
+        embedding_vector=vector,
+        model_name="test",
+        dimension=len(vector),
+        metadata={"source": "workout_db"},
+        created_at=datetime(2024, 1, 15),
+    )
+
+
+@pytest.fixture
+async def shards(tmp_path):
+    """Start three shard servers and a store routing to the first two."""
+    servers = {}
+    for name in ["a", "b", "c"]:
+        servers[name] = ShardServer(str(tmp_path / f"{name}.sock"))
+        await servers[name].start()
+    store = ShardedVectorStore({
+        name: ShardClient(servers[name].path) for name in ["a", "b"]
+    })
+    yield store, servers
+    await store.close()
+    for server in servers.values():
+        await server.close()
+
+
+class TestHashRing:
+    """Test cases for consistent hashing."""
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        """Test keys either stay put or move to the new node."""
+        # Given
+        ring = HashRing(["a", "b", "c"])
+        keys = [f"user-{i}" for i in range(1000)]
+        before = {key: ring.node_for(key) for key in keys}
+
+        # When
+        ring.add_node("d")
+        after = {key: ring.node_for(key) for key in keys}
+
+        # Then
+        moved = [key for key in keys if before[key] != after[key]]
+        assert all(after[key] == "d" for key in moved)
+        assert 150 < len(moved) < 350
+
+    def test_empty_ring_raises(self):
+        """Test placing a key needs at least one node."""
+        with pytest.raises(LookupError):
+            HashRing().node_for("user")
+
+
+class TestShardedVectorStore:
+    """Test cases for routing calls to shard processes."""
+
+    @pytest.mark.asyncio
+    async def test_each_user_is_held_by_one_shard(self, shards):
+        """Test writes land on the owner and searches are routed there."""
+        # Given
+        store, servers = shards
+        for i, user_id in enumerate(USER_IDS):
+            await store.store(make_record(f"r{i}", user_id, [1.0, 0.0]))
+
+        # When
+        results = await store.search_similar([1.0, 0.0], USER_IDS[3], 10, 0.0)
+        keyword = await store.full_text_search(
+            "squats", USER_IDS[3], 10, filters=SearchFilter(sources=["workout_db"])
+        )
+
+        # Then
+        assert [r.id for r in results] == ["r3"]
+        assert [r.id for r in keyword] == ["r3"]
+        held = {name: set(server.index.users) for name, server in servers.items()}
+        assert held["a"] | held["b"] == set(USER_IDS)
+        assert not held["a"] & held["b"]
+        for user_id in USER_IDS:
+            assert user_id in held[store.ring.node_for(user_id)]
+
+    @pytest.mark.asyncio
+    async def test_adding_a_shard_rebalances_users(self, shards):
+        """Test users owned by a new shard are moved to it intact."""
+        # Given
+        _, servers = shards
+        paths = [servers[name].path for name in ["a", "b", "c"]]
+        store = ShardedVectorStore.from_paths(paths[:2])
+        for i, user_id in enumerate(USER_IDS):
+            await store.store(make_record(f"r{i}", user_id, [1.0, 0.0]))
+        await store.close()
+
+        # When
+        moved = await rebalance_shards(paths)
+
+        # Then
+        assert moved == len(servers["c"].index.users) > 0
+        store = ShardedVectorStore.from_paths(paths)
+        for i, user_id in enumerate(USER_IDS):
+            results = await store.search_similar([1.0, 0.0], user_id, 10, 0.0)
+            assert [r.id for r in results] == [f"r{i}"]
+        assert sum(len(server.index.users) for server in servers.values()) == len(USER_IDS)
+        await store.close()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_call_does_not_leak_its_response(self, shards):
+        """Test a call cancelled after sending never hands its response to the next caller."""
+        # Given
+        _, servers = shards
+        server = servers["c"]
+        await server.index.store(make_record("alice", USER_IDS[0], [1.0, 0.0]))
+        await server.index.store(make_record("bob", USER_IDS[1], [1.0, 0.0]))
+        dispatch = server.dispatch
+
+        async def slow_for_alice(method, params):
+            if params.get("user_id") == USER_IDS[0]:
+                await asyncio.sleep(0.05)
+            return await dispatch(method, params)
+
+        server.dispatch = slow_for_alice
+        client = ShardClient(server.path, pool_size=1)
+
+        # When
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.call(
+                "search_similar", query_vector=[1.0, 0.0], user_id=USER_IDS[0], limit=10, threshold=0.0
+            ), timeout=0.01)
+        results = await client.call(
+            "search_similar", query_vector=[1.0, 0.0], user_id=USER_IDS[1], limit=10, threshold=0.0
+        )
+
+        # Then
+        assert [r["id"] for r in results] == ["bob"]
+        await client.close()
+        await asyncio.sleep(0.05)
+
+    @pytest.mark.asyncio
+    async def test_calls_to_one_shard_run_concurrently(self, shards):
+        """Test pooled connections let a slow call overlap with others."""
+        # Given
+        _, servers = shards
+        server = servers["c"]
+        running, peak = 0, 0
+
+        async def slow_users(method, params):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+            return []
+
+        server.dispatch = slow_users
+        client = ShardClient(server.path, pool_size=3)
+
+        # When
+        await asyncio.gather(*(client.call("users") for _ in range(3)))
+
+        # Then
+        assert peak == 3
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_delete_and_update_reach_the_owner(self, shards):
+        """Test deletes are found on whichever shard holds the record."""
+        # Given
+        store, _ = shards
+        await store.store(make_record("r1", USER_IDS[0], [1.0, 0.0]))
+        await store.store(make_record("r2", USER_IDS[1], [1.0, 0.0]))
+
+        # When
+        updated = await store.update(make_record("r2", USER_IDS[1], [0.0, 1.0]))
+        deleted = await store.delete("r1")
+
+        # Then
+        assert updated and deleted
+        assert await store.search_similar([1.0, 0.0], USER_IDS[0], 10, 0.0) == []
+        results = await store.search_similar([0.0, 1.0], USER_IDS[1], 10, 0.5)
+        assert [r.id for r in results] == ["r2"]
+
+    @pytest.mark.asyncio
+    async def test_shard_errors_are_raised(self, shards):
+        """Test failures inside a shard surface to the caller."""
+        # Given
+        store, _ = shards
+        await store.store(make_record("r1", USER_IDS[0], [1.0, 0.0]))
+
+        # When/Then
+        with pytest.raises(RuntimeError, match="already indexed"):
+            await store.store(make_record("r1", USER_IDS[0], [1.0, 0.0]))
+
+    @pytest.mark.asyncio
+    async def test_search_service_uses_shards_transparently(self, shards):
+        """Test the search service runs on a sharded index."""
+        # Given
+        store, _ = shards
+        service = SearchService(index=store)
+        await service.index_record(make_record("r1", USER_IDS[0], [1.0, 0.0]))
+
+        # When
+        results = await service.keyword_search.search("squats", USER_IDS[0], 10)
+
+        # Then
+        assert [r.id for r in results] == ["r1"]
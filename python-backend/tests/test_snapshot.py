@@ -0,0 +1,370 @@
+"""
+Unit tests for index snapshots and write-ahead log recovery.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import pytest
+import numpy as np
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from rag_service.indexes import InMemorySearchIndex
+from rag_service.interfaces import ContentType, Embedding, SearchFilter, SearchResult
+from rag_service.snapshot import (
+    IndexPersistence,
+    MappedPayloads,
+    MappedPostings,
+    SnapshotStore,
+    WriteAheadLog,
+)
+
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def make_record(record_id, content, vector, month=1, content_type=ContentType.WORKOUT):
+    """Build an embedding record."""
+    return Embedding(
+        id=record_id,
+        user_id=USER_ID,
+        content=content,
+        content_type=content_type,
+        embedding_vector=vector,
+        model_name="test",
+        dimension=len(vector),
+        metadata={"source": "workout_db"},
+        created_at=datetime(2024, month, 15),
+    )
+
+
+async def search_ids(index, vector=(1.0, 0.0), query="squats"):
+    """Run a vector and a keyword search."""
+    vector_ids = [r.id for r in await index.search_similar(list(vector), USER_ID, 10, 0.0)]
+    keyword_ids = [r.id for r in await index.full_text_search(query, USER_ID, 10)]
+    return vector_ids, keyword_ids
+
+
+class TestSnapshotStore:
+    """Test cases for snapshot files."""
+
+    @pytest.mark.asyncio
+    async def test_snapshot_round_trip_memory_maps_vectors(self, tmp_path):
+        """Test a loaded snapshot answers queries like the original."""
+        # Given
+        index = InMemorySearchIndex()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        await index.store(make_record("w2", "Front squats and lunges", [0.6, 0.8], month=2))
+        await index.store(make_record("n1", "Protein oats", [0.0, 1.0], content_type=ContentType.NUTRITION))
+        store = SnapshotStore(str(tmp_path))
+
+        # When
+        store.save(index, wal_sequence=7)
+        loaded, manifest = store.load(store.versions()[0])
+
+        # Then
+        assert manifest["wal_sequence"] == 7
+        assert await search_ids(loaded) == await search_ids(index)
+        filtered = await loaded.search_similar(
+            [1.0, 0.0], USER_ID, 10, 0.0,
+            filters=SearchFilter(content_types=[ContentType.NUTRITION])
+        )
+        assert [r.id for r in filtered] == ["n1"]
+        sub_index = loaded.user_index(USER_ID).segments["2024-01"].vectors[ContentType.WORKOUT]
+        assert isinstance(sub_index.matrix, np.memmap)
+
+    @pytest.mark.asyncio
+    async def test_load_maps_payloads_and_postings_without_parsing(self, tmp_path):
+        """Test loading decodes no payloads and builds no posting dicts."""
+        # Given
+        index = InMemorySearchIndex()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        await index.store(make_record("w2", "Goblet squats", [0.9, 0.1]))
+        store = SnapshotStore(str(tmp_path))
+        store.save(index)
+
+        # When
+        with patch.object(SearchResult, "model_validate_json", side_effect=AssertionError):
+            loaded, _ = store.load(1)
+
+        # Then
+        segment = loaded.user_index(USER_ID).segments["2024-01"]
+        payloads = segment.vectors[ContentType.WORKOUT].payloads
+        postings = segment.keywords[ContentType.WORKOUT].postings
+        assert isinstance(payloads, MappedPayloads) and isinstance(payloads.data, np.memmap)
+        assert isinstance(postings, MappedPostings) and postings.resident() == []
+        assert await search_ids(loaded) == await search_ids(index)
+        assert loaded.user_index(USER_ID).doc_freq == index.user_index(USER_ID).doc_freq
+
+    @pytest.mark.asyncio
+    async def test_loaded_snapshot_can_be_saved_again(self, tmp_path):
+        """Test mapped rows are written back with rows added after loading."""
+        # Given
+        index = InMemorySearchIndex()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        store = SnapshotStore(str(tmp_path))
+        store.save(index)
+        loaded, _ = store.load(1)
+        await loaded.store(make_record("w2", "Goblet squats", [0.9, 0.1]))
+
+        # When
+        store.save(loaded)
+        reloaded, _ = store.load(2)
+
+        # Then
+        assert await search_ids(reloaded) == await search_ids(loaded)
+        assert sorted((await search_ids(reloaded))[1]) == ["w1", "w2"]
+        filtered = await reloaded.search_similar(
+            [1.0, 0.0], USER_ID, 10, 0.0, filters=SearchFilter(sources=["workout_db"])
+        )
+        assert [r.id for r in filtered] == ["w1", "w2"]
+
+    @pytest.mark.asyncio
+    async def test_loaded_index_accepts_writes(self, tmp_path):
+        """Test memory-mapped sub-indexes grow back into memory on write."""
+        # Given
+        index = InMemorySearchIndex()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        store = SnapshotStore(str(tmp_path))
+        store.save(index)
+        loaded, _ = store.load(1)
+
+        # When
+        await loaded.store(make_record("w2", "Goblet squats", [0.9, 0.1]))
+        await loaded.delete("w1")
+
+        # Then
+        assert await search_ids(loaded) == (["w2"], ["w2"])
+
+    @pytest.mark.asyncio
+    async def test_snapshot_skips_tombstoned_rows(self, tmp_path):
+        """Test deleted rows are left out of snapshots."""
+        # Given
+        index = InMemorySearchIndex()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        await index.store(make_record("w2", "Goblet squats", [0.9, 0.1]))
+        await index.upsert(make_record("w3", "Box squats", [0.8, 0.2], month=2))
+        await index.delete("w1")
+        await index.delete("w3")
+        store = SnapshotStore(str(tmp_path))
+
+        # When
+        store.save(index)
+        loaded, manifest = store.load(1)
+
+        # Then
+        assert await search_ids(loaded) == (["w2"], ["w2"])
+        assert [s["key"] for s in manifest["users"][0]["segments"]] == ["2024-01"]
+        assert len(loaded.user_index(USER_ID).segments["2024-01"].vectors[ContentType.WORKOUT]) == 1
+        assert loaded.user_index(USER_ID).tombstones == 0
+
+    @pytest.mark.asyncio
+    async def test_corrupt_snapshot_falls_back_to_previous(self, tmp_path):
+        """Test checksum mismatches skip to the previous snapshot."""
+        # Given
+        index = InMemorySearchIndex()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        store = SnapshotStore(str(tmp_path), keep=2, verify=True)
+        store.save(index, wal_sequence=1)
+        await index.store(make_record("w2", "Goblet squats", [0.9, 0.1]))
+        newest = store.save(index, wal_sequence=2)
+        vectors = next(name for name in os.listdir(newest) if name.endswith(".vectors.npy"))
+        with open(os.path.join(newest, vectors), "r+b") as f:
+            f.seek(-4, os.SEEK_END)
+            f.write(b"\xff\xff\xff\xff")
+
+        # When
+        loaded, manifest = store.load_latest()
+
+        # Then
+        assert manifest["version"] == 1
+        assert (await search_ids(loaded))[0] == ["w1"]
+
+    @pytest.mark.asyncio
+    async def test_truncated_snapshot_falls_back_without_checksums(self, tmp_path):
+        """Test size checks catch a truncated file when checksums are off."""
+        # Given
+        index = InMemorySearchIndex()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        store = SnapshotStore(str(tmp_path), keep=2)
+        store.save(index, wal_sequence=1)
+        await index.store(make_record("w2", "Goblet squats", [0.9, 0.1]))
+        newest = store.save(index, wal_sequence=2)
+        payloads = next(name for name in os.listdir(newest) if name.endswith(".payloads.npy"))
+        os.truncate(os.path.join(newest, payloads), 16)
+
+        # When
+        loaded, manifest = store.load_latest()
+
+        # Then
+        assert manifest["version"] == 1
+        assert (await search_ids(loaded))[0] == ["w1"]
+
+    @pytest.mark.asyncio
+    async def test_format_one_snapshot_still_loads(self, tmp_path):
+        """Test snapshots with JSON payloads and postings remain readable."""
+        # Given
+        index = InMemorySearchIndex()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        path = tmp_path / "00000001"
+        path.mkdir()
+        np.save(path / "u.vectors.npy", np.array([[1.0, 0.0]], dtype=np.float32))
+        np.save(path / "u.times.npy", index.user_index(USER_ID).segments["2024-01"].vectors[ContentType.WORKOUT].times[:1])
+        payload = index.user_index(USER_ID).segments["2024-01"].vectors[ContentType.WORKOUT].payloads[0]
+        (path / "u.payloads.json").write_text(json.dumps([payload.model_dump(mode="json")]))
+        (path / "u.postings.json").write_text(json.dumps({
+            "doc_lengths": [2], "postings": {"heavy": [[0, 1]], "squats": [[0, 1]]}
+        }))
+        types = [{
+            "content_type": "workout", "vectors": "u.vectors.npy", "times": "u.times.npy",
+            "payloads": "u.payloads.json", "postings": "u.postings.json",
+        }]
+        (path / "manifest.json").write_text(json.dumps({
+            "format": 1, "version": 1, "wal_sequence": 3, "files": {},
+            "users": [{
+                "user_id": USER_ID, "dimension": 2, "k1": 1.2, "b": 0.75,
+                "segments": [{"key": "2024-01", "cold": False, "types": types}],
+            }],
+        }))
+
+        # When
+        loaded, manifest = SnapshotStore(str(tmp_path)).load_latest()
+
+        # Then
+        assert manifest["wal_sequence"] == 3
+        assert await search_ids(loaded) == (["w1"], ["w1"])
+
+    @pytest.mark.asyncio
+    async def test_old_snapshots_are_pruned(self, tmp_path):
+        """Test only the newest snapshots are kept."""
+        # Given
+        store = SnapshotStore(str(tmp_path), keep=2)
+
+        # When
+        for sequence in range(4):
+            store.save(InMemorySearchIndex(), wal_sequence=sequence)
+
+        # Then
+        assert store.versions() == [4, 3]
+
+
+class TestIndexPersistence:
+    """Test cases for snapshot plus log recovery."""
+
+    @pytest.mark.asyncio
+    async def test_restart_replays_writes_since_snapshot(self, tmp_path):
+        """Test recovery loads the snapshot and only replays newer writes."""
+        # Given
+        persistence = IndexPersistence(str(tmp_path))
+        index = persistence.restore()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        await index.store(make_record("w2", "Goblet squats", [0.9, 0.1]))
+        persistence.checkpoint(index)
+        await index.update(make_record("w2", "Deadlifts", [0.0, 1.0]))
+        await index.delete("w1")
+        await index.store(make_record("w3", "Box squats", [0.8, 0.2], month=3))
+        persistence.close()
+
+        # When
+        restarted = IndexPersistence(str(tmp_path))
+        recovered = restarted.restore()
+
+        # Then
+        assert await search_ids(recovered) == await search_ids(index)
+        assert [r.id for r in await recovered.full_text_search("deadlifts", USER_ID, 10)] == ["w2"]
+        replayed = list(restarted.write_log.replay())
+        assert [entry["op"] for entry in replayed] == ["update", "delete", "store"]
+        restarted.close()
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_writes_off_the_event_loop(self, tmp_path):
+        """Test writes made while a checkpoint is on disk land in the log tail."""
+        # Given
+        persistence = IndexPersistence(str(tmp_path))
+        index = persistence.restore()
+        await index.store(make_record("w1", "Heavy squats", [1.0, 0.0]))
+        release = threading.Event()
+        writers = []
+        write = SnapshotStore.write
+
+        def slow_write(store, users, wal_sequence=0):
+            writers.append(threading.current_thread())
+            release.wait(5)
+            return write(store, users, wal_sequence)
+
+        # When
+        with patch.object(SnapshotStore, "write", slow_write):
+            checkpoint = asyncio.create_task(persistence.checkpoint_async(index))
+            while not writers:
+                await asyncio.sleep(0.01)
+            await index.store(make_record("w2", "Goblet squats", [0.9, 0.1]))
+            await index.delete("w1")
+            release.set()
+            await checkpoint
+        persistence.close()
+        restarted = IndexPersistence(str(tmp_path))
+        recovered = restarted.restore()
+
+        # Then
+        assert writers[0] is not threading.main_thread()
+        assert [entry["op"] for entry in restarted.write_log.replay()] == ["store", "delete"]
+        assert await search_ids(recovered) == (["w2"], ["w2"])
+        restarted.close()
+
+    @pytest.mark.asyncio
+    async def test_periodic_checkpoints_survive_a_failure(self, tmp_path):
+        """Test a failed checkpoint is logged and the next one still runs."""
+        # Given
+        persistence = IndexPersistence(str(tmp_path))
+        index = persistence.restore()
+        attempts = AsyncMock(side_effect=[OSError("disk full"), str(tmp_path), str(tmp_path)])
+
+        # When
+        with patch.object(persistence, "checkpoint_async", attempts):
+            task = asyncio.create_task(persistence.run_checkpoints(lambda: index, 0))
+            while attempts.await_count < 2:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        # Then
+        assert attempts.await_count >= 2
+        persistence.close()
+
+    def test_data_directory_has_one_owner(self, tmp_path):
+        """Test a second process cannot restore from a directory in use."""
+        # Given
+        owner = IndexPersistence(str(tmp_path))
+        owner.restore()
+
+        # When
+        with pytest.raises(RuntimeError):
+            IndexPersistence(str(tmp_path)).restore()
+        owner.close()
+        successor = IndexPersistence(str(tmp_path))
+
+        # Then
+        assert len(successor.restore().users) == 0
+        successor.close()
+
+    def test_torn_log_tail_is_ignored(self, tmp_path):
+        """Test a partially written last entry does not break recovery."""
+        # Given
+        path = str(tmp_path / "wal.log")
+        log = WriteAheadLog(path)
+        log.append("delete", embedding_id="a")
+        log.close()
+        with open(path, "a") as f:
+            f.write('{"seq": 2, "op": "del')
+
+        # When
+        reopened = WriteAheadLog(path)
+        reopened.append("delete", embedding_id="b")
+
+        # Then
+        assert [entry["embedding_id"] for entry in reopened.replay()] == ["a", "b"]
+        assert reopened.sequence == 2
+        reopened.close()
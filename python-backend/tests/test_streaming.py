@@ -0,0 +1,118 @@
+"""
+Unit tests for streaming RAG context.
+"""
+
+import asyncio
+import json
+import pytest
+import threading
+from unittest.mock import Mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rag_service.api import get_pipeline, router
+from rag_service.interfaces import RAGContextEvent, RAGQueryRequest, RAGSummaryEvent
+
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+CONTENTS = ["Easy run", "Heavy squats", "Tempo run"]
+
+
+def make_request():
+    """Build a RAG query request."""
+    return RAGQueryRequest(query="running", user_id=USER_ID, max_context_items=3)
+
+
+class TestStreaming:
+    """Test cases for the streaming pipeline and endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_first_stage_context_precedes_reranked_order(self, make_pipeline):
+        """Test search results are sent before reranking and refined after."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+
+        # When
+        events = [event async for event in pipeline.stream(make_request())]
+
+        # Then
+        first, reranked, summary = events
+        assert first.stage == "first_stage" and not first.final
+        assert [c.content for c in first.context] == CONTENTS
+        assert reranked.stage == "reranked" and reranked.final
+        assert [c.content for c in reranked.context] == list(reversed(CONTENTS))
+        assert isinstance(summary, RAGSummaryEvent)
+        assert summary.total_tokens == reranked.total_tokens
+        assert set(summary.stage_timings_ms) == {"search", "rerank", "pack"}
+        assert summary.time_to_first_context_ms <= summary.processing_time_ms
+        assert summary.rerank_stages[0].name == "cross_encoder"
+
+    @pytest.mark.asyncio
+    async def test_skipped_rerank_makes_first_stage_final(self, make_pipeline):
+        """Test a gated request streams one final context event."""
+        # Given
+        pipeline = make_pipeline(CONTENTS, rerank=False)
+
+        # When
+        events = [event async for event in pipeline.stream(make_request())]
+        response = await pipeline.process(make_request())
+
+        # Then
+        assert [type(e) for e in events] == [RAGContextEvent, RAGSummaryEvent]
+        assert events[0].final
+        pipeline.rerank_service.process_request.assert_not_awaited()
+        assert [c.content for c in response.context] == CONTENTS
+        assert response.total_tokens == events[1].total_tokens
+
+    @pytest.mark.asyncio
+    async def test_shadow_rerank_runs_off_the_event_loop(self, make_pipeline):
+        """Test sampled shadow reranks score in a worker thread."""
+        # Given
+        pipeline = make_pipeline(CONTENTS, rerank=False)
+        pipeline.rerank_gate.sample_shadow.return_value = True
+        threads = []
+
+        def score(query, texts):
+            threads.append(threading.get_ident())
+            return [float(i) for i in range(len(texts))]
+
+        pipeline.rerank_service.score_detached = Mock(side_effect=score)
+
+        # When
+        await pipeline.process(make_request())
+        await asyncio.gather(*pipeline._shadow_tasks)
+
+        # Then
+        assert threads and threads[0] != threading.get_ident()
+        pipeline.rerank_service.process_request.assert_not_awaited()
+        served, shadow, _ = pipeline.rerank_gate.record_shadow.call_args.args
+        assert served == CONTENTS
+        assert shadow == list(reversed(CONTENTS))
+
+    @pytest.mark.parametrize("format", ["sse", "ndjson"])
+    def test_stream_endpoint(self, format, make_pipeline):
+        """Test the endpoint encodes every event in the requested format."""
+        # Given
+        pipeline = make_pipeline(CONTENTS)
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_pipeline] = lambda: pipeline
+
+        # When
+        response = TestClient(app).post(
+            f"/api/rag/query/stream?format={format}",
+            json=make_request().model_dump(mode="json")
+        )
+
+        # Then
+        assert response.status_code == 200
+        if format == "sse":
+            assert response.headers["content-type"].startswith("text/event-stream")
+            blocks = response.text.strip().split("\n\n")
+            names = [b.split("\n")[0] for b in blocks]
+            events = [json.loads(b.split("\n")[1][len("data: "):]) for b in blocks]
+            assert names == ["event: context", "event: context", "event: summary"]
+        else:
+            events = [json.loads(line) for line in response.text.splitlines()]
+        assert [e["event"] for e in events] == ["context", "context", "summary"]
+        assert events[0]["stage"] == "first_stage"
@@ -0,0 +1,142 @@
+"""
+Unit tests for the memory-budgeted tenant index manager.
+"""
+
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+from rag_service.interfaces import ContentType, Embedding
+from rag_service.tenancy import TenantIndexManager, estimate_bytes
+
+
+ALICE = "00000000-0000-0000-0000-00000000000a"
+BOB = "00000000-0000-0000-0000-00000000000b"
+
+
+def make_record(record_id, user_id, content, vector):
+    """Build an embedding record."""
+    return Embedding(
+        id=record_id,
+        user_id=user_id,
+        content=content,
+        content_type=ContentType.WORKOUT,
+        embedding_vector=vector,
+        model_name="test",
+        dimension=len(vector),
+        metadata={},
+        created_at=datetime(2024, 1, 15),
+    )
+
+
+async def fill(manager):
+    """Store two records for each of two users."""
+    await manager.store(make_record("a1", ALICE, "Heavy squats", [1.0, 0.0]))
+    await manager.store(make_record("a2", ALICE, "Bench press", [0.0, 1.0]))
+    await manager.store(make_record("b1", BOB, "Easy run", [1.0, 0.0]))
+    await manager.store(make_record("b2", BOB, "Tempo run", [0.6, 0.8]))
+
+
+def one_user_budget(manager):
+    """A budget with room for one user only."""
+    return max(estimate_bytes(index) for index in manager.index.users.values()) + 1
+
+
+class TestTenantIndexManager:
+    """Test cases for eviction and lazy reloading."""
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_user_is_evicted(self, tmp_path):
+        """Test exceeding the budget evicts the coldest user to disk."""
+        # Given
+        manager = TenantIndexManager(memory_budget_bytes=1 << 30, directory=str(tmp_path))
+        await fill(manager)
+        manager.memory_budget_bytes = one_user_budget(manager)
+
+        # When
+        await manager.search_similar([1.0, 0.0], BOB, 10, 0.0)
+        await manager.store(make_record("b3", BOB, "Long run", [0.8, 0.6]))
+
+        # Then
+        stats = manager.stats()
+        assert ALICE not in manager.index.users
+        assert stats["resident_users"] == 1
+        assert stats["evicted_users"] == 1
+        assert stats["evictions"] == 1
+        assert stats["evictions_per_minute"] == 1.0
+        assert stats["resident_bytes"] == estimate_bytes(manager.index.users[BOB])
+
+    @pytest.mark.asyncio
+    async def test_evicted_user_reloads_on_next_query(self, tmp_path):
+        """Test an evicted user answers vector and keyword queries after reload."""
+        # Given
+        manager = TenantIndexManager(memory_budget_bytes=1 << 30, directory=str(tmp_path))
+        await fill(manager)
+        before = await manager.full_text_search("squats", ALICE, 10)
+        await manager.evict(ALICE)
+
+        # When
+        vector_results = await manager.search_similar([1.0, 0.0], ALICE, 10, 0.0)
+        keyword_results = await manager.full_text_search("squats", ALICE, 10)
+
+        # Then
+        assert [r.id for r in vector_results] == ["a1", "a2"]
+        assert [r.id for r in keyword_results] == [r.id for r in before]
+        assert keyword_results[0].score == pytest.approx(before[0].score)
+        assert manager.reloads == 1
+        assert manager.misses == 1
+
+    @pytest.mark.asyncio
+    async def test_vectors_are_served_before_keywords_load(self, tmp_path):
+        """Test vector search does not wait for the keyword index."""
+        # Given
+        manager = TenantIndexManager(memory_budget_bytes=1 << 30, directory=str(tmp_path))
+        await fill(manager)
+        await manager.evict(ALICE)
+
+        # When
+        results = await manager.search_similar([1.0, 0.0], ALICE, 10, 0.0)
+        loading = ALICE in manager._keyword_loads
+        await asyncio.gather(*manager._keyword_loads.values())
+
+        # Then
+        assert loading
+        assert [r.id for r in results] == ["a1", "a2"]
+        assert ALICE not in manager._keyword_loads
+
+    @pytest.mark.asyncio
+    async def test_delete_reaches_evicted_user(self, tmp_path):
+        """Test deleting a record by ID reloads its evicted owner."""
+        # Given
+        manager = TenantIndexManager(memory_budget_bytes=1 << 30, directory=str(tmp_path))
+        await fill(manager)
+        await manager.evict(ALICE)
+
+        # When
+        deleted = await manager.delete("a1")
+
+        # Then
+        assert deleted
+        assert [r.id for r in await manager.search_similar([1.0, 0.0], ALICE, 10, 0.0)] == ["a2"]
+
+    @pytest.mark.asyncio
+    async def test_dropped_user_is_rebuilt_by_loader(self):
+        """Test users evicted without a directory are rebuilt from the loader."""
+        # Given
+        loader = AsyncMock(return_value=[make_record("a1", ALICE, "Heavy squats", [1.0, 0.0])])
+        manager = TenantIndexManager(memory_budget_bytes=1 << 30, loader=loader)
+        await fill(manager)
+        await manager.evict(ALICE)
+
+        # When
+        results = await manager.full_text_search("squats", ALICE, 10)
+
+        # Then
+        loader.assert_awaited_once_with(ALICE)
+        assert [r.id for r in results] == ["a1"]
+
+    def test_requires_directory_or_loader(self):
+        """Test evictions need somewhere to restore users from."""
+        with pytest.raises(ValueError):
+            TenantIndexManager()